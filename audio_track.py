@@ -0,0 +1,146 @@
+"""
+Decode-once audio and cached media probes.
+A source's audio track is decoded a single time into a 16 kHz mono float32
+file in the cache and memory-mapped by every stage that needs samples
+(language detection, transcription, diarization, pause detection), instead
+of each one demuxing and decoding the source again. Stream metadata comes
+from one ffprobe JSON call per file, also cached.
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import uuid
+
+import numpy as np
+
+from tracing import span
+from transcription_store import file_content_hash
+
+SAMPLE_RATE = 16000
+DEFAULT_AUDIO_DIR = os.path.join('cache', 'audio')
+DEFAULT_PROBE_DIR = os.path.join('cache', 'probes')
+DEFAULT_AUDIO_MAX_BYTES = 4 * 1024 ** 3  # 4 GB, about 17 hours of audio
+DECODE_BLOCK_BYTES = 4 * 1024 * 1024
+
+
+def media_cache_key(path: str) -> str:
+    """Cheap cache key for metadata derived from a file: its path, size and mtime"""
+    stat = os.stat(path)
+    return hashlib.blake2b(f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode(),
+                           digest_size=16).hexdigest()
+
+
+def probe(path: str, cache_dir: str = DEFAULT_PROBE_DIR) -> dict:
+    """ffprobe's format and stream info for path, cached per (path, size, mtime)"""
+    cache_path = os.path.join(cache_dir, f'{media_cache_key(path)}.json')
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    with span('probe', source=os.path.basename(path)):
+        out = subprocess.check_output([
+            'ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', path
+        ])
+    info = json.loads(out.decode('utf-8'))
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f'{cache_path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(info, f)
+    os.replace(tmp_path, cache_path)
+    return info
+
+
+def media_duration(path: str) -> float:
+    """Duration in seconds from the cached probe (container first, then the longest stream)"""
+    info = probe(path)
+    duration = info.get('format', {}).get('duration')
+    if duration is None:
+        durations = [float(s['duration']) for s in info.get('streams', []) if s.get('duration')]
+        duration = max(durations) if durations else 0.0
+    return float(duration)
+
+
+def stream_info(path: str, codec_type: str):
+    """The first 'audio' / 'video' stream's probe info, or None"""
+    return next((s for s in probe(path).get('streams', []) if s.get('codec_type') == codec_type), None)
+
+
+def _decode_command(path: str, start_time: float = None, duration: float = None) -> list:
+    seek = ['-ss', f'{start_time:.3f}'] if start_time else []
+    limit = ['-t', f'{duration:.3f}'] if duration else []
+    return ['ffmpeg', '-v', 'error', *seek, '-i', path, *limit,
+            '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 'f32le', '-']
+
+
+def decode_audio(path: str, start_time: float = None, duration: float = None) -> np.ndarray:
+    """Decode (part of) the audio into memory; for short pieces that aren't worth caching"""
+    out = subprocess.run(_decode_command(path, start_time, duration), check=True, capture_output=True).stdout
+    return np.frombuffer(out, dtype=np.float32).copy()
+
+
+class AudioTrack:
+    """A decoded 16 kHz mono float32 track, memory-mapped from the cache"""
+
+    def __init__(self, path: str):
+        self.path = path
+        # copy-on-write so torch can wrap it without a read-only warning; pages are shared until written
+        self.samples = np.memmap(path, dtype=np.float32, mode='c') if os.path.getsize(path) else np.zeros(0, np.float32)
+        self.sample_rate = SAMPLE_RATE
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+    def slice(self, start_time: float, end_time: float = None) -> np.ndarray:
+        start = max(0, int(start_time * self.sample_rate))
+        end = len(self.samples) if end_time is None else int(end_time * self.sample_rate)
+        return self.samples[start:end]
+
+
+def extract_audio(media_path: str, cache_dir: str = DEFAULT_AUDIO_DIR,
+                  max_bytes: int = DEFAULT_AUDIO_MAX_BYTES) -> AudioTrack:
+    """
+    The media's decoded audio, keyed by content hash. The first call streams
+    ffmpeg's output straight to the cache file; later calls just map it.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f'{file_content_hash(media_path)}.f32')
+    if os.path.exists(path):
+        os.utime(path)  # mark as recently used for LRU eviction
+        return AudioTrack(path)
+
+    with span('decode_audio', source=os.path.basename(media_path)):
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        proc = subprocess.Popen(_decode_command(os.path.abspath(media_path)), stdout=subprocess.PIPE)
+        try:
+            with open(tmp_path, 'wb') as f:
+                for block in iter(lambda: proc.stdout.read(DECODE_BLOCK_BYTES), b''):
+                    f.write(block)
+            proc.stdout.close()
+            if proc.wait() != 0:
+                raise subprocess.CalledProcessError(proc.returncode, 'ffmpeg')
+            os.replace(tmp_path, path)
+        except BaseException:
+            proc.kill()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    evict_audio(cache_dir, max_bytes, keep=path)
+    return AudioTrack(path)
+
+
+def evict_audio(cache_dir: str = DEFAULT_AUDIO_DIR, max_bytes: int = DEFAULT_AUDIO_MAX_BYTES, keep: str = None):
+    """Remove least recently used decoded tracks (except `keep`) until the cache fits in max_bytes"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.f32'):
+            path = os.path.join(cache_dir, name)
+            entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path != keep:
+            os.remove(path)
+            total -= size
@@ -0,0 +1,52 @@
+"""
+CPU-bound pipeline stages of the Telegram bot.
+These run in a separate worker process so transcription and clip finding
+never block the bot's event loop. Models live in the worker's registry and
+are shared by every job the worker runs.
+"""
+
+import os
+from multiprocessing import util
+
+from audio_track import extract_audio
+from models import get_registry, warm_up_report
+from transcription_store import TranscriptionStore
+
+_profile = None
+
+
+def init_worker(profile: str = None, huggingface_token: str = None, memory_budget_mb: float = None, ready=None):
+    """
+    Process pool initializer: hand the HuggingFace token to huggingface_hub
+    and set up the model registry. The token goes in the environment rather
+    than through login(), which checks it online and stalls when offline.
+    With a `ready` queue, the models are warmed here, once per worker, and a
+    warm_up_report() is put on the queue. They are unloaded when the worker exits.
+    """
+    global _profile
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+    if huggingface_token:
+        os.environ.setdefault('HF_TOKEN', huggingface_token)
+        os.environ.setdefault('HUGGING_FACE_HUB_TOKEN', huggingface_token)  # older huggingface_hub releases
+    _profile = profile
+    get_registry(huggingface_token, memory_budget_mb=memory_budget_mb)
+    util.Finalize(None, unload_models, exitpriority=10)  # runs as the worker process shuts down
+    if ready is not None:
+        ready.put(warm_up_report(profile))
+
+
+def unload_models():
+    get_registry().unload()
+
+
+def transcribe(video_path: str, cache_key: str):
+    """Transcribe video_path into the transcription store under cache_key"""
+    audio = extract_audio(video_path).samples
+    TranscriptionStore().put(cache_key, get_registry().transcribe(audio, _profile),
+                             source_name=os.path.basename(video_path))
+
+
+def find_clips(cache_key: str) -> list:
+    """Run ClipFinder over the stored transcription"""
+    stored = TranscriptionStore().get(cache_key)
+    return get_registry().find_clips(stored.transcription())
@@ -0,0 +1,97 @@
+"""
+Duration-constrained clip candidates aligned to sentence boundaries.
+A two-pointer sliding window lists every sentence-aligned span whose
+duration is within [min_duration, max_duration]; a greedy interval
+scheduling pass then picks the best non-overlapping ones.
+"""
+
+from bisect import bisect_left
+from collections import namedtuple
+
+import numpy as np
+
+SENTENCE_ENDINGS = ('.', '!', '?')
+
+
+CandidateSpan = namedtuple('CandidateSpan', ['start_time', 'end_time', 'start_char', 'end_char'])
+
+
+def sentence_spans(transcription, word_index) -> list:
+    """
+    Sentences as (start_time, end_time, start_char, end_char) tuples in time order.
+    Uses the transcription's own sentence info when available, otherwise splits
+    the indexed words at sentence-ending punctuation.
+    """
+    if hasattr(transcription, 'get_sentence_info'):
+        sentences = transcription.get_sentence_info()
+        if sentences:
+            return sorted((s["start_time"], s["end_time"], s["start_char"], s["end_char"]) for s in sentences)
+
+    spans = []
+    char_pos = 0
+    sentence_start = None
+    for word, start, end in zip(word_index.words, word_index.starts, word_index.ends):
+        if sentence_start is None:
+            sentence_start = (float(start), char_pos)
+        char_pos += len(word) + 1
+        if word.rstrip('"\')').endswith(SENTENCE_ENDINGS):
+            spans.append((sentence_start[0], float(end), sentence_start[1], char_pos - 1))
+            sentence_start = None
+    if sentence_start is not None:
+        spans.append((sentence_start[0], float(word_index.ends[-1]), sentence_start[1], char_pos - 1))
+    return spans
+
+
+def sliding_window_candidates(sentences: list, min_duration: float, max_duration: float) -> list:
+    """
+    Every span that starts at a sentence start and ends at a sentence end with a
+    duration in [min_duration, max_duration], as CandidateSpan tuples.
+    Both window pointers only move forward, so the pass is linear in the number of
+    sentences plus the number of candidates emitted.
+    """
+    candidates = []
+    n = len(sentences)
+    lo = hi = 0  # [lo, hi) = sentence ends that fit the window for the current start
+    for i in range(n):
+        start_time = sentences[i][0]
+        lo = max(lo, i)
+        hi = max(hi, i)
+        while lo < n and sentences[lo][1] - start_time < min_duration:
+            lo += 1
+        while hi < n and sentences[hi][1] - start_time <= max_duration:
+            hi += 1
+        for j in range(lo, hi):
+            candidates.append(CandidateSpan(start_time, sentences[j][1], sentences[i][2], sentences[j][3]))
+    return candidates
+
+
+def rank_candidates(candidates: list, scorer) -> list:
+    """(candidate, score) pairs sorted by engagement score, highest first, scored in one batch"""
+    scores = scorer.score_times([c.start_time for c in candidates], [c.end_time for c in candidates])
+    order = np.argsort(-scores, kind='stable')
+    return [(candidates[i], float(scores[i])) for i in order]
+
+
+def select_non_overlapping(ranked: list, max_clips: int, min_score: float = 0.6, always_keep: int = 2) -> list:
+    """
+    Greedy interval scheduling over (clip, score) pairs sorted by score: take the
+    best clips that do not overlap an already chosen one. The first `always_keep`
+    picks are taken regardless of score, later ones need at least `min_score`.
+    """
+    chosen_starts = []
+    chosen_ends = []
+    selected = []
+    for clip, score in ranked:
+        if len(selected) >= max_clips:
+            break
+        if len(selected) >= always_keep and score < min_score:
+            break
+        pos = bisect_left(chosen_starts, clip.start_time)
+        if pos > 0 and chosen_ends[pos - 1] > clip.start_time:
+            continue
+        if pos < len(chosen_starts) and chosen_starts[pos] < clip.end_time:
+            continue
+        chosen_starts.insert(pos, clip.start_time)
+        chosen_ends.insert(pos, clip.end_time)
+        selected.append((clip, score))
+    return selected
@@ -0,0 +1,158 @@
+"""
+Resumable checkpoint manifests.
+One JSON manifest per source records what the source was (content hash and
+the settings it is processed with), the clips chosen for it, and per stage
+and per clip what was produced, with the hashes of the files written. A
+restarted run loads it, skips every step whose artifacts are still intact
+and resumes at the first incomplete one. main.py keeps one per input video
+in output/manifests/; the Telegram bot keeps one per YouTube video in
+cache/manifests/.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from transcription_store import file_content_hash
+
+DEFAULT_MANIFEST_DIR = os.path.join('cache', 'manifests')
+MANIFEST_VERSION = 1
+
+# Clip boundaries as stored in a manifest; has the attributes the render code reads from clipsai's Clip
+ClipSpan = namedtuple('ClipSpan', 'start_time end_time start_char end_char')
+
+
+def timestamp() -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def artifact(path: str) -> dict:
+    """Manifest record of a file: where it is, its size and its content hash"""
+    return {'path': os.path.abspath(path), 'bytes': os.path.getsize(path), 'hash': file_content_hash(path)}
+
+
+def artifact_intact(record: dict) -> bool:
+    """True if the recorded file still exists with the same contents"""
+    path = record.get('path')
+    if not path or not os.path.exists(path) or os.path.getsize(path) != record.get('bytes'):
+        return False
+    return file_content_hash(path) == record.get('hash')
+
+
+class Checkpoint:
+    """
+    A source's manifest. Completing a stage or a clip step saves it
+    atomically, so a crash never leaves a half-written file. Safe to update
+    from several threads (e.g. concurrent clip renders).
+    """
+
+    def __init__(self, path: str, data: dict):
+        self.path = path
+        self.data = data
+        self._lock = threading.RLock()
+
+    @classmethod
+    def open(cls, path: str, **identity):
+        """
+        The manifest at path if it was written for the same identity (content
+        hash, settings, ...); otherwise, or if it is missing or unreadable, a
+        fresh one. A fresh manifest is not written until the first save().
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION and all(data.get(k) == v for k, v in identity.items()):
+                return cls(path, data)
+        except (OSError, ValueError):
+            pass
+        return cls(path, dict(identity, version=MANIFEST_VERSION, status='running', started=timestamp(),
+                              stages={}, timings={}, clips=[]))
+
+    @property
+    def resumed(self) -> bool:
+        """True if earlier progress was loaded"""
+        return bool(self.data['stages'])
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f'{self.path}.{uuid.uuid4().hex}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def update(self, **fields):
+        with self._lock:
+            self.data.update(fields)
+            self.save()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    # Stages
+
+    def stage(self, name: str):
+        """The completed stage's record, or None if it hasn't completed or its artifacts are gone"""
+        record = self.data['stages'].get(name)
+        if record is None or not all(artifact_intact(a) for a in record.get('artifacts', {}).values() if a):
+            return None
+        return record
+
+    def complete_stage(self, name: str, artifacts: dict = None, **info):
+        """Record a stage as done along with its info and the files it wrote ({name: path})"""
+        with self._lock:
+            record = dict(info, finished=timestamp())
+            if artifacts:
+                record['artifacts'] = {k: artifact(p) if p else None for k, p in artifacts.items()}
+            self.data['stages'][name] = record
+            self.save()
+        return record
+
+    def reset_stages(self, *names):
+        """Forget completed stages (and their per-clip steps when 'select' is among them)"""
+        with self._lock:
+            for name in names:
+                self.data['stages'].pop(name, None)
+            if 'select' in names:
+                self.data['clips'] = []
+            self.save()
+
+    # Clips
+
+    def set_clips(self, clips: list):
+        """Record the chosen clips as (clip, score) pairs; steps recorded for earlier clips are dropped"""
+        with self._lock:
+            self.data['clips'] = [{
+                'start_time': float(clip.start_time),
+                'end_time': float(clip.end_time),
+                'start_char': clip.start_char,
+                'end_char': clip.end_char,
+                'score': round(float(score), 4) if score is not None else None,
+                'steps': {},
+            } for clip, score in clips]
+            self.save()
+
+    def clips(self) -> list:
+        """The chosen clips as (ClipSpan, score) pairs"""
+        return [(ClipSpan(c['start_time'], c['end_time'], c['start_char'], c['end_char']), c['score'])
+                for c in self.data['clips']]
+
+    def clip_step(self, index: int, step: str):
+        """The clip's completed step record, or None if it hasn't completed or its artifacts are gone"""
+        record = self.data['clips'][index]['steps'].get(step)
+        if record is None or not all(artifact_intact(a) for a in record.get('artifacts', {}).values() if a):
+            return None
+        return record
+
+    def complete_clip_step(self, index: int, step: str, artifacts: dict = None, **info):
+        with self._lock:
+            record = dict(info, finished=timestamp())
+            if artifacts:
+                record['artifacts'] = {k: artifact(p) if p else None for k, p in artifacts.items()}
+            self.data['clips'][index]['steps'][step] = record
+            self.save()
+        return record
@@ -0,0 +1,230 @@
+"""
+Chunked, parallel transcription for long inputs.
+A cheap energy pass over the decoded audio track finds pauses near every
+CHUNK_SECONDS; the chunks between them (plus a little overlap) are
+transcribed in parallel worker processes, each holding its own model, and
+the word timings are shifted back onto the source timeline and stitched,
+with every word in an overlap kept by exactly one chunk.
+"""
+
+import multiprocessing
+import os
+from multiprocessing import util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+
+from audio_track import SAMPLE_RATE, AudioTrack, extract_audio
+
+FRAME_SECONDS = 0.03
+CHUNK_SECONDS = 300
+SEARCH_SECONDS = 20  # how far from the nominal boundary to look for a pause
+PAUSE_SECONDS = 0.5  # energy is averaged over this window so cuts land inside pauses
+OVERLAP_SECONDS = 1.0
+THREADS_PER_WORKER = 4
+
+
+def frame_energies(samples: np.ndarray, frame_seconds: float = FRAME_SECONDS) -> np.ndarray:
+    """
+    Mean energy (dBFS) per frame of a 16 kHz buffer, computed block by block
+    so a memory-mapped track is never loaded whole.
+    """
+    frame_len = int(SAMPLE_RATE * frame_seconds)
+    block = frame_len * 10000
+    n_frames = len(samples) // frame_len
+    energies = np.empty(n_frames, dtype=np.float32)
+    for start in range(0, n_frames * frame_len, block):
+        frames = np.asarray(samples[start:min(start + block, n_frames * frame_len)]).reshape(-1, frame_len)
+        power = np.mean(frames ** 2, axis=1)
+        energies[start // frame_len:start // frame_len + len(power)] = 10 * np.log10(power + 1e-10)
+    return energies
+
+
+def split_points(energies: np.ndarray, chunk_seconds: float = CHUNK_SECONDS,
+                 search_seconds: float = SEARCH_SECONDS, frame_seconds: float = FRAME_SECONDS) -> list:
+    """
+    Chunk boundaries in seconds, [0, ..., duration]: each cut is placed at the
+    quietest pause within search_seconds of the next nominal chunk end.
+    """
+    duration = len(energies) * frame_seconds
+    if duration <= chunk_seconds + search_seconds:
+        return [0.0, duration]
+    window = max(1, int(PAUSE_SECONDS / frame_seconds))
+    smoothed = np.convolve(energies, np.ones(window) / window, mode='same')
+    search = int(search_seconds / frame_seconds)
+    chunk = int(chunk_seconds / frame_seconds)
+
+    cuts = [0]
+    while len(energies) - cuts[-1] > chunk + search:
+        target = cuts[-1] + chunk
+        lo, hi = target - search, target + search
+        cuts.append(lo + int(np.argmin(smoothed[lo:hi])))
+    return [c * frame_seconds for c in cuts] + [duration]
+
+
+_profile = None
+
+
+def init_chunk_worker(profile: str = None, threads: int = THREADS_PER_WORKER, ready=None):
+    """
+    Process pool initializer: pin the worker's thread count before the models
+    are imported. With a `ready` queue, Whisper is warmed here, once per
+    worker, and a warm_up_report() is put on the queue.
+    """
+    global _profile
+    _profile = profile
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+    import torch
+    torch.set_num_threads(threads)
+    from models import get_registry, warm_up_report
+    get_registry().threads = threads
+    util.Finalize(None, _unload_models, exitpriority=10)
+    if ready is not None:
+        ready.put(warm_up_report(profile, clips=False))
+
+
+def _unload_models():
+    from models import get_registry
+    get_registry().unload()
+
+
+def detect_chunk_language(track_path: str) -> str:
+    from models import get_registry
+    return get_registry().detect_language(AudioTrack(track_path).samples, _profile)
+
+
+def transcribe_chunk(track_path: str, start_time: float, end_time: float, language: str = None) -> dict:
+    """
+    Transcribe [start_time, end_time] of the decoded track at track_path.
+    Returns plain, picklable chars and words with times on the source timeline.
+    """
+    from clipsai.transcribe.exceptions import NoSpeechError
+    from models import get_registry
+
+    try:
+        audio = np.array(AudioTrack(track_path).slice(start_time, end_time))
+        transcription = get_registry().transcribe(audio, _profile, language)
+    except NoSpeechError:
+        return {'language': language, 'source_software': None, 'chars': [], 'words': []}
+
+    def shift(t):
+        return None if t is None else float(t) + start_time
+
+    return {
+        'language': transcription.language,
+        'source_software': transcription.source_software,
+        'chars': [(c['char'], shift(c['start_time']), shift(c['end_time'])) for c in transcription.get_char_info()],
+        'words': [(w['start_char'], w['end_char'], float(w['start_time']) + start_time, float(w['end_time']) + start_time)
+                  for w in transcription.get_word_info()],
+    }
+
+
+def stitch_chunks(chunks: list, boundaries: list, language: str = None):
+    """
+    Join per-chunk results into one clipsai Transcription. A word belongs to
+    the chunk whose [boundary, next boundary) range holds its midpoint, so
+    words heard twice in an overlap are kept once.
+    """
+    from clipsai.transcribe.transcription import Transcription
+
+    char_info = []
+    for i, chunk in enumerate(chunks):
+        own_start, own_end = boundaries[i], boundaries[i + 1]
+        last = i == len(chunks) - 1
+        for start_char, end_char, start_time, end_time in chunk['words']:
+            middle = (start_time + end_time) / 2
+            if middle < own_start or (middle >= own_end and not last):
+                continue
+            if char_info:
+                char_info.append({'char': ' ', 'start_time': None, 'end_time': None, 'speaker': None})
+            for char, char_start, char_end in chunk['chars'][start_char:end_char]:
+                char_info.append({'char': char, 'start_time': char_start, 'end_time': char_end, 'speaker': None})
+
+    if not char_info:
+        raise ValueError('No speech found in any chunk')
+    detected = next((c['language'] for c in chunks if c['language']), None)
+    return Transcription({
+        'source_software': next((c['source_software'] for c in chunks if c['source_software']), 'whisperx-v3'),
+        'time_created': datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"),
+        'language': language or detected or 'en',
+        'num_speakers': None,
+        'char_info': char_info,
+    })
+
+
+class ChunkedTranscriber:
+    """
+    Transcribes long files as parallel chunks in a pool of worker processes.
+    Each worker loads its own model once and gets `threads` intra-op threads,
+    so workers * threads stays within the core budget.
+    """
+
+    def __init__(self, profile: str = None, workers: int = None, chunk_seconds: float = CHUNK_SECONDS,
+                 total_threads: int = None):
+        cores = total_threads or os.cpu_count() or 1
+        self.workers = max(1, min(workers or cores // THREADS_PER_WORKER, cores))
+        self.threads = max(1, cores // self.workers)
+        self.profile = profile
+        self.chunk_seconds = chunk_seconds
+        self._pool = None
+
+    def start(self, warm_up: bool = True):
+        """Start the worker processes and (optionally) load their models right away"""
+        if self._pool is None:
+            context = multiprocessing.get_context('spawn')
+            ready = context.Queue() if warm_up else None
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=init_chunk_worker,
+                initargs=(self.profile, self.threads, ready)
+            )
+            if warm_up:
+                from models import start_workers
+                errors = [r['error'] for r in start_workers(self._pool, self.workers, ready) if r['error']]
+                if errors:
+                    raise RuntimeError(f'Chunk worker warm-up failed: {errors[0]}')
+        return self
+
+    def transcribe(self, media_path: str, language: str = None, progress_callback=None):
+        """
+        Transcribe media_path chunk by chunk; progress_callback(seconds_done) runs
+        as chunks finish. With no language, it is detected once from the start of
+        the media and used for every chunk.
+        """
+        self.start(warm_up=False)
+        track = extract_audio(media_path)
+        if language is None:
+            language = self._pool.submit(detect_chunk_language, track.path).result()
+        boundaries = split_points(frame_energies(track.samples), self.chunk_seconds)
+        duration = boundaries[-1]
+
+        futures = {}
+        for i in range(len(boundaries) - 1):
+            start = max(0.0, boundaries[i] - OVERLAP_SECONDS)
+            end = min(duration, boundaries[i + 1] + OVERLAP_SECONDS)
+            futures[self._pool.submit(transcribe_chunk, track.path, start, end, language)] = i
+
+        chunks = [None] * len(futures)
+        done_seconds = 0.0
+        for future in as_completed(futures):
+            i = futures[future]
+            chunks[i] = future.result()
+            done_seconds += boundaries[i + 1] - boundaries[i]
+            if progress_callback:
+                progress_callback(done_seconds)
+        return stitch_chunks(chunks, boundaries, language)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,49 @@
+"""
+ClipFinder with a shared sentence embedder.
+clipsai's ClipFinder.find_clips() builds a new TextEmbedder (RoBERTa) on
+every call. SharedEmbedderClipFinder takes an already loaded embedder and
+runs the same TextTiling rounds with it, so the weights load once per
+process. find_clips() follows clipsai 0.2.1 (clipsai/clip/clipfinder.py);
+re-check it when upgrading clipsai.
+"""
+
+from clipsai import ClipFinder
+from clipsai.clip.clip import Clip
+
+# TextTiling window sizes and the minimum clip duration each group of rounds uses
+# (None = the finder's min_clip_duration); clipsai 0.2.1's values
+TILING_ROUNDS = (((5, 7), None), ((11, 17), 180), ((37, 53, 73, 97), 600))
+
+
+class SharedEmbedderClipFinder(ClipFinder):
+    """ClipFinder that embeds sentences with the embedder it was given instead of loading its own"""
+
+    def __init__(self, text_embedder, **kwargs):
+        super().__init__(**kwargs)
+        self.text_embedder = text_embedder
+
+    def find_clips(self, transcription) -> list:
+        sentences_info = transcription.get_sentence_info()
+        sentence_embeddings = self.text_embedder.embed_sentences([s["sentence"] for s in sentences_info])
+
+        # The whole media is a candidate when it is short enough
+        clips = []
+        if transcription.end_time <= self._max_clip_duration:
+            clips.append({
+                "start_char": 0,
+                "end_char": len(transcription.get_char_info()),
+                "start_time": 0,
+                "end_time": transcription.end_time,
+                "norm": 1.0,
+            })
+        for k_values, min_duration in TILING_ROUNDS:
+            for k in k_values:
+                clips = self._text_tile_multiple_rounds(
+                    sentences_info,
+                    sentence_embeddings,
+                    k,
+                    min_duration or self._min_clip_duration,
+                    self._max_clip_duration,
+                    clips,
+                )
+        return [Clip(c["start_time"], c["end_time"], c["start_char"], c["end_char"]) for c in clips]
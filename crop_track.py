@@ -0,0 +1,81 @@
+"""
+Whole-video crop tracks.
+The speaker diarization and face-tracked 9:16 crop path are computed once
+for the full source video; each clip's crop segments are then cut out of
+that track instead of re-analysing every clip.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from audio_track import extract_audio
+
+TRACK_FILE = 'crop_segments.npy'
+TRACK_META_FILE = 'meta.json'
+
+
+class CropTrack:
+    """Crop rectangle position over the whole source: one (start, end, x, y) row per segment"""
+
+    def __init__(self, crop_width: int, crop_height: int, segments: np.ndarray, speaker_segments: list = None):
+        self.crop_width = int(crop_width)
+        self.crop_height = int(crop_height)
+        self.segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+        self.speaker_segments = speaker_segments or []
+
+    @classmethod
+    def from_crops(cls, crops, speaker_segments: list = None):
+        """Build a track from the Crops returned by a resize() over the full source"""
+        segments = crops.to_dict()["segments"]
+        return cls(crops.crop_width, crops.crop_height,
+                   [(s["start_time"], s["end_time"], s["x"], s["y"]) for s in segments],
+                   speaker_segments)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def slice(self, start_time: float, end_time: float) -> list:
+        """
+        Crop segments covering [start_time, end_time], in the format of clipsai's
+        Crops segments with times relative to start_time.
+        """
+        starts, ends = self.segments[:, 0], self.segments[:, 1]
+        lo = int(np.searchsorted(ends, start_time, side='right'))
+        hi = int(np.searchsorted(starts, end_time, side='left'))
+        result = []
+        for seg_start, seg_end, x, y in self.segments[lo:hi].tolist():
+            seg_start, seg_end = max(seg_start, start_time), min(seg_end, end_time)
+            if seg_end > seg_start:
+                result.append({
+                    'start_time': round(seg_start - start_time, 6),
+                    'end_time': round(seg_end - start_time, 6),
+                    'x': int(x),
+                    'y': int(y),
+                })
+        return result
+
+    def save(self, directory: str):
+        np.save(os.path.join(directory, TRACK_FILE), self.segments)
+        with open(os.path.join(directory, TRACK_META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                'crop_width': self.crop_width,
+                'crop_height': self.crop_height,
+                'num_segments': len(self.segments),
+                'speaker_segments': self.speaker_segments,
+            }, f)
+
+    @classmethod
+    def load(cls, directory: str):
+        with open(os.path.join(directory, TRACK_META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return cls(meta['crop_width'], meta['crop_height'],
+                   np.load(os.path.join(directory, TRACK_FILE)), meta.get('speaker_segments'))
+
+
+def compute_crop_track(models, video_path: str, aspect_ratio: tuple = (9, 16)) -> CropTrack:
+    """Diarize (from the decoded audio track) and face-track the whole video once with the shared models"""
+    speaker_segments = models.diarize(extract_audio(video_path).samples)
+    crops = models.resize(video_path, aspect_ratio=aspect_ratio, speaker_segments=speaker_segments)
+    return CropTrack.from_crops(crops, speaker_segments)
@@ -0,0 +1,141 @@
+"""
+Two-phase media ingest for the Telegram bot.
+Phase one fetches only the audio stream so transcription can start right
+away; phase two fetches video just for the time ranges that become shorts,
+using yt-dlp section downloads. Works for any URL yt-dlp can handle,
+including plain media files served over HTTP; serve_media() is a local
+HTTP stand-in for trying the ingest against files on disk.
+"""
+
+import os
+import re
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from tracing import span
+
+AUDIO_FORMAT = 'bestaudio[ext=m4a]/bestaudio/best'
+# Sections are fetched no taller than the output profile can use: a 9:16 crop keeps the full height
+VIDEO_FORMAT = 'best[ext=mp4][height<={max_height}]/best[height<={max_height}]/best'
+MAX_VIDEO_HEIGHT = 720
+# Seconds fetched before each section. Sections are stream copies that begin on
+# the keyframe before the cut, so the render seeks accurately into the pre-roll.
+SECTION_PREROLL = 2.0
+
+
+def youtube_video_id(url: str) -> str:
+    """
+    The video id of a watch, youtu.be, /shorts/, /live/ or /embed/ link, ignoring
+    tracking parameters like ?si=; other URLs fall back to their last path segment
+    """
+    parsed = urlparse(url.strip())
+    video_id = parse_qs(parsed.query).get('v', [''])[0]
+    if not video_id:
+        segments = [s for s in parsed.path.split('/') if s]
+        video_id = segments[-1] if segments else parsed.netloc
+    return video_id
+
+
+def _download(url: str, opts: dict) -> tuple:
+    """Run yt-dlp and return (downloaded file path, info dict)"""
+    import yt_dlp
+
+    opts = {'quiet': True, 'no_warnings': True, 'noprogress': True, **opts}
+    with span('download', format=opts['format'], section='download_ranges' in opts) as s, \
+            yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+        s.set(bytes_downloaded=sum(d.get('filesize') or d.get('filesize_approx') or 0
+                                   for d in info.get('requested_downloads') or []))
+    downloads = info.get('requested_downloads') or [info]
+    return downloads[0].get('filepath') or downloads[0].get('_filename'), info
+
+
+def probe_url(url: str) -> dict:
+    """Metadata (title, duration, id, ...) without downloading anything"""
+    import yt_dlp
+
+    with span('probe'), yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+def fetch_audio(url: str, output_dir: str, prefix: str) -> tuple:
+    """Phase one: download only the audio stream. Returns (audio_path, info)."""
+    return _download(url, {
+        'format': AUDIO_FORMAT,
+        'outtmpl': os.path.join(output_dir, f'{prefix}_audio.%(ext)s'),
+    })
+
+
+def fetch_section(url: str, start_time: float, end_time: float, output_dir: str, prefix: str,
+                  max_height: int = MAX_VIDEO_HEIGHT) -> tuple:
+    """
+    Phase two: download the video for [start_time, end_time] plus a short
+    pre-roll, at most max_height pixels tall. The section is stream-copied,
+    not re-encoded, so the render stays the only encode. Returns
+    (section_path, offset): start_time is at `offset` seconds into the section.
+    """
+    from yt_dlp.utils import download_range_func
+
+    section_start = max(0.0, start_time - SECTION_PREROLL)
+    path, _ = _download(url, {
+        'format': VIDEO_FORMAT.format(max_height=max_height),
+        'outtmpl': os.path.join(output_dir, f'{prefix}_section.%(ext)s'),
+        'download_ranges': download_range_func(None, [(section_start, end_time)]),
+    })
+    return path, start_time - section_start
+
+
+class _MediaRequestHandler(SimpleHTTPRequestHandler):
+    """Static files with single-range requests, which ffmpeg needs to seek in remote mp4s"""
+
+    def send_head(self):
+        match = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get('Range', ''))
+        path = self.translate_path(self.path)
+        if not match or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        first, last = match.groups()
+        start = int(first) if first else max(0, size - int(last or 0))
+        end = min(int(last), size - 1) if first and last else size - 1
+        if start > end:
+            self.send_error(416, 'Requested range not satisfiable')
+            return None
+        f = open(path, 'rb')
+        f.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        self._remaining = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        remaining = getattr(self, '_remaining', None)
+        if remaining is None:
+            return super().copyfile(source, outputfile)
+        while remaining > 0:
+            chunk = source.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+        self._remaining = None
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_media(directory: str, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """
+    Serve the files in directory over HTTP on a background thread, so
+    fetch_audio()/fetch_section() can be run against local media instead of
+    YouTube. The files are at http://<host>:<server.server_port>/<name>;
+    call server.shutdown() when done.
+    """
+    server = ThreadingHTTPServer((host, port), partial(_MediaRequestHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, name='media-server', daemon=True).start()
+    return server
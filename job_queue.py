@@ -0,0 +1,123 @@
+"""
+Persistent job queue for the Telegram bot.
+Jobs live in SQLite so queued work survives restarts. Jobs are handed out
+round-robin across users (everyone's first job before anyone's second),
+and admission control caps both the per-user and the total backlog.
+"""
+
+import math
+import os
+import sqlite3
+import time
+
+DEFAULT_QUEUE_PATH = os.path.join('cache', 'jobs.sqlite3')
+DEFAULT_JOB_SECONDS = 10 * 60  # ETA guess until some jobs have finished
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    num_clips INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, chat_id);
+"""
+
+# Queued jobs in dispatch order: a user's n-th queued job ranks after every
+# other user's (n-1)-th, counting their running jobs as already served
+FAIR_ORDER_SQL = """
+SELECT id, chat_id, url, num_clips, created_at FROM (
+    SELECT q.*,
+           ROW_NUMBER() OVER (PARTITION BY q.chat_id ORDER BY q.id)
+           + (SELECT COUNT(*) FROM jobs r WHERE r.chat_id = q.chat_id AND r.status = 'running') AS turn
+    FROM jobs q WHERE q.status = 'queued'
+) ORDER BY turn, id
+"""
+
+
+class QueueFullError(Exception):
+    """Raised when a job is rejected by admission control"""
+
+
+class JobQueue:
+    """SQLite-backed FIFO with per-user round-robin fairness and admission limits"""
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, max_queued: int = 50, max_per_user: int = 3):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.max_queued = max_queued
+        self.max_per_user = max_per_user
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(SCHEMA)
+
+    def requeue_interrupted(self) -> int:
+        """Put jobs that were running when the process died back in the queue"""
+        cur = self._db.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (QUEUED, RUNNING))
+        return cur.rowcount
+
+    def enqueue(self, chat_id: int, url: str, num_clips: int) -> int:
+        """Add a job and return its id; raises QueueFullError if admission control rejects it"""
+        active = self.user_active(chat_id)
+        if active >= self.max_per_user:
+            raise QueueFullError(f"You already have {active} videos in progress. Please wait!")
+        if self.depth()[QUEUED] >= self.max_queued:
+            raise QueueFullError("The bot is very busy right now. Please try again in a few minutes!")
+        cur = self._db.execute(
+            "INSERT INTO jobs (chat_id, url, num_clips, status, created_at) VALUES (?, ?, ?, ?, ?)",
+            (chat_id, url, num_clips, QUEUED, time.time())
+        )
+        return cur.lastrowid
+
+    def claim_next(self):
+        """Mark the next fair-order queued job as running and return it as a dict, or None"""
+        row = self._db.execute(FAIR_ORDER_SQL + " LIMIT 1").fetchone()
+        if row is None:
+            return None
+        self._db.execute("UPDATE jobs SET status = ?, started_at = ? WHERE id = ?", (RUNNING, time.time(), row['id']))
+        return dict(row)
+
+    def finish(self, job_id: int, status: str = DONE):
+        self._db.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?", (status, time.time(), job_id))
+
+    def user_active(self, chat_id: int) -> int:
+        """Number of queued or running jobs for a user"""
+        return self._db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE chat_id = ? AND status IN (?, ?)", (chat_id, QUEUED, RUNNING)
+        ).fetchone()[0]
+
+    def depth(self) -> dict:
+        """Job counts for the queued and running states"""
+        counts = {QUEUED: 0, RUNNING: 0}
+        for status, count in self._db.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE status IN (?, ?) GROUP BY status", (QUEUED, RUNNING)):
+            counts[status] = count
+        return counts
+
+    def position(self, job_id: int):
+        """1-based position of a queued job in dispatch order, or None if it is not queued"""
+        for pos, row in enumerate(self._db.execute(FAIR_ORDER_SQL), 1):
+            if row['id'] == job_id:
+                return pos
+        return None
+
+    def average_job_seconds(self, sample: int = 20) -> float:
+        rows = self._db.execute(
+            "SELECT finished_at - started_at FROM jobs WHERE status = ? AND started_at IS NOT NULL "
+            "ORDER BY finished_at DESC LIMIT ?", (DONE, sample)
+        ).fetchall()
+        if not rows:
+            return DEFAULT_JOB_SECONDS
+        return sum(r[0] for r in rows) / len(rows)
+
+    def eta_seconds(self, position: int, slots: int) -> float:
+        """Rough wait until a job at `position` starts, given `slots` jobs run at once"""
+        return math.ceil(position / max(1, slots)) * self.average_job_seconds()
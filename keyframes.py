@@ -0,0 +1,187 @@
+"""
+Keyframe index and smart-cut trimming.
+The keyframe times of a source's video stream are collected with one
+ffprobe packet scan (no decoding) and cached. smart_cut() uses them to trim
+frame-accurately at close to stream-copy speed: the GOP-aligned middle of
+the range is copied as is and only the partial GOPs at the two edges are
+re-encoded. Only closed-GOP H.264 is cut this way: the edges are encoded
+with the source's profile and level and every part is joined as MPEG-TS,
+whose in-band SPS/PPS let a decoder switch parameter sets at each join.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import uuid
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from audio_track import media_cache_key, probe, stream_info
+from tracing import run_ffmpeg, span
+
+DEFAULT_KEYFRAME_DIR = os.path.join('cache', 'keyframes')
+# x264 profiles for the source profiles the edge GOPs can match
+H264_PROFILES = {'Constrained Baseline': 'baseline', 'Baseline': 'baseline', 'Main': 'main', 'High': 'high'}
+MIN_COPY_SECONDS = 1.0  # below this the three-part cut isn't worth it
+
+
+class KeyframeIndex:
+    """
+    Sorted timestamps (seconds) of the keyframes of a video's first video
+    stream that start a closed GOP, i.e. that copying can start at
+    """
+
+    def __init__(self, times):
+        self.times = np.asarray(times, dtype=np.float64)
+        self._list = self.times.tolist()
+
+    @classmethod
+    def scan(cls, path: str):
+        """
+        One packet-level pass over the video stream; nothing is decoded. A
+        keyframe followed (in decode order) by a packet shown before it opens
+        an open GOP, e.g. an HEVC CRA or an x264 --open-gop I-frame, and is left out.
+        """
+        offset = float(probe(path).get('format', {}).get('start_time') or 0)
+        out = subprocess.check_output([
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path
+        ]).decode()
+        times = []
+        key = None
+        for line in out.splitlines():
+            pts, _, flags = line.partition(',')
+            if pts in ('', 'N/A'):
+                continue
+            t = float(pts) - offset  # seek positions are relative to the file start
+            if 'K' in flags:
+                if key is not None:
+                    times.append(key)
+                key = t
+            elif key is not None and t < key:
+                key = None  # a leading picture references the previous GOP
+        if key is not None:
+            times.append(key)
+        return cls(sorted(times))
+
+    @classmethod
+    def for_source(cls, path: str, cache_dir: str = DEFAULT_KEYFRAME_DIR):
+        """The cached index for path, scanning the file on the first call"""
+        cache_path = os.path.join(cache_dir, f'{media_cache_key(path)}.closed.npy')
+        if os.path.exists(cache_path):
+            return cls(np.load(cache_path))
+        index = cls.scan(path)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f'{cache_path}.{uuid.uuid4().hex}.npy'
+        np.save(tmp_path, index.times)
+        os.replace(tmp_path, cache_path)
+        return index
+
+    def __len__(self):
+        return len(self._list)
+
+    def at_or_after(self, t: float):
+        i = bisect_left(self._list, t)
+        return self._list[i] if i < len(self._list) else None
+
+    def at_or_before(self, t: float):
+        i = bisect_right(self._list, t)
+        return self._list[i - 1] if i else None
+
+
+def edge_encoder_args(video: dict):
+    """
+    libx264 options matching the source's H.264 profile, level and pixel
+    format, or None when smart_cut() can't match the stream and has to
+    re-encode the whole range
+    """
+    if not video or video.get('codec_name') != 'h264' or video.get('pix_fmt') != 'yuv420p':
+        return None
+    profile = H264_PROFILES.get(video.get('profile'))
+    if profile is None:
+        return None
+    args = ['-c:v', 'libx264', '-profile:v', profile, '-pix_fmt', 'yuv420p']
+    if video.get('level', 0) > 0:
+        args += ['-level:v', f"{video['level'] / 10:.1f}"]
+    return args
+
+
+def _encode_part(source_path: str, start_time: float, end_time: float, out_path: str, encoder_args: list,
+                 threads: int = None):
+    # x264 repeats SPS/PPS before every IDR in an MPEG-TS stream, so the join can switch to them
+    run_ffmpeg([
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-ss', f'{start_time:.6f}', '-i', source_path, '-t', f'{end_time - start_time:.6f}',
+        '-an', *encoder_args, '-preset', 'veryfast', '-crf', '18',
+        *(['-threads', str(threads)] if threads else []),
+        '-f', 'mpegts', '-y', out_path
+    ], 'trim_encode')
+
+
+def _copy_part(source_path: str, start_time: float, end_time: float, out_path: str):
+    # start_time starts a closed GOP, so input seeking lands on it exactly; Annex-B
+    # carries the source's SPS/PPS in band
+    run_ffmpeg([
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-ss', f'{start_time:.6f}', '-i', source_path, '-t', f'{end_time - start_time:.6f}',
+        '-an', '-c:v', 'copy', '-bsf:v', 'h264_mp4toannexb', '-avoid_negative_ts', 'make_zero',
+        '-f', 'mpegts', '-y', out_path
+    ], 'trim_copy')
+
+
+def smart_cut(source_path: str, start_time: float, end_time: float, output_path: str,
+              index: KeyframeIndex = None, threads: int = None) -> str:
+    """
+    Frame-accurate trim of [start_time, end_time] without re-encoding the
+    whole range. Audio is re-encoded for the range (cheap); video is copied
+    between the first and last closed-GOP keyframe inside the range and
+    encoded only before and after them. Falls back to a plain re-encode when
+    the source can't be matched (only 8-bit 4:2:0 Baseline/Main/High H.264)
+    or the range holds no full GOP.
+    """
+    source_path = os.path.abspath(source_path)
+    encoder_args = edge_encoder_args(stream_info(source_path, 'video'))
+    copy_start = copy_end = None
+    if encoder_args is not None:
+        index = index or KeyframeIndex.for_source(source_path)
+        copy_start, copy_end = index.at_or_after(start_time), index.at_or_before(end_time)
+
+    if copy_start is None or copy_end is None or copy_end - copy_start < MIN_COPY_SECONDS:
+        run_ffmpeg([
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            '-ss', f'{start_time:.6f}', '-i', source_path, '-t', f'{end_time - start_time:.6f}',
+            '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac', '-b:a', '192k',
+            *(['-threads', str(threads)] if threads else []),
+            '-movflags', '+faststart', '-y', os.path.abspath(output_path)
+        ], 'trim', mode='encode', duration=round(end_time - start_time, 3))
+        return os.path.abspath(output_path)
+
+    with span('trim', mode='smart', duration=round(end_time - start_time, 3)):
+        work_dir = tempfile.mkdtemp(prefix='smartcut_')
+        try:
+            parts = []
+            if copy_start > start_time:
+                parts.append(os.path.join(work_dir, 'head.ts'))
+                _encode_part(source_path, start_time, copy_start, parts[-1], encoder_args, threads)
+            parts.append(os.path.join(work_dir, 'middle.ts'))
+            _copy_part(source_path, copy_start, copy_end, parts[-1])
+            if end_time > copy_end:
+                parts.append(os.path.join(work_dir, 'tail.ts'))
+                _encode_part(source_path, copy_end, end_time, parts[-1], encoder_args, threads)
+
+            list_path = os.path.join(work_dir, 'parts.txt')
+            with open(list_path, 'w', encoding='utf-8') as f:
+                f.writelines(f"file '{p}'\n" for p in parts)
+            run_ffmpeg([
+                'ffmpeg', '-hide_banner', '-loglevel', 'error',
+                '-f', 'concat', '-safe', '0', '-i', list_path,
+                '-ss', f'{start_time:.6f}', '-i', source_path, '-t', f'{end_time - start_time:.6f}',
+                '-map', '0:v', '-map', '1:a?', '-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k',
+                '-movflags', '+faststart', '-shortest', '-y', os.path.abspath(output_path)
+            ], 'trim_concat')
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return os.path.abspath(output_path)
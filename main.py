@@ -13,29 +13,105 @@ os.environ['FFREPORT'] = 'file=ffmpeg.log:level=32'  # Only show errors, not war
 # Suppress HuggingFace tokenizers parallelism warnings
 os.environ['TOKENIZERS_PARALLELISM'] = 'false'
 
-import nltk
-from clipsai import Transcriber, ClipFinder, resize, MediaEditor, AudioVideoFile
-from clipsai.clip.clip import Clip
+import argparse
+import importlib.util
+import shutil
 import subprocess
 import json
+import queue
+import string
 import tempfile
+import threading
+import time
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
-nltk.download('punkt')
+from word_index import WordIndex
+from transcription_store import TranscriptionStore, file_content_hash
+from scoring import EngagementScorer
+from candidates import sentence_spans, sliding_window_candidates, rank_candidates, select_non_overlapping
+from models import get_registry
+from memory import children_peak_rss_mb, peak_rss_mb, rss_mb
+from audio_track import extract_audio, media_duration, probe, stream_info
+from chunked_transcription import THREADS_PER_WORKER, ChunkedTranscriber
+from crop_track import compute_crop_track
+from keyframes import smart_cut
+from checkpoint import Checkpoint, timestamp
+from pipeline import Pipeline, Stage
+from render import (OUTPUT_PROFILES, RenderScheduler, job_temp_path, render_clip, crop_segments_graph,
+                    passthrough_graph, ass_filter, output_size, resolve_output_profile)
+from titles import TitleService
+from transcription_profiles import PROFILES, is_valid_profile
+from tracing import span, tracer
 
 INPUT_DIR = 'input'
 OUTPUT_DIR = 'output'
 HUGGINGFACE_TOKEN = 'YOUR API KEY HERE'  # <-- User's actual token
 MIN_CLIP_DURATION = 45  # Minimum duration in seconds for YouTube Shorts
 MAX_CLIP_DURATION = 120  # Maximum duration in seconds for YouTube Shorts
+GROQ_API_KEY = "YOUR API KEY HERE"
+TITLE_API_URL = "https://api.groq.com/openai/v1"  # Any OpenAI-compatible chat completions API works
+TITLE_MODEL = "llama3-8b-8192"
+# A profile (fast, balanced, accurate; see transcription_profiles.py) or a plain model size.
+# large-v1 with clipsai's defaults is what main.py has always used; "balanced" is several times faster on CPU.
+TRANSCRIPTION_PROFILE = "large-v1"
+WHISPER_MODEL_SIZE = None  # Set to tiny, base, small, medium, large-v1 or large-v2 to override the profile
+TRANSCRIPTION_LANGUAGE = None  # e.g. 'en'; None detects the language once from the first 30 seconds
+RENDER_WORKERS = None  # Clips rendered in parallel; None picks a count from the CPU cores
+CHUNKED_TRANSCRIPTION = True  # Transcribe long videos as parallel chunks split at pauses
+TRANSCRIBE_WORKERS = None  # Chunk transcription processes; None picks a count from the CPU cores
+# Output size and encoder settings: preview (540x960, fast draft), standard (720x1280) or premium (1080x1920).
+# Shorts are never upscaled past the source's resolution.
+OUTPUT_PROFILE = "premium"
+SAVE_SOURCE_CLIPS = False  # Also save each clip's uncropped, unsubtitled cut of the source for manual editing
+CLIPS_PER_VIDEO = 2  # Maximum clips per video in batch and watch mode (interactive mode asks)
+WATCH_POLL_SECONDS = 10  # How often watch mode looks for new videos
+# Watch mode retries a failed or incomplete video after this long, doubling per attempt up to the
+# maximum; a changed file is retried on the next poll
+WATCH_RETRY_SECONDS = 60
+WATCH_RETRY_MAX_SECONDS = 6 * 3600
+PIPELINE_QUEUE_SIZE = 2  # Videos waiting in front of each pipeline stage; in watch mode newer ones wait in the folder
+# Videos each stage works on at the same time. Videos move through the stages
+# independently, so one can be transcribed while another is being rendered.
+PIPELINE_STAGES = ('ingest', 'transcribe', 'select', 'crop', 'render', 'title')
+PIPELINE_WORKERS = {'ingest': 1, 'transcribe': 1, 'select': 1, 'crop': 1, 'render': 2, 'title': 2}
+MANIFEST_DIR = 'manifests'  # Per-video manifests, inside the output directory
+# RSS ceiling in MB for the models (e.g. 12000 on a 16 GB node); None loads everything and keeps it.
+# When all models don't fit at once, videos are processed in phases (all transcriptions, then all
+# clip selections, then all crop analyses, ...) and idle models are evicted before the next one loads.
+MEMORY_BUDGET_MB = None
+# Models each stage needs; freed after the stage's phase when running under a tight memory budget
+STAGE_MODELS = {'transcribe': ('transcriber:', 'align:'), 'select': ('clip_finder', 'text_embedder'),
+                'crop': ('diarizer', 'resizer')}
+TRACE_DIR = 'traces'  # Per-run JSON traces (time, CPU and I/O per stage), inside the output directory
+# Imported only once processing starts; --check just looks them up
+REQUIRED_PACKAGES = ('clipsai', 'whisperx', 'torch', 'pyannote.audio', 'nltk')
 
-def get_transcription_file_path(input_path):
-    """Generate the transcription file path based on input video path"""
-    base_name = os.path.splitext(os.path.basename(input_path))[0]
-    return os.path.join(INPUT_DIR, f"{base_name}_transcription.pkl")
+# Settings that can come from a --config JSON file or the command line
+DEFAULT_SETTINGS = {
+    'input_dir': INPUT_DIR,
+    'output_dir': OUTPUT_DIR,
+    'clips': CLIPS_PER_VIDEO,
+    'min_duration': MIN_CLIP_DURATION,
+    'max_duration': MAX_CLIP_DURATION,
+    'profile': TRANSCRIPTION_PROFILE,
+    'model_size': WHISPER_MODEL_SIZE,
+    'language': TRANSCRIPTION_LANGUAGE,
+    'render_workers': RENDER_WORKERS,
+    'output_profile': OUTPUT_PROFILE,
+    'chunked': CHUNKED_TRANSCRIPTION,
+    'transcribe_workers': TRANSCRIBE_WORKERS,
+    'save_source_clips': SAVE_SOURCE_CLIPS,
+    'title_api_url': TITLE_API_URL,
+    'title_model': TITLE_MODEL,
+    'poll_seconds': WATCH_POLL_SECONDS,
+    'queue_size': PIPELINE_QUEUE_SIZE,
+    'stage_workers': PIPELINE_WORKERS,
+    'memory_budget': MEMORY_BUDGET_MB,
+}
 
 def load_existing_transcription(transcription_path):
-    """Load existing transcription if it exists"""
+    """Load an existing legacy .pkl transcription if it exists"""
     if os.path.exists(transcription_path):
         print(f"Found existing transcription: {transcription_path}")
         try:
@@ -48,42 +124,15 @@ def load_existing_transcription(transcription_path):
             return None
     return None
 
-def save_transcription(transcription, transcription_path):
-    """Save transcription to file (both .pkl and .json)"""
-    import json
-    try:
-        with open(transcription_path, 'wb') as f:
-            pickle.dump(transcription, f)
-        print(f"Transcription saved to: {transcription_path}")
-        # Save as JSON as well
-        json_path = os.path.splitext(transcription_path)[0] + '.json'
-        try:
-            # Try to use to_dict() if available
-            if hasattr(transcription, 'to_dict'):
-                data = transcription.to_dict()
-            # Try to use get_word_info() if available (common for transcript objects)
-            elif hasattr(transcription, 'get_word_info'):
-                data = transcription.get_word_info()
-            else:
-                data = transcription  # fallback
-            with open(json_path, 'w', encoding='utf-8') as jf:
-                json.dump(data, jf, ensure_ascii=False, indent=2)
-            print(f"Transcription also saved as JSON to: {json_path}")
-        except Exception as je:
-            print(f"Error saving transcription as JSON: {je}")
-    except Exception as e:
-        print(f"Error saving transcription: {e}")
-
-def transcribe_with_progress(audio_file_path, transcriber):
+def transcribe_with_progress(audio_file_path, models, profile, language=None, chunked=None):
     """Transcribe with progress tracking"""
     print('Transcribing video...')
     
     # Get video duration for progress calculation
     try:
-        probe_cmd = ['ffprobe', '-v', 'quiet', '-show_entries', 'format=duration', '-of', 'csv=p=0', audio_file_path]
-        duration = float(subprocess.check_output(probe_cmd).decode().strip())
+        duration = media_duration(audio_file_path)
         print(f"Video duration: {duration:.2f} seconds")
-    except:
+    except Exception:
         duration = 0
         print("Could not determine video duration for progress tracking")
     
@@ -95,24 +144,45 @@ def transcribe_with_progress(audio_file_path, transcriber):
         else:
             print(f"Transcription progress: {current_time:.1f}s processed")
     
-    # For now, we'll use a simple approach since clipsai doesn't expose progress directly
-    # You can enhance this by modifying the clipsai library or using a different approach
-    print("Starting transcription (progress updates may be limited)...")
-    transcription = transcriber.transcribe(audio_file_path=audio_file_path, iso6391_lang_code='en')
+    with span('transcribe', profile=profile, chunked=chunked is not None, duration=round(duration, 2)):
+        if chunked is not None:
+            # Chunks are transcribed in parallel; progress is reported as each one finishes
+            print(f"Starting chunked transcription with {chunked.workers} worker(s)...")
+            transcription = chunked.transcribe(audio_file_path, language, progress_callback)
+        else:
+            # A single whole-file run doesn't report progress
+            print("Starting transcription (progress updates may be limited)...")
+            audio = extract_audio(audio_file_path).samples
+            if language is None:
+                language = models.detect_language(audio, profile)
+                print(f"Detected language: {language}")
+            transcription = models.transcribe(audio, profile, language)
     print("Transcription completed!")
     return transcription
 
-def create_animated_subtitles(video_path, transcription, clip, output_path):
+# Subtitle styles: name, font and colour; the layout is designed for a 1080x1920 frame
+SUBTITLE_STYLES = (
+    ('Default', 'Montserrat-ExtraBold', '&H00FFFFFF'),
+    ('Yellow', 'Montserrat-ExtraBold', '&H0000FFFF'),
+    ('Fallback', 'Arial Rounded MT Bold', '&H00FFFFFF'),
+    ('FallbackYellow', 'Arial Rounded MT Bold', '&H0000FFFF'),
+    ('Fallback2', 'Arial Black', '&H00FFFFFF'),
+    ('Fallback2Yellow', 'Arial Black', '&H0000FFFF'),
+)
+
+def create_animated_subtitles(word_index, clip, ass_file, size=(1080, 1920)):
     """
     Create clean, bold subtitles matching the provided style: white bold for text, yellow bold for numbers/currency, no effects, TOP CENTER.
+    Writes an ASS file for the render stage to burn in and returns its path, or None if the clip has no words.
+    The layout (font size, outline, margins) is scaled to the rendered frame size.
     """
     print('Creating styled subtitles...')
     
     # Get word info for the clip
-    word_info = [w for w in transcription.get_word_info() if w["start_time"] >= clip.start_time and w["end_time"] <= clip.end_time]
+    word_info = word_index.word_info(clip.start_time, clip.end_time)
     if not word_info:
         print('No word-level transcript found for the clip. Skipping subtitles.')
-        return video_path
+        return None
     
     # Build cues: group words into phrases of max 25 chars
     cues = []
@@ -163,24 +233,28 @@ def create_animated_subtitles(video_path, transcription, clip, output_path):
     print("NOTE: Ensure 'Montserrat-ExtraBold' font is installed in your system-wide font directory (e.g., /Library/Fonts on macOS).")
 
     # Write ASS subtitle file with clean, bold styling at the TOP CENTER
-    ass_file = os.path.abspath(os.path.join(OUTPUT_DIR, 'temp_subtitles.ass'))
+    width, height = size
+    scale = height / 1920
+
+    def px(value):
+        return max(1, round(value * scale))
+
+    styles = ''.join(
+        f"Style: {name},{font},{px(80)},{colour},&H000000FF,&H40000000,&HFF000000,-1,0,0,0,100,100,"
+        f"{px(2)},0,1,{px(15)},0,8,{px(30)},{px(30)},{px(120)},1\n"
+        for name, font, colour in SUBTITLE_STYLES)
+    ass_file = os.path.abspath(ass_file)
     with open(ass_file, 'w', encoding='utf-8') as f:
-        f.write("""[Script Info]
+        f.write(f"""[Script Info]
 ScriptType: v4.00+
-PlayResX: 1080
-PlayResY: 1920
+PlayResX: {width}
+PlayResY: {height}
 WrapStyle: 1
 ScaledBorderAndShadow: yes
 
 [V4+ Styles]
 Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
-Style: Default,Montserrat-ExtraBold,80,&H00FFFFFF,&H000000FF,&H40000000,&HFF000000,-1,0,0,0,100,100,2,0,1,15,0,8,30,30,120,1
-Style: Yellow,Montserrat-ExtraBold,80,&H0000FFFF,&H000000FF,&H40000000,&HFF000000,-1,0,0,0,100,100,2,0,1,15,0,8,30,30,120,1
-Style: Fallback,Arial Rounded MT Bold,80,&H00FFFFFF,&H000000FF,&H40000000,&HFF000000,-1,0,0,0,100,100,2,0,1,15,0,8,30,30,120,1
-Style: FallbackYellow,Arial Rounded MT Bold,80,&H0000FFFF,&H000000FF,&H40000000,&HFF000000,-1,0,0,0,100,100,2,0,1,15,0,8,30,30,120,1
-Style: Fallback2,Arial Black,80,&H00FFFFFF,&H000000FF,&H40000000,&HFF000000,-1,0,0,0,100,100,2,0,1,15,0,8,30,30,120,1
-Style: Fallback2Yellow,Arial Black,80,&H0000FFFF,&H000000FF,&H40000000,&HFF000000,-1,0,0,0,100,100,2,0,1,15,0,8,30,30,120,1
-
+{styles}
 [Events]
 Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 """)
@@ -197,28 +271,7 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
             line = line.strip()
             f.write(f"Dialogue: 0,{start},{end},Default,,0,0,0,,{line}\n")
     
-    final_output = output_path.replace('.mp4', '_with_subtitles.mp4')
-    # Use absolute, forward-slash paths for ffmpeg (cross-platform)
-    abs_video_path = os.path.abspath(video_path)
-    abs_final_output = os.path.abspath(final_output)
-    ass_file_ffmpeg = ass_file.replace("\\", "/")
-    ffmpeg_cmd = [
-        'ffmpeg', '-i', abs_video_path,
-        '-vf', f'ass={ass_file_ffmpeg}',
-        '-c:a', 'copy',
-        '-y',
-        abs_final_output
-    ]
-    try:
-        result = subprocess.run(ffmpeg_cmd, check=True, capture_output=True)
-        os.remove(ass_file)
-        print(f'Styled subtitles added successfully!')
-        return abs_final_output
-    except subprocess.CalledProcessError as e:
-        print(f'Error adding subtitles: {e}')
-        print(f'FFmpeg stderr: {e.stderr.decode()}')
-        print(f'FFmpeg stdout: {e.stdout.decode()}')
-        return video_path
+    return ass_file
 
 def ass_time(seconds):
     hours = int(seconds // 3600)
@@ -227,270 +280,805 @@ def ass_time(seconds):
     centisecs = int((seconds % 1) * 100)
     return f"{hours:d}:{minutes:02d}:{secs:02d}.{centisecs:02d}"
 
-def get_viral_title(transcript_text, groq_api_key):
-    import requests
-    examples = [
-        "She was almost dead 😵", "He made $1,000,000 in 1 hour 💸", "This changed everything... 😲", "They couldn't believe what happened! 😱", "He risked it all for this 😬", "She said YES! 💍", "He lost everything in seconds 😢", "The offer that shocked everyone 🤯", "He walked away with $500,000 🤑", "She turned down the deal! 🙅‍♀️", "He quit his job for this 😳", "She broke the record! 🏆", "He lost it all in Vegas 🎰", "She found out the truth 😳", "He got a second chance 🙌", "She saved his life 🦸‍♀️", "He was left speechless 😶", "She made history 📚", "He got the golden buzzer! 🔔", "She walked away a millionaire 💰", "He faced his fears 😨", "She got the surprise of her life 😮", "He made the impossible possible 🤯", "She said what?! 😲", "He got caught on camera 🎥", "She made the deal of a lifetime 🤝", "He risked everything for love ❤️", "She shocked the judges 😱", "He got the last laugh 😂", "She turned the tables 🔄", "He made the ultimate sacrifice 🥲", "She got the call she was waiting for ☎️", "He pulled off the impossible 😮", "She got the offer of a lifetime 💼", "He made the crowd go wild 🙌", "She got the biggest surprise 😲", "He made the judges cry 😢", "She got the golden ticket 🎫", "He made the world record 🌍", "She got the best deal ever 🏆", "He made the crowd cheer 👏", "She got the shock of her life 😱", "He made the impossible happen 🤯", "She got the best surprise 🎉", "He made the judges laugh 😂", "She got the golden opportunity 🥇", "He made the best deal 💰", "She got the best offer 🏅", "He made the impossible real 😲", "She got the best surprise ever 🎉", "He made the judges smile 😊", "She got the golden chance 🥇", "He made the best offer 💸", "She got the best deal 💰", "He made the impossible true 🤯", "She got the best opportunity 🏆", "He made the judges happy 😃", "She got the golden moment 🥇", "He made the best surprise 🎉", "She got the best chance 🍀", "He made the impossible work 🤔", "She got the best moment 🏆", "He made the judges proud 👏", "She got the golden surprise 🥇", "He made the best opportunity 🏅", "She got the best smile 😊", "He made the impossible win 🏆", "She got the best win 🏆", "He made the judges amazed 😲", "She got the golden win 🥇", "He made the best smile 😊", "She got the best proud 😃", "He made the impossible proud 😎", "She got the best amazed 😲", "He made the judges win 🏆", "She got the golden proud 🥇", "He made the best amazed 😲", "She got the best win ever 🏆"
-    ]
-    prompt = (
-        "Given the following transcript, generate a catchy, viral YouTube Shorts title (max 7 words). "
-        "ALWAYS include an emoji in the title. ONLY output the title, nothing else. Do NOT use hashtags. Do NOT explain, do NOT repeat the prompt, do NOT add quotes. If you do not follow these instructions, your output will be discarded. The title should be in the style of these examples: "
-        + ", ".join(examples) + ".\n\nTranscript:\n" + transcript_text
-    )
-    headers = {
-        'Authorization': f'Bearer {groq_api_key}',
-        'Content-Type': 'application/json',
-    }
-    data = {
-        "model": "llama3-8b-8192",
-        "messages": [
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 30,
-        "temperature": 0.8
-    }
-    response = requests.post(
-        "https://api.groq.com/openai/v1/chat/completions",
-        headers=headers,
-        json=data
-    )
-    response.raise_for_status()
-    result = response.json()
-    # Just return the first line of the response as the title, and filter out any lines that look like explanations or quotes
-    content = result['choices'][0]['message']['content']
-    lines = [l.strip('"') for l in content.strip().split('\n') if l.strip() and not l.lower().startswith('here') and not l.lower().startswith('title:')]
-    title = lines[0] if lines else "Untitled Clip"
-    return title
-
-def calculate_engagement_score(clip, transcription):
+def safe_filename(s):
+    """Only remove characters not allowed in filenames, but keep spaces, punctuation, and emojis"""
+    valid_chars = f"-_.() {string.ascii_letters}{string.digits}" + "'!?,:;@#$%^&+=[]{}" + "😀😁😂🤣😃😄😅😆😉😊😋😎😍😘🥰😗😙😚🙂🤗🤩🤔🤨😐😑😶🙄😏😣😥😮🤐😯😪😫😴😌😛😜😝🤤😒😓😔😕🙃🤑😲☹️🙁😖😞😟😤😢😭😦😧😨😩🤯😬😰😱🥵🥶😳🤪😵😡😠🤬😷🤒🤕🤢🤮🥴😇🥳🥺🤠🤡🤥🤫🤭🧐🤓😈👿👹👺💀👻👽🤖💩😺😸😹😻😼😽🙀😿😾👍👎👌✌️🤞🤟🤘🤙🖕🖐️✋🖖👋🤚👐👏🙌👐🤲🙏✍️💅🤳💪🦵🦶👂👃🧠🦷🦴👀👁️👅👄💋👓🕶️🥽🥼🦺👔👕👖🧣🧤🧥🧦👗👘🥻🩱🩲🩳👙👚👛👜👝🛍️🎒👞👟🥾🥿👠👡👢👑👒🎩🎓🧢⛑️📿💄💍💎"  # common emoji block
+    return ''.join(c for c in s if c in valid_chars)
+
+def load_crop_track(input_path, models, store):
+    """Diarize and face-track the whole video once (or load the cached track); None if that fails"""
+    key = store.crop_track_key(input_path, (9, 16))
+    track = store.get_crop_track(key)
+    if track is not None:
+        print(f'Found cached 9:16 crop track ({len(track)} segments)')
+        return track
+    print('Computing the 9:16 crop track for the whole video...')
+    try:
+        with span('resize', source=os.path.basename(input_path)):
+            track = compute_crop_track(models, input_path, (9, 16))
+        return store.put_crop_track(key, track)
+    except Exception as e:
+        print(f'Resizing analysis failed: {e}')
+        print('Clips will be rendered without resizing...')
+        return None
+
+def render_selected_clip(input_path, word_index, crop_track, clip_index, clip, total_clips,
+                         output_dir=OUTPUT_DIR, save_source_clips=SAVE_SOURCE_CLIPS, threads=None, profile=None):
     """
-    Calculate a custom engagement score for a clip based on available data.
-    Higher scores indicate more engaging content.
+    Crop, subtitle and render one selected clip under a temporary name (the
+    title stage renames it). Safe to run concurrently with other clips.
+    Returns (video path, source cut path or None), or None if ffmpeg failed.
     """
-    # Get words in the clip
-    clip_words = [w for w in transcription.get_word_info() 
-                  if w["start_time"] >= clip.start_time and w["end_time"] <= clip.end_time]
-    
-    if not clip_words:
-        return 0.0
-    
-    # Calculate various engagement factors
-    duration = clip.end_time - clip.start_time
-    word_count = len(clip_words)
-    word_density = word_count / duration if duration > 0 else 0
-    
-    # Count numbers, currency, and exclamation marks (engagement indicators)
-    engagement_words = 0
-    for word_info in clip_words:
-        word = word_info["word"]
-        if any(char.isdigit() for char in word) or '$' in word or '!' in word:
-            engagement_words += 1
-    
-    # Calculate engagement score (0-1 scale)
-    # Factors: word density (45%), engagement words ratio (30%), duration balance (25%)
-    word_density_score = min(word_density / 3.0, 1.0)  # Normalize to 0-1
-    engagement_ratio = engagement_words / word_count if word_count > 0 else 0
-    duration_score = min(duration / 75.0, 1.0)  # Prefer clips around 75 seconds
-    
-    engagement_score = (word_density_score * 0.45 + 
-                       engagement_ratio * 0.30 + 
-                       duration_score * 0.25)
-    
-    return engagement_score
-
-# Find all mp4 files in the input directory
-input_files = [f for f in os.listdir(INPUT_DIR) if f.endswith('.mp4')]
-if not input_files:
-    raise FileNotFoundError('No mp4 file found in input directory.')
-
-# Find all transcription files in the input directory
-transcription_files = [f for f in os.listdir(INPUT_DIR) if f.endswith('_transcription.pkl')]
-
-# If more than one mp4, ask user to match transcription files (if any)
-video_transcription_map = {}
-if len(input_files) > 1:
-    print("Multiple video files detected:")
-    for idx, f in enumerate(input_files, 1):
-        print(f"  {idx}) {f}")
-    print("\nAvailable transcription files:")
-    for idx, f in enumerate(transcription_files, 1):
-        print(f"  {idx}) {f}")
-    print("\nFor each video, enter the number of the matching transcription file, or 0 to transcribe from scratch.")
-    for vid_idx, video_file in enumerate(input_files, 1):
-        while True:
-            try:
-                match = input(f"Match transcription for '{video_file}' (0 for none): ").strip().replace('\r', '')
-                match_idx = int(match)
-                if match_idx == 0:
-                    video_transcription_map[video_file] = None
-                    break
-                elif 1 <= match_idx <= len(transcription_files):
-                    video_transcription_map[video_file] = transcription_files[match_idx-1]
-                    break
-                else:
-                    print("Invalid choice. Try again.")
-            except Exception:
-                print("Invalid input. Try again.")
-else:
-    # Only one video, try to auto-match
-    video_file = input_files[0]
-    base_name = os.path.splitext(os.path.basename(video_file))[0]
-    expected_trans = f"{base_name}_transcription.pkl"
-    if expected_trans in transcription_files:
-        video_transcription_map[video_file] = expected_trans
+    print(f'\n--- Rendering Clip {clip_index + 1}/{total_clips} ---')
+    profile = profile or resolve_output_profile(OUTPUT_PROFILE)
+    # 4. Cut this clip's 9:16 crop segments out of the whole-video crop track, scaled to the output profile
+    if crop_track is not None:
+        size = output_size(profile, crop_track.crop_width, crop_track.crop_height)
+        video_graph = crop_segments_graph(crop_track.slice(clip.start_time, clip.end_time),
+                                          crop_track.crop_width, crop_track.crop_height, size)
     else:
-        video_transcription_map[video_file] = None
-
-# Prompt user for number of clips for each video BEFORE any processing
-video_max_clips = {}
-clip_ranges = [(1,2), (3,4), (5,6), (7,8), (9,10), (11,12)]
-for video_file in video_transcription_map:
-    print(f"\nHow many clips do you want for '{video_file}'?")
-    for i, (low, high) in enumerate(clip_ranges, 1):
-        print(f"  {i}) {low}-{high}")
+        video = stream_info(input_path, 'video')
+        size = output_size(profile, int(video['width']), int(video['height']))
+        video_graph = passthrough_graph(size)
+    # 5. Write styled subtitles
+    with span('subtitles', clip=clip_index + 1):
+        ass_file = create_animated_subtitles(word_index, clip, job_temp_path(output_dir, f'subtitles_clip_{clip_index + 1}', '.ass'),
+                                             size)
+    # 6. Render trim + crop + subtitles in a single encode
+    output_path = job_temp_path(output_dir, f'clip_{clip_index + 1}', '.mp4')
+    source_clip_path = None
     try:
-        user_choice = int(input("Your choice: ").strip().replace('\r', ''))
-        if not (1 <= user_choice <= len(clip_ranges)):
-            raise ValueError
-    except Exception:
-        print("Invalid input. Defaulting to 2 clips.")
-        user_choice = 1
-    max_clips = clip_ranges[user_choice-1][1]
-    print(f"Will select up to {max_clips} clips (if available and engaging).\n")
-    video_max_clips[video_file] = max_clips
-
-# Process each video file
-for video_idx, (video_file, transcription_file) in enumerate(video_transcription_map.items(), 1):
-    print(f"\n=== Processing Video {video_idx}/{len(video_transcription_map)}: {video_file} ===")
-    input_path = os.path.abspath(os.path.join(INPUT_DIR, video_file))
-    transcription_path = os.path.join(INPUT_DIR, transcription_file) if transcription_file else get_transcription_file_path(input_path)
-    max_clips = video_max_clips[video_file]
-
-    # 1. Transcribe the video (or load existing)
-    transcriber = Transcriber(model_size="large-v1")
-    transcription = load_existing_transcription(transcription_path) if transcription_file else None
-    if transcription is None:
-        transcription = transcribe_with_progress(input_path, transcriber)
-        save_transcription(transcription, transcription_path)
-
-    # 2. Find clips
-    clipfinder = ClipFinder()
-    clips = clipfinder.find_clips(transcription=transcription)
+        render_clip(
+            input_path, clip.start_time, clip.end_time, output_path,
+            video_graph=video_graph,
+            subtitle_filter=ass_filter(ass_file) if ass_file else None,
+            threads=threads,
+            profile=profile
+        )
+        if save_source_clips:
+            source_clip_path = job_temp_path(output_dir, f'clip_{clip_index + 1}_source', '.mp4')
+            smart_cut(input_path, clip.start_time, clip.end_time, source_clip_path, threads=threads)
+        print(f'Rendered clip {clip_index + 1}/{total_clips}')
+        return output_path, source_clip_path
+    except subprocess.CalledProcessError as e:
+        print(f'Error rendering clip {clip_index + 1}: {e}')
+        print(f'FFmpeg stderr: {e.stderr.decode()}')
+        for path in (output_path, source_clip_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+        return None
+    finally:
+        if ass_file and os.path.exists(ass_file):
+            os.remove(ass_file)
+
+_output_names_lock = threading.Lock()  # title workers must not pick the same free filename
+
+def title_clip(title, clip_index, rendered, output_dir=OUTPUT_DIR):
+    """
+    Move a clip's rendered files to its viral title's filename. A name that is
+    already taken (two clips with the same title, e.g. the fallback title) gets
+    a " (2)", " (3)", ... suffix instead of overwriting the earlier short.
+    """
+    # 7. The viral title (generated while the clip rendered) is the output filename
+    print(f"\nViral Title for Clip {clip_index + 1}: {title}")
+    name = safe_filename(title).strip() or f"Clip {clip_index + 1}"
+    video_path, source_clip_path = rendered
+    with _output_names_lock:
+        base, n = os.path.join(output_dir, name), 1
+        while os.path.exists(base + ".mp4") or os.path.exists(base + " (source).mp4"):
+            n += 1
+            base = os.path.join(output_dir, f"{name} ({n})")
+        viral_path = base + ".mp4"
+        os.replace(video_path, viral_path)
+    print(f"Final video saved as: {viral_path}\n")
+    if source_clip_path:
+        os.replace(source_clip_path, base + ' (source).mp4')
+        print(f"Source cut saved as: {base} (source).mp4\n")
+    return viral_path
+
+def parse_settings(argv=None):
+    """Settings from the defaults above, overridden by a --config JSON file, overridden by command-line flags"""
+    parser = argparse.ArgumentParser(description='Cut YouTube Shorts out of the videos in the input directory.')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--batch', action='store_true', help='process the videos in the input directory without prompts, then exit')
+    mode.add_argument('--watch', action='store_true', help='keep running and process new videos as they appear in the input directory')
+    mode.add_argument('--check', action='store_true', help='check the setup and the videos in the input directory without loading any models, then exit')
+    parser.add_argument('--config', help='JSON file with any of: ' + ', '.join(DEFAULT_SETTINGS))
+    parser.add_argument('--input-dir', dest='input_dir')
+    parser.add_argument('--output-dir', dest='output_dir')
+    parser.add_argument('--clips', type=int, help=f'maximum clips per video in batch/watch mode (default {CLIPS_PER_VIDEO})')
+    parser.add_argument('--min-duration', dest='min_duration', type=float, help='minimum clip length in seconds')
+    parser.add_argument('--max-duration', dest='max_duration', type=float, help='maximum clip length in seconds')
+    parser.add_argument('--profile', help=f'transcription profile: fast, balanced, accurate or a model size (default {TRANSCRIPTION_PROFILE})')
+    parser.add_argument('--model-size', dest='model_size', help='Whisper model size, overrides the profile')
+    parser.add_argument('--language', help="language code, e.g. 'en'; detected if omitted")
+    parser.add_argument('--render-workers', dest='render_workers', type=int)
+    parser.add_argument('--output-profile', dest='output_profile', choices=list(OUTPUT_PROFILES),
+                        help=f'output size and encoder settings (default {OUTPUT_PROFILE}); never upscales the source')
+    parser.add_argument('--transcribe-workers', dest='transcribe_workers', type=int)
+    parser.add_argument('--no-chunked', dest='chunked', action='store_false', default=None,
+                        help='transcribe each video in one piece')
+    parser.add_argument('--save-source-clips', dest='save_source_clips', action='store_true', default=None,
+                        help="also save each clip's uncropped cut of the source")
+    parser.add_argument('--title-api-url', dest='title_api_url', help='OpenAI-compatible API for the titles')
+    parser.add_argument('--title-model', dest='title_model')
+    parser.add_argument('--poll-seconds', dest='poll_seconds', type=float, help='watch mode: seconds between input directory scans')
+    parser.add_argument('--queue-size', dest='queue_size', type=int, help='videos waiting in front of each pipeline stage')
+    parser.add_argument('--memory-budget', dest='memory_budget', type=float, metavar='MB',
+                        help='RSS ceiling for the loaded models; evicts idle models and runs videos in phases when tight')
+    parser.add_argument('--stage-workers', dest='stage_workers', nargs='+', metavar='STAGE=N',
+                        help='videos per pipeline stage at once, e.g. transcribe=1 render=2 (stages: '
+                             + ', '.join(PIPELINE_STAGES) + ')')
+    args = parser.parse_args(argv)
+
+    settings = dict(DEFAULT_SETTINGS)
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        unknown = set(config) - set(DEFAULT_SETTINGS)
+        if unknown:
+            parser.error(f"unknown setting(s) in {args.config}: {', '.join(sorted(unknown))}")
+        settings.update(config)
+    stage_workers = dict(PIPELINE_WORKERS, **settings.get('stage_workers') or {})
+    for item in args.stage_workers or []:
+        name, _, count = item.partition('=')
+        if not count.isdigit():
+            parser.error(f'--stage-workers expects STAGE=N, got {item!r}')
+        stage_workers[name] = int(count)
+    if set(stage_workers) - set(PIPELINE_STAGES):
+        parser.error(f"unknown pipeline stage(s): {', '.join(sorted(set(stage_workers) - set(PIPELINE_STAGES)))}")
+    args.stage_workers = None
+    settings.update({k: v for k, v in vars(args).items() if k in DEFAULT_SETTINGS and v is not None})
+    settings['stage_workers'] = stage_workers
+    settings['mode'] = 'check' if args.check else 'watch' if args.watch else 'batch' if args.batch else 'interactive'
+    if settings['clips'] < 1 or settings['min_duration'] > settings['max_duration']:
+        parser.error('clips must be at least 1 and min duration must not exceed max duration')
+    if settings['output_profile'] not in OUTPUT_PROFILES:
+        parser.error(f"unknown output profile '{settings['output_profile']}' (use {', '.join(OUTPUT_PROFILES)})")
+    return argparse.Namespace(**settings)
+
+def punkt_installed():
+    """
+    True if the punkt sentence tokenizer is in a local NLTK data directory (no
+    network access); False also when nltk itself is missing
+    """
+    try:
+        import nltk.data
+
+        nltk.data.find('tokenizers/punkt')
+    except (ImportError, LookupError):
+        return False
+    return True
+
+def ensure_punkt(quiet=False):
+    """Download punkt only if it isn't installed yet, so normal starts work offline"""
+    if punkt_installed():
+        return True
+    import nltk
+
+    print('Downloading the NLTK punkt tokenizer (first run only)...')
+    return nltk.download('punkt', quiet=quiet)
+
+def check_setup(settings):
+    """
+    Check tools, packages, keys and the videos in the input directory without
+    importing or loading any models. Prints a report; True if nothing is missing.
+    """
+    problems, notes = [], []
+    for tool in ('ffmpeg', 'ffprobe'):
+        if shutil.which(tool) is None:
+            problems.append(f'{tool} is not on the PATH')
+    for package in REQUIRED_PACKAGES:
+        try:
+            found = importlib.util.find_spec(package) is not None
+        except ImportError:  # the parent package is missing
+            found = False
+        if not found:
+            problems.append(f"Python package '{package}' is not installed")
+    if importlib.util.find_spec('nltk') is not None and not punkt_installed():
+        notes.append('NLTK punkt data is missing; it will be downloaded on the first run')
+    if 'YOUR API KEY' in HUGGINGFACE_TOKEN:
+        problems.append('HUGGINGFACE_TOKEN is not set in main.py')
+    if 'YOUR API KEY' in GROQ_API_KEY:
+        notes.append('GROQ_API_KEY is not set in main.py; titles will fail')
+    if not is_valid_profile(settings.model_size or settings.profile):
+        problems.append(f"unknown transcription profile '{settings.model_size or settings.profile}' "
+                        f"(use {', '.join(PROFILES)} or a model size)")
+    output_parent = settings.output_dir if os.path.isdir(settings.output_dir) else os.path.dirname(os.path.abspath(settings.output_dir))
+    if not os.access(output_parent, os.W_OK):
+        problems.append(f'output directory {settings.output_dir} is not writable')
+
+    videos = []
+    if not os.path.isdir(settings.input_dir):
+        problems.append(f'input directory {settings.input_dir} does not exist')
+    else:
+        videos = sorted(f for f in os.listdir(settings.input_dir) if f.endswith('.mp4'))
+        if not videos and settings.mode != 'watch':
+            problems.append(f'no mp4 file in {settings.input_dir}')
+    if videos and shutil.which('ffprobe') is not None:
+        def check_video(video_file):
+            try:
+                info = probe(os.path.join(settings.input_dir, video_file))
+            except (subprocess.CalledProcessError, ValueError):
+                return f'{video_file}: not a readable video'
+            streams = {st.get('codec_type') for st in info.get('streams', [])}
+            if 'video' not in streams or 'audio' not in streams:
+                return f"{video_file}: needs a video and an audio stream (has {', '.join(sorted(streams)) or 'none'})"
+            duration = float(info.get('format', {}).get('duration') or 0)
+            if duration < settings.min_duration:
+                return f'{video_file}: only {duration:.0f}s long, shorter than a {settings.min_duration:.0f}s clip'
+            return None
+        # ffprobe runs are mostly waiting on the process, so probe the files side by side
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            problems.extend(p for p in pool.map(check_video, videos) if p)
+    if videos:
+        print(f'Videos in {settings.input_dir}:')
+    for video_file in videos:
+        try:
+            with open(manifest_path(settings, video_file), 'r', encoding='utf-8') as f:
+                status = json.load(f).get('status')
+        except (OSError, ValueError):
+            status = 'new'
+        print(f'  {video_file}: {status}')
+
+    for note in notes:
+        print(f'⚠️  {note}')
+    for problem in problems:
+        print(f'❌ {problem}')
+    if not problems:
+        print(f'✅ Ready: {len(videos)} video(s) in {settings.input_dir}')
+    return not problems
+
+def manifest_path(settings, video_file):
+    return os.path.join(settings.output_dir, MANIFEST_DIR, os.path.splitext(os.path.basename(video_file))[0] + '.json')
+
+def select_clips(transcription, word_index, models, settings, max_clips):
+    """(clip, engagement score) pairs to render, best first"""
+    min_duration, max_duration = settings.min_duration, settings.max_duration
+    with span('find_clips'):
+        clips = models.find_clips(transcription)
     if not clips:
         print('No clips found in the video.')
-        continue
-
-    # 3. Filter clips by duration and select the best ones
-    valid_clips = [c for c in clips if MIN_CLIP_DURATION <= (c.end_time - c.start_time) <= MAX_CLIP_DURATION]
-    selected_clips = []
+        return []
+    scorer = EngagementScorer(word_index)
 
+    # Filter clips by duration and select the best ones
+    valid_clips = [c for c in clips if min_duration <= (c.end_time - c.start_time) <= max_duration]
+    selected = []
     if valid_clips:
-        # Calculate engagement scores for all valid clips
-        clip_scores = [(clip, calculate_engagement_score(clip, transcription)) for clip in valid_clips]
-        # Sort by engagement score (highest first)
-        clip_scores.sort(key=lambda x: x[1], reverse=True)
+        # Score all valid clips in one pass, sorted by engagement score (highest first)
+        with span('scoring', candidates=len(valid_clips)):
+            clip_scores = scorer.ranked(valid_clips)
         # Select up to max_clips, but only include clips with engagement >= 0.6 (for 3rd and beyond)
         for i, (clip, score) in enumerate(clip_scores):
             if i < 2 or score >= 0.6:
-                if len(selected_clips) < max_clips:
-                    selected_clips.append(clip)
+                if len(selected) < max_clips:
+                    selected.append((clip, score))
             else:
                 break
-        print(f'Selected top {len(selected_clips)} clips:')
-        for i, clip in enumerate(selected_clips):
-            score = calculate_engagement_score(clip, transcription)
+        print(f'Selected top {len(selected)} clips:')
+        for i, (clip, score) in enumerate(selected):
             print(f'  Clip {i+1}: {clip.start_time:.1f}s - {clip.end_time:.1f}s (duration: {clip.end_time - clip.start_time:.1f}s, engagement: {score:.3f})')
-        print(f'Clip selection criteria: Top engaging clips within {MIN_CLIP_DURATION}-{MAX_CLIP_DURATION} second range')
+        print(f'Clip selection criteria: Top engaging clips within {min_duration}-{max_duration} second range')
     else:
-        print(f'No clips found between {MIN_CLIP_DURATION} and {MAX_CLIP_DURATION} seconds.')
-        # Find clips that are too short and try to extend them
-        short_clips = [c for c in clips if c.end_time - c.start_time < MIN_CLIP_DURATION]
-        if short_clips:
-            print('Attempting to extend most engaging short clips to minimum duration...')
-            short_clip_scores = [(clip, calculate_engagement_score(clip, transcription)) for clip in short_clips]
-            short_clip_scores.sort(key=lambda x: x[1], reverse=True)
-            # Take top 2 short clips and extend them
-            for i, (clip, score) in enumerate(short_clip_scores[:2]):
-                if clip.end_time - clip.start_time < MIN_CLIP_DURATION:
-                    extension_needed = MIN_CLIP_DURATION - (clip.end_time - clip.start_time)
-                    max_extension = min(extension_needed, MAX_CLIP_DURATION - (clip.end_time - clip.start_time))
-                    extended_clip = Clip(
-                        start_time=clip.start_time,
-                        end_time=clip.end_time + max_extension,
-                        start_char=clip.start_char,
-                        end_char=clip.end_char
-                    )
-                    selected_clips.append(extended_clip)
-                    print(f'Extended clip {i+1}: {extended_clip.start_time:.1f}s - {extended_clip.end_time:.1f}s (duration: {extended_clip.end_time - extended_clip.start_time:.1f}s)')
-        else:
-            # All clips are too long, trim the most engaging ones
-            print('All clips are too long. Trimming most engaging clips to maximum duration...')
-            long_clip_scores = [(clip, calculate_engagement_score(clip, transcription)) for clip in clips]
-            long_clip_scores.sort(key=lambda x: x[1], reverse=True)
-            # Take top 2 long clips and trim them
-            for i, (clip, score) in enumerate(long_clip_scores[:2]):
-                if clip.end_time - clip.start_time > MAX_CLIP_DURATION:
-                    trimmed_clip = Clip(
-                        start_time=clip.start_time,
-                        end_time=clip.start_time + MAX_CLIP_DURATION,
-                        start_char=clip.start_char,
-                        end_char=clip.end_char
-                    )
-                    selected_clips.append(trimmed_clip)
-                    print(f'Trimmed clip {i+1}: {trimmed_clip.start_time:.1f}s - {trimmed_clip.end_time:.1f}s (duration: {trimmed_clip.end_time - trimmed_clip.start_time:.1f}s)')
-
-    # Process each selected clip
-    for clip_index, clip in enumerate(selected_clips):
-        print(f'\n--- Processing Clip {clip_index + 1}/{len(selected_clips)} ---')
-        # 4. Trim the video to the selected clip
-        media_editor = MediaEditor()
-        media_file = AudioVideoFile(input_path)
-        trimmed_path = os.path.join(OUTPUT_DIR, f'trimmed_clip_{clip_index + 1}.mp4')
-        print('Trimming video to selected clip...')
-        trimmed_media_file = media_editor.trim(
-            media_file=media_file,
-            start_time=clip.start_time,
-            end_time=clip.end_time,
-            trimmed_media_file_path=trimmed_path
+        from clipsai.clip.clip import Clip
+
+        print(f'No clips found between {min_duration} and {max_duration} seconds.')
+        # Build sentence-aligned candidates that fit the duration window instead
+        print('Searching for sentence-aligned clips within the duration range...')
+        with span('scoring', fallback=True) as scoring:
+            candidates = sliding_window_candidates(sentence_spans(transcription, word_index), min_duration, max_duration)
+            ranked = select_non_overlapping(rank_candidates(candidates, scorer), max_clips)
+            scoring.set(candidates=len(candidates))
+        for i, (candidate, score) in enumerate(ranked):
+            selected.append((Clip(
+                start_time=candidate.start_time,
+                end_time=candidate.end_time,
+                start_char=candidate.start_char,
+                end_char=candidate.end_char
+            ), score))
+            print(f'  Clip {i+1}: {candidate.start_time:.1f}s - {candidate.end_time:.1f}s (duration: {candidate.end_time - candidate.start_time:.1f}s, engagement: {score:.3f})')
+        if not selected:
+            print('No sentence-aligned span fits the duration range.')
+    return selected
+
+class VideoJob:
+    """One input video on its way through the pipeline stages"""
+
+    def __init__(self, video_file, max_clips=None, transcription_file=None):
+        self.video_file = video_file
+        self.max_clips = max_clips
+        self.transcription_file = transcription_file
+        self.input_path = None
+        self.checkpoint = None
+        self.transcription = None
+        self.stored = None  # the cached transcription; only rebuilt into a clipsai object if clips must be found
+        self.word_index = None
+        self.selected = []  # (clip, engagement score) pairs
+        self.crop_track = None
+        self.rendered = []  # (video path, source cut path) per selected clip, None where rendering failed
+        self.untitled = []  # indexes of the selected clips that still need a title
+        self.titles = None  # Future of their titles
+
+class VideoProcessor:
+    """
+    The work for one video, split into pipeline stages:
+    ingest -> transcribe -> select -> crop -> render -> title.
+    Progress is checkpointed in the video's manifest (output/manifests/), so
+    a rerun after a crash skips the finished stages and clips and resumes at
+    the first incomplete step.
+    """
+
+    def __init__(self, settings, models, store, chunked=None, scheduler=None, title_service=None):
+        self.settings = settings
+        self.models = models
+        self.store = store
+        self.chunked = chunked
+        self.scheduler = scheduler
+        self.title_service = title_service
+        self.profile = settings.model_size or settings.profile
+        self.output_profile = resolve_output_profile(settings.output_profile)
+
+    def stages(self):
+        return [Stage(name, self._stage(name), self.settings.stage_workers.get(name, 1)) for name in PIPELINE_STAGES]
+
+    def run(self, job):
+        """All stages in order on the calling thread"""
+        for name in PIPELINE_STAGES:
+            job = self._stage(name)(job)
+        return job
+
+    def _stage(self, name):
+        fn = getattr(self, name)
+
+        def run_stage(job):
+            started = time.perf_counter()
+            with span(f'stage.{name}', video=job.video_file):
+                job = fn(job)
+            job.checkpoint.data['timings'][name] = round(time.perf_counter() - started, 2)
+            job.checkpoint.save()
+            return job
+        return run_stage
+
+    def release(self, stage):
+        """Free what only `stage` needs; PhasedPipeline calls this after each phase"""
+        if stage == 'transcribe' and self.chunked is not None:
+            self.chunked.close()  # each chunk worker holds its own Whisper; the next batch restarts them
+        if stage in STAGE_MODELS:
+            self.models.unload_matching(*STAGE_MODELS[stage])
+
+    def fail(self, job, stage, error):
+        """Record a failed stage in the manifest; a rerun resumes from the last completed step"""
+        print(f"Failed to process {job.video_file} ({stage}): {error}")
+        if job.checkpoint is not None:
+            job.checkpoint.update(status='failed', stage=stage, error=f'{type(error).__name__}: {error}',
+                                  finished=timestamp(), **retry_fields(job.checkpoint))
+
+    def ingest(self, job):
+        """Hash and probe the source and open its checkpoint; decode its audio once unless already transcribed"""
+        job.input_path = os.path.abspath(os.path.join(self.settings.input_dir, job.video_file))
+        job.max_clips = job.max_clips or self.settings.clips
+        print(f"\n=== Ingesting {job.video_file} ===")
+        job.checkpoint = Checkpoint.open(
+            manifest_path(self.settings, job.video_file),
+            content_hash=file_content_hash(job.input_path),
+            settings={
+                'profile': self.profile,
+                'language': self.settings.language,
+                'max_clips': job.max_clips,
+                'min_duration': self.settings.min_duration,
+                'max_duration': self.settings.max_duration,
+                'output_profile': self.output_profile.name,
+            }
         )
-        # 5. Try to resize to 9:16 aspect ratio
-        output_path = os.path.join(OUTPUT_DIR, f'yt_short_{clip_index + 1}.mp4')
+        if job.checkpoint.resumed:
+            print(f"Resuming {job.video_file} from its manifest (done: {', '.join(job.checkpoint.data['stages'])})")
+        job.checkpoint.update(source=job.input_path, status='running', duration=media_duration(job.input_path))
+        if job.checkpoint.stage('transcribe') is None:
+            extract_audio(job.input_path)
+        return job
+
+    def transcribe(self, job):
+        """1. Transcribe the video (or load a matched legacy .pkl / the transcription cache)"""
+        print(f"\n=== Transcribing {job.video_file} ===")
+        transcription = None
+        if job.transcription_file:
+            transcription = load_existing_transcription(os.path.join(self.settings.input_dir, job.transcription_file))
+        if transcription is None:
+            cache_key = self.store.key(job.input_path, self.profile, self.settings.language)
+            stored = self.store.get(cache_key)
+            if stored is None:
+                transcription = transcribe_with_progress(job.input_path, self.models, self.profile,
+                                                         self.settings.language, self.chunked)
+                stored = self.store.put(cache_key, transcription, source_name=job.video_file)
+                print(f"Transcription cached in: {stored.directory}")
+            else:
+                print(f"Found cached transcription: {stored.directory}")
+            job.stored = stored
+            job.word_index = stored.word_index()
+            job.checkpoint.complete_stage('transcribe', cache_key=cache_key, language=stored.language)
+        else:
+            job.word_index = WordIndex.from_transcription(transcription)
+            job.checkpoint.complete_stage('transcribe', transcription_file=job.transcription_file,
+                                          language=transcription.language)
+        job.transcription = transcription
+        return job
+
+    def select(self, job):
+        """2-3. Find clips and select the best ones (or reuse the clips chosen by an earlier run)"""
+        if job.checkpoint.stage('select') is not None:
+            job.selected = job.checkpoint.clips()
+            print(f"\nUsing the {len(job.selected)} clip(s) chosen for {job.video_file} by the last run")
+        else:
+            print(f"\n=== Selecting clips from {job.video_file} ===")
+            transcription = job.transcription or job.stored.transcription()
+            job.selected = select_clips(transcription, job.word_index, self.models, self.settings, job.max_clips)
+            job.checkpoint.set_clips(job.selected)
+            job.checkpoint.complete_stage('select', clips=len(job.selected))
+        # Titles are generated in the background (one batched request) while the clips are cropped and rendered
+        job.untitled = [i for i in range(len(job.selected)) if job.checkpoint.clip_step(i, 'title') is None]
+        if job.untitled:
+            job.titles = self.title_service.submit([
+                job.word_index.text(job.selected[i][0].start_time, job.selected[i][0].end_time) for i in job.untitled])
+        return job
+
+    def crop(self, job):
+        """Crop analysis runs once over the whole video; each clip slices its part"""
+        pending = [i for i in range(len(job.selected)) if not self._clip_rendered(job, i)]
+        if pending:
+            job.crop_track = load_crop_track(job.input_path, self.models, self.store)
+            job.checkpoint.complete_stage('crop', segments=len(job.crop_track) if job.crop_track is not None else 0)
+        return job
+
+    def _clip_rendered(self, job, clip_index):
+        return (job.checkpoint.clip_step(clip_index, 'title') is not None
+                or job.checkpoint.clip_step(clip_index, 'render') is not None)
+
+    def render(self, job):
+        """Render the clips that aren't rendered yet concurrently on the shared render scheduler"""
+        job.rendered = [None] * len(job.selected)
+        pending = []
+        for clip_index in range(len(job.selected)):
+            record = job.checkpoint.clip_step(clip_index, 'render')
+            if record is not None:
+                artifacts = record['artifacts']
+                job.rendered[clip_index] = (artifacts['video']['path'], (artifacts.get('source') or {}).get('path'))
+            elif job.checkpoint.clip_step(clip_index, 'title') is None:
+                pending.append(clip_index)
+        if len(pending) < len(job.selected):
+            print(f'\n{len(job.selected) - len(pending)} clip(s) of {job.video_file} were already rendered')
+        if not pending:
+            return job
+
+        def render_and_record(clip_index, clip, threads=None):
+            rendered = render_selected_clip(job.input_path, job.word_index, job.crop_track, clip_index, clip,
+                                            len(job.selected), self.settings.output_dir,
+                                            self.settings.save_source_clips, threads=threads,
+                                            profile=self.output_profile)
+            if rendered:
+                job.checkpoint.complete_clip_step(clip_index, 'render',
+                                                  artifacts={'video': rendered[0], 'source': rendered[1]})
+            return rendered
+
+        print(f'\nRendering {len(pending)} clips of {job.video_file} with {self.scheduler.workers} '
+              f'worker(s) x {self.scheduler.threads} ffmpeg thread(s)...')
+        results = self.scheduler.map(render_and_record, [(i, job.selected[i][0]) for i in pending])
+        for clip_index, rendered in zip(pending, results):
+            job.rendered[clip_index] = rendered
+        return job
+
+    def title(self, job):
+        """Title the rendered clips, move them to their final names and finish the manifest"""
+        titles = {}
+        if job.untitled:
+            try:
+                titles = dict(zip(job.untitled, job.titles.result()))
+            except Exception as e:
+                # The clips stay rendered under their temporary names; the next run only retries the titles
+                print(f'Title generation failed for {job.video_file}: {e}')
+        for clip_index, rendered in enumerate(job.rendered):
+            if clip_index not in titles or not rendered:
+                continue
+            output = title_clip(titles[clip_index], clip_index, rendered, self.settings.output_dir)
+            source_output = os.path.splitext(output)[0] + ' (source).mp4' if rendered[1] else None
+            job.checkpoint.complete_clip_step(clip_index, 'title', title=titles[clip_index],
+                                              artifacts={'video': output, 'source': source_output})
+        outputs = [(job.checkpoint.clip_step(i, 'title') or {}).get('artifacts', {}).get('video')
+                   for i in range(len(job.selected))]
+        status = 'done' if all(outputs) else 'incomplete'
+        job.checkpoint.update(status=status, finished=timestamp(),
+                              outputs=[o['path'] if o else None for o in outputs],
+                              **(retry_fields(job.checkpoint) if status != 'done' else {}))
+        # The transcription and crop track aren't needed any more; free them before the job leaves the pipeline
+        job.transcription = job.stored = job.word_index = job.crop_track = None
+        return job
+
+def retry_fields(checkpoint):
+    """Manifest fields counting one more unsuccessful run and when watch mode may retry it"""
+    attempts = checkpoint.data.get('attempts', 0) + 1
+    delay = min(WATCH_RETRY_SECONDS * 2 ** (attempts - 1), WATCH_RETRY_MAX_SECONDS)
+    return {'attempts': attempts, 'retry_after': round(time.time() + delay)}
+
+def is_processed(settings, video_file):
+    """
+    True when the file hasn't changed since its manifest was written and the
+    manifest is either done, or failed / incomplete with its retry delay not
+    yet passed
+    """
+    try:
+        with open(manifest_path(settings, video_file), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    status = manifest.get('status')
+    if status in ('failed', 'incomplete'):
+        if time.time() >= manifest.get('retry_after', 0):
+            return False
+    elif status != 'done':
+        return False
+    return manifest.get('content_hash') == file_content_hash(os.path.join(settings.input_dir, video_file))
+
+def prompt_transcription_files(input_files, transcription_files):
+    """Ask which legacy .pkl transcription belongs to which video (interactive mode)"""
+    video_transcription_map = {}
+    if len(input_files) > 1:
+        print("Multiple video files detected:")
+        for idx, f in enumerate(input_files, 1):
+            print(f"  {idx}) {f}")
+        print("\nAvailable transcription files:")
+        for idx, f in enumerate(transcription_files, 1):
+            print(f"  {idx}) {f}")
+        print("\nFor each video, enter the number of the matching transcription file, or 0 to transcribe from scratch.")
+        for vid_idx, video_file in enumerate(input_files, 1):
+            while True:
+                try:
+                    match = input(f"Match transcription for '{video_file}' (0 for none): ").strip().replace('\r', '')
+                    match_idx = int(match)
+                    if match_idx == 0:
+                        video_transcription_map[video_file] = None
+                        break
+                    elif 1 <= match_idx <= len(transcription_files):
+                        video_transcription_map[video_file] = transcription_files[match_idx-1]
+                        break
+                    else:
+                        print("Invalid choice. Try again.")
+                except Exception:
+                    print("Invalid input. Try again.")
+    else:
+        video_transcription_map = match_transcription_files(input_files, transcription_files)
+    return video_transcription_map
+
+def match_transcription_files(input_files, transcription_files):
+    """Pair each video with '<name>_transcription.pkl' when it exists"""
+    matches = {}
+    for video_file in input_files:
+        expected_trans = f"{os.path.splitext(os.path.basename(video_file))[0]}_transcription.pkl"
+        matches[video_file] = expected_trans if expected_trans in transcription_files else None
+    return matches
+
+def prompt_clip_counts(video_files):
+    """Ask for the number of clips for each video BEFORE any processing (interactive mode)"""
+    video_max_clips = {}
+    clip_ranges = [(1,2), (3,4), (5,6), (7,8), (9,10), (11,12)]
+    for video_file in video_files:
+        print(f"\nHow many clips do you want for '{video_file}'?")
+        for i, (low, high) in enumerate(clip_ranges, 1):
+            print(f"  {i}) {low}-{high}")
         try:
-            print('Resizing video to 9:16 aspect ratio...')
-            crops = resize(
-                video_file_path=trimmed_path,
-                pyannote_auth_token=HUGGINGFACE_TOKEN,
-                aspect_ratio=(9, 16)
-            )
-            resized_video_file = media_editor.resize_video(
-                original_video_file=AudioVideoFile(trimmed_path),
-                resized_video_file_path=output_path,
-                width=crops.crop_width,
-                height=crops.crop_height,
-                segments=crops.to_dict()["segments"],
-            )
-            print(f'YouTube Short (9:16) saved to {output_path}')
-        except Exception as e:
-            print(f'Resizing failed: {e}')
-            print('Saving trimmed clip without resizing...')
-            output_path = trimmed_path
-        # 6. Add styled subtitles
-        final_output = create_animated_subtitles(output_path, transcription, clip, output_path)
-        # 7. Generate viral title using Groq API
-        clip_text = " ".join([w["word"] for w in transcription.get_word_info() if w["start_time"] >= clip.start_time and w["end_time"] <= clip.end_time])
-        groq_api_key = "YOUR API KEY HERE"
-        title = get_viral_title(clip_text, groq_api_key)
-        print(f"\nViral Title for Clip {clip_index + 1}: {title}")
-        # 8. Save the final video with the viral title (keep spaces, punctuation, and emojis)
-        import shutil
-        import string
-        def safe_filename(s):
-            # Only remove characters not allowed in filenames, but keep spaces, punctuation, and emojis
-            valid_chars = f"-_.() {string.ascii_letters}{string.digits}" + "'!?,:;@#$%^&+=[]{}" + "😀😁😂🤣😃😄😅😆😉😊😋😎😍😘🥰😗😙😚🙂🤗🤩🤔🤨😐😑😶🙄😏😣😥😮🤐😯😪😫😴😌😛😜😝🤤😒😓😔😕🙃🤑😲☹️🙁😖😞😟😤😢😭😦😧😨😩🤯😬😰😱🥵🥶😳🤪😵😡😠🤬😷🤒🤕🤢🤮🥴😇🥳🥺🤠🤡🤥🤫🤭🧐🤓😈👿👹👺💀👻👽🤖💩😺😸😹😻😼😽🙀😿😾👍👎👌✌️🤞🤟🤘🤙🖕🖐️✋🖖👋🤚👐👏🙌👐🤲🙏✍️💅🤳💪🦵🦶👂👃🧠🦷🦴👀👁️👅👄💋👓🕶️🥽🥼🦺👔👕👖🧣🧤🧥🧦👗👘🥻🩱🩲🩳👙👚👛👜👝🛍️🎒👞👟🥾🥿👠👡👢👑👒🎩🎓🧢⛑️📿💄💍💎"  # common emoji block
-            return ''.join(c for c in s if c in valid_chars)
-        viral_filename = safe_filename(title).strip() + ".mp4"
-        viral_path = os.path.join(OUTPUT_DIR, viral_filename)
-        shutil.copy(final_output, viral_path)
-        print(f"Final video saved as: {viral_path}\n")
-
-print(f"\n🎉 Successfully created YouTube Shorts for {len(video_transcription_map)} video(s)!") 
\ No newline at end of file
+            user_choice = int(input("Your choice: ").strip().replace('\r', ''))
+            if not (1 <= user_choice <= len(clip_ranges)):
+                raise ValueError
+        except Exception:
+            print("Invalid input. Defaulting to 2 clips.")
+            user_choice = 1
+        max_clips = clip_ranges[user_choice-1][1]
+        print(f"Will select up to {max_clips} clips (if available and engaging).\n")
+        video_max_clips[video_file] = max_clips
+    return video_max_clips
+
+def watch_input_dir(settings, pipeline):
+    """
+    Daemon loop: poll the input directory and feed new videos into the
+    pipeline, whose models stay loaded between videos. A file is picked up
+    once its size has stopped changing between two polls (so half-copied
+    uploads are left alone); while the pipeline's input queue is full, the
+    rest stay in the folder until there is room. Ctrl+C stops polling and
+    waits for the videos already in the pipeline.
+    """
+    sizes = {}
+    print(f"Watching '{settings.input_dir}' for new videos every {settings.poll_seconds:g}s (Ctrl+C to stop)...")
+    try:
+        while True:
+            current = {}
+            for video_file in sorted(os.listdir(settings.input_dir)):
+                if not video_file.endswith('.mp4') or video_file in pipeline.in_flight:
+                    continue
+                size = os.path.getsize(os.path.join(settings.input_dir, video_file))
+                current[video_file] = size
+                if size == 0 or sizes.get(video_file) != size or is_processed(settings, video_file):
+                    continue
+                try:
+                    pipeline.put(VideoJob(video_file), block=False)
+                except queue.Full:
+                    continue  # picked up again on a later poll
+                print(f"Queued {video_file}")
+            sizes = current
+            time.sleep(settings.poll_seconds)
+    except KeyboardInterrupt:
+        print("\nStopping; finishing the videos already in the pipeline...")
+
+class VideoPipeline(Pipeline):
+    """The stage pipeline for VideoJobs, keeping count of what is in flight and what failed"""
+
+    def __init__(self, processor, queue_size):
+        super().__init__(processor.stages(), queue_size, on_done=self._done, on_error=self._error)
+        self.processor = processor
+        self.in_flight = set()
+        self.done, self.failed = [], []
+
+    def put(self, job, block=True, timeout=None):
+        self.in_flight.add(job.video_file)
+        try:
+            super().put(job, block, timeout)
+        except queue.Full:
+            self.in_flight.discard(job.video_file)
+            raise
+
+    def _done(self, job):
+        outputs = job.checkpoint.data['outputs']
+        print(f"Finished {job.video_file}: {sum(1 for o in outputs if o)}/{len(outputs)} clip(s)")
+        if job.checkpoint.data['status'] == 'done':
+            self.done.append(job.video_file)
+        else:
+            print(f"Some clips of {job.video_file} are unfinished; run again to resume them")
+            self.failed.append(job.video_file)
+        self.in_flight.discard(job.video_file)
+
+    def _error(self, job, stage, error):
+        self.processor.fail(job, stage, error)
+        self.failed.append(job.video_file)
+        self.in_flight.discard(job.video_file)
+
+class PhasedPipeline(VideoPipeline):
+    """
+    VideoPipeline for a tight memory budget: the videos waiting at the input
+    are taken as a batch and run one stage at a time across the whole batch
+    (all transcriptions, then all clip selections, then all crop analyses,
+    ...). Each model is then loaded once per batch and models of different
+    stages never have to be in memory together.
+    """
+
+    BATCH_SETTLE_SECONDS = 1.0  # videos put within this long of each other join the same batch
+
+    def __init__(self, processor, queue_size):
+        super().__init__(processor, queue_size)
+        self.queues[0] = queue.Queue(maxsize=max(1, queue_size) * len(PIPELINE_STAGES))
+
+    def start(self):
+        thread = threading.Thread(target=self._run_batches, name='phases', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.queues[0].put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _run_batches(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queues[0].get()]
+            while True:
+                try:
+                    batch.append(self.queues[0].get(timeout=self.BATCH_SETTLE_SECONDS))
+                except queue.Empty:
+                    break
+            stopping = None in batch
+            jobs = [job for job in batch if job is not None]
+            if jobs:
+                self._run_batch(jobs)
+
+    def _run_batch(self, jobs):
+        print(f"\nProcessing {len(jobs)} video(s) stage by stage to stay within the memory budget")
+        for stage in self.stages:
+            started = time.perf_counter()
+            survivors = []
+            for job in jobs:
+                try:
+                    survivors.append(stage.fn(job))
+                except Exception as e:
+                    self._error(job, stage.name, e)
+            jobs = survivors
+            self.processor.release(stage.name)
+            self.busy_seconds[stage.name] += time.perf_counter() - started
+        for job in jobs:
+            self._done(job)
+
+def main(argv=None):
+    settings = parse_settings(argv)
+    if settings.mode == 'check':
+        sys.exit(0 if check_setup(settings) else 1)
+    os.makedirs(settings.output_dir, exist_ok=True)
+    transcription_store = TranscriptionStore()
+    models = get_registry(HUGGINGFACE_TOKEN, memory_budget_mb=settings.memory_budget)
+
+    video_transcription_map, video_max_clips = {}, {}
+    if settings.mode != 'watch':
+        # Find all mp4 and legacy transcription files in the input directory
+        input_files = [f for f in os.listdir(settings.input_dir) if f.endswith('.mp4')]
+        if not input_files:
+            raise FileNotFoundError('No mp4 file found in input directory.')
+        transcription_files = [f for f in os.listdir(settings.input_dir) if f.endswith('_transcription.pkl')]
+        if settings.mode == 'interactive':
+            video_transcription_map = prompt_transcription_files(input_files, transcription_files)
+            video_max_clips = prompt_clip_counts(video_transcription_map)
+        else:
+            video_transcription_map = match_transcription_files(input_files, transcription_files)
+
+    ensure_punkt(quiet=settings.mode != 'interactive')
+    profile = settings.model_size or settings.profile
+    transcribe_workers = settings.transcribe_workers
+    if settings.memory_budget:
+        # Each chunk worker holds its own Whisper, so only start as many as the budget has room for
+        fit = max(1, int((settings.memory_budget - rss_mb()) // models.expected_mb(models.transcriber_name(profile))))
+        transcribe_workers = min(transcribe_workers or max(1, (os.cpu_count() or 1) // THREADS_PER_WORKER), fit)
+    chunked = ChunkedTranscriber(profile, workers=transcribe_workers) if settings.chunked else None
+    # Chunked transcription runs Whisper in the worker processes, so it doesn't count against this process
+    phased = models.budget_tight(profile, transcribe=chunked is None)
+    if phased:
+        # Models load when their phase starts and are freed when it ends
+        print(f'The {settings.memory_budget:.0f} MB memory budget cannot hold all models at once; '
+              'videos will be processed stage by stage')
+    else:
+        # Load every model once up front; they are shared by all videos and clips below
+        print('Loading models...')
+        if chunked is not None:
+            chunked.start()  # the workers load and warm their own Whisper models
+        models.warm_up(profile, transcribe=chunked is None, resize=True)
+
+    scheduler = RenderScheduler(workers=settings.render_workers)
+    title_service = TitleService(GROQ_API_KEY, base_url=settings.title_api_url, model=settings.title_model)
+    processor = VideoProcessor(settings, models, transcription_store, chunked, scheduler, title_service)
+    pipeline = (PhasedPipeline if phased else VideoPipeline)(processor, settings.queue_size).start()
+    if not phased:
+        print('Pipeline: ' + ' -> '.join(f'{s.name} x{s.workers}' for s in pipeline.stages))
+    started = time.perf_counter()
+    try:
+        if settings.mode == 'watch':
+            watch_input_dir(settings, pipeline)
+        else:
+            # Blocks while the first stage is backed up; the stages drain the queues meanwhile
+            for video_file, transcription_file in video_transcription_map.items():
+                pipeline.put(VideoJob(video_file, video_max_clips.get(video_file), transcription_file))
+    finally:
+        pipeline.close()
+        scheduler.shutdown()
+        title_service.close()
+        if chunked is not None:
+            chunked.close()
+        models.unload()
+
+    print(f"\nPipeline finished in {time.perf_counter() - started:.1f}s; busy time per stage: "
+          + ', '.join(f'{name} {seconds:.1f}s' for name, seconds in pipeline.busy_seconds.items()))
+    # Size nodes by these: the main process holds the models, chunk workers hold their own Whisper. The
+    # child figure is the largest finished child process of any kind, ffmpeg encodes included.
+    memory = {'peak_rss_mb': round(peak_rss_mb()), 'child_peak_rss_mb': round(children_peak_rss_mb()),
+              'memory_budget_mb': settings.memory_budget, 'model_evictions': models.evictions}
+    print(f"Peak memory: {memory['peak_rss_mb']} MB in this process, {memory['child_peak_rss_mb']} MB in the "
+          f"largest child process (transcription worker or ffmpeg)" + (f" (budget {settings.memory_budget:.0f} MB, {models.evictions} model eviction(s))"
+                               if settings.memory_budget else ''))
+    trace_path = tracer.write_json(
+        os.path.join(settings.output_dir, TRACE_DIR, f"run_{time.strftime('%Y%m%d_%H%M%S')}.json"),
+        mode=settings.mode, finished=timestamp(), wall_s=round(time.perf_counter() - started, 2),
+        done=pipeline.done, failed=pipeline.failed, memory=memory)
+    print(f"Trace of this run: {trace_path}")
+    print(f"\n🎉 Successfully created YouTube Shorts for {len(pipeline.done)} video(s)!")
+    if pipeline.failed:
+        print(f"Failed: {', '.join(pipeline.failed)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Process memory readings for the memory budget.
+Resident set size now and at its peak, read from /proc on Linux and from
+psutil (optional), ps or the resource module elsewhere, and a way to hand
+freed model memory back to the OS so the RSS actually drops after an
+eviction.
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import os
+import subprocess
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:  # optional; only needed where there is no /proc
+    psutil = None
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def _status_mb(field: str):
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024  # kB
+    except OSError:
+        pass
+    return None
+
+
+def _ps_rss_mb():
+    """Current RSS from ps(1), e.g. on macOS without psutil; None where there is no ps"""
+    try:
+        out = subprocess.run(['ps', '-o', 'rss=', '-p', str(os.getpid())],
+                             capture_output=True, check=True).stdout
+        return int(out.split()[0]) / 1024  # kB
+    except (OSError, subprocess.CalledProcessError, ValueError, IndexError):
+        return None
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2 ** 20
+    # Not the peak: after an eviction the budget has to see the memory go down
+    rss = _ps_rss_mb()
+    return rss if rss is not None else 0.0
+
+
+def peak_rss_mb() -> float:
+    """Highest resident set size this process has reached"""
+    peak = _status_mb('VmHWM')
+    if peak is None and resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT / 2 ** 20
+    if peak is None and psutil is not None:
+        info = psutil.Process().memory_info()
+        peak = getattr(info, 'peak_wset', info.rss) / 2 ** 20  # Windows reports the peak working set
+    return peak if peak is not None else 0.0
+
+
+def children_peak_rss_mb() -> float:
+    """Highest resident set size of any finished child process (worker pools, ffmpeg); 0 on Windows"""
+    if resource is None:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * _MAXRSS_UNIT / 2 ** 20
+
+
+def release_memory():
+    """Collect garbage and return free heap pages to the OS (glibc keeps them otherwise)"""
+    gc.collect()
+    libc_name = ctypes.util.find_library('c')
+    if libc_name and sys.platform.startswith('linux'):
+        try:
+            ctypes.CDLL(libc_name).malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+    torch = sys.modules.get('torch')  # never import torch just to free memory
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
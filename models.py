@@ -0,0 +1,383 @@
+"""
+Process-wide model registry.
+Whisper, the sentence embedder behind ClipFinder, the pyannote diarizer and
+the face detector used for 9:16 cropping are each loaded once per process,
+optionally warmed up on a tiny synthetic input, and shared by every video,
+clip and bot job until unload() is called. With a memory budget, the
+registry measures what each model adds to the process's RSS and, before
+loading a model that wouldn't fit, evicts the least recently needed ones.
+"""
+
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from audio_track import SAMPLE_RATE, extract_audio
+from memory import release_memory, rss_mb
+
+WARMUP_SECONDS = 1
+# Typical RSS growth when a model loads (CPU, MB); used until the model's real size has been measured
+WHISPER_MEMORY_MB = {'tiny': 250, 'base': 350, 'small': 900, 'medium': 2200,
+                     'large-v1': 4000, 'large-v2': 4000, 'large-v3': 4000}
+MODEL_MEMORY_MB = {'text_embedder': 1500, 'clip_finder': 50, 'diarizer': 700, 'resizer': 300, 'align': 400}
+# Models that must stay loaded while the key is in use
+MODEL_DEPENDENCIES = {'clip_finder': ('text_embedder',)}
+# Diarization segments shorter than this are dropped (clipsai's default)
+MIN_SPEAKER_SEGMENT = 1.5
+
+
+def speaker_segments(annotation, duration: float, min_duration: float = MIN_SPEAKER_SEGMENT,
+                     precision: int = 6) -> list:
+    """
+    Turn a pyannote Annotation into an unbroken, non-overlapping list of
+    {'speakers', 'start_time', 'end_time'} segments covering 0..duration, with
+    speakers numbered 0, 1, 2, ... Follows PyannoteDiarizer._adjust_segments()
+    and _relabel_speakers() in clipsai 0.2.1 (clipsai/diarize/pyannote.py);
+    re-check it when upgrading clipsai.
+    """
+    segments = []
+    speaker = None
+    start_time = 0.0
+    for turn, _, label in annotation.itertracks(yield_label=True):
+        number = label.split('_')[1]
+        next_speaker = int(number) if number else None
+        if turn.end - turn.start < min_duration:
+            continue
+        if speaker is None:
+            speaker = next_speaker
+            continue
+        if speaker == next_speaker:
+            continue
+        # A new speaker: the current segment ends where theirs starts, whether they overlap or leave a gap
+        segments.append({'speakers': [] if speaker is None else [speaker],
+                         'start_time': round(start_time, precision),
+                         'end_time': round(turn.start, precision)})
+        speaker, start_time = next_speaker, turn.start
+    segments.append({'speakers': [] if speaker is None else [speaker],
+                     'start_time': round(start_time, precision),
+                     'end_time': round(duration, precision)})
+
+    # Speakers whose turns were all too short leave gaps in the numbering
+    numbers = {n: i for i, n in enumerate(sorted({n for segment in segments for n in segment['speakers']}))}
+    for segment in segments:
+        segment['speakers'] = [numbers[n] for n in segment['speakers']]
+    return segments
+
+
+def write_blank_video(path: str, seconds: float = WARMUP_SECONDS) -> str:
+    """A tiny black 9:16 clip with a silent audio track"""
+    subprocess.run([
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f'color=c=black:s=360x640:r=25:d={seconds}',
+        '-f', 'lavfi', '-i', f'anullsrc=r=16000:cl=mono:d={seconds}',
+        '-shortest', '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', path
+    ], check=True, capture_output=True)
+    return path
+
+
+class ModelRegistry:
+    """Lazily loads each model once and hands out the shared instance"""
+
+    def __init__(self, huggingface_token: str = None, device: str = None, threads: int = None,
+                 memory_budget_mb: float = None):
+        self.huggingface_token = huggingface_token
+        self.device = device
+        self.threads = threads  # CPU threads per Whisper model; None keeps the profile's / whisperx's default
+        self.memory_budget_mb = memory_budget_mb  # RSS ceiling for this process; None loads without limit
+        self.evictions = 0
+        self._models = {}
+        self._sizes = {}  # measured RSS growth per model, kept after eviction for the next load
+        self._last_used = {}
+        self._load_lock = threading.Lock()
+        # Inference on a shared model is serialized; GPU work would queue up anyway. The locks
+        # outlive evictions, so a caller holding one never finds it gone.
+        self._locks = {}
+        self._in_use = {}  # callers inside _using() per model; those models are never evicted
+
+    def _get(self, name: str, factory):
+        with self._load_lock:
+            if name not in self._models:
+                self._make_room(name, self.expected_mb(name))
+                before = rss_mb()
+                self._models[name] = factory()
+                self._locks.setdefault(name, threading.Lock())
+                self._sizes[name] = max(0.0, rss_mb() - before)
+            self._last_used[name] = time.monotonic()
+            return self._models[name]
+
+    @contextmanager
+    def _using(self, name: str, load):
+        """
+        The model `load()` returns, used under its lock. It counts as in use
+        from before it is loaded until the block ends, so a concurrent
+        _make_room() can't evict it between the load and the call.
+        """
+        with self._load_lock:
+            self._in_use[name] = self._in_use.get(name, 0) + 1
+        try:
+            model = load()
+            with self._locks[name]:
+                yield model
+        finally:
+            with self._load_lock:
+                self._in_use[name] -= 1
+
+    def _busy(self, name: str) -> bool:
+        """True if the model, or one that depends on it, is in use"""
+        return bool(self._in_use.get(name)) or any(
+            self._in_use.get(n) for n, dependencies in MODEL_DEPENDENCIES.items() if name in dependencies)
+
+    def expected_mb(self, name: str) -> float:
+        """What loading the model will add to the RSS: its measured size if it was loaded before, else an estimate"""
+        if name in self._sizes:
+            return self._sizes[name]
+        kind, _, variant = name.partition(':')
+        if kind == 'transcriber':
+            from transcription_profiles import resolve_profile
+            return WHISPER_MEMORY_MB.get(resolve_profile(variant).model_size, WHISPER_MEMORY_MB['large-v2'])
+        return MODEL_MEMORY_MB.get(kind, 0.0)
+
+    def _fits(self, *names: str) -> bool:
+        """True if the models that aren't loaded yet fit in the budget without evicting anything"""
+        need = sum(self.expected_mb(n) for n in names if n not in self._models)
+        return self.memory_budget_mb is None or rss_mb() + need <= self.memory_budget_mb
+
+    def _make_room(self, name: str, need_mb: float):
+        """Evict the least recently needed idle models until `need_mb` more fits in the budget"""
+        if self.memory_budget_mb is None:
+            return
+        keep = {name, *MODEL_DEPENDENCIES.get(name, ())}
+        while rss_mb() + need_mb > self.memory_budget_mb:
+            idle = [n for n in self._models if n not in keep and not self._busy(n)]
+            if not idle:
+                break  # everything left is in use; load anyway rather than fail the job
+            self._drop([min(idle, key=lambda n: self._last_used.get(n, 0.0))])
+            self.evictions += 1
+            release_memory()
+
+    def loaded(self) -> list:
+        return list(self._models)
+
+    def memory_report(self) -> dict:
+        """Measured RSS (MB) of each loaded model"""
+        return {name: round(self._sizes.get(name, 0.0)) for name in self._models}
+
+    def budget_tight(self, profile: str = None, transcribe: bool = True) -> bool:
+        """True if the budget can't hold every model one video needs (transcription, clip finding, cropping) at once"""
+        names = ['text_embedder', 'clip_finder', 'diarizer', 'resizer']
+        if transcribe:
+            names += [self.transcriber_name(profile), 'align']
+        return not self._fits(*names)
+
+    @staticmethod
+    def transcriber_name(profile: str = None) -> str:
+        from transcription_profiles import resolve_profile
+        return f'transcriber:{resolve_profile(profile).name}'
+
+    def transcriber(self, profile: str = None):
+        """Whisper for a transcription profile name or a plain model size"""
+        from transcription_profiles import load_transcriber, resolve_profile
+        resolved = resolve_profile(profile)
+        return self._get(self.transcriber_name(profile), lambda: load_transcriber(resolved, self.device, self.threads))
+
+    def text_embedder(self):
+        from clipsai.clip.text_embedder import TextEmbedder
+        return self._get('text_embedder', TextEmbedder)
+
+    def clip_finder(self):
+        """ClipFinder that embeds with the shared sentence embedder, so its weights are only loaded once"""
+        # Load the embedder before _get() takes the (non-reentrant) load lock for the clip finder
+        embedder = self.text_embedder()
+
+        def factory():
+            from clip_finder import SharedEmbedderClipFinder
+            return SharedEmbedderClipFinder(embedder, device=self.device)
+        return self._get('clip_finder', factory)
+
+    def diarizer(self):
+        def factory():
+            from clipsai.diarize.pyannote import PyannoteDiarizer
+            return PyannoteDiarizer(auth_token=self.huggingface_token, device=self.device)
+        return self._get('diarizer', factory)
+
+    def resizer(self):
+        def factory():
+            from clipsai.resize.resizer import Resizer
+            return Resizer(device=self.device)
+        return self._get('resizer', factory)
+
+    def align_model(self, language: str) -> tuple:
+        """whisperx's (model, metadata) word aligner for a language, loaded once"""
+        def factory():
+            import whisperx
+            from clipsai.utils.pytorch import get_compute_device
+            return whisperx.load_align_model(language_code=language, device=self.device or get_compute_device())
+        return self._get(f'align:{language}', factory)
+
+    def transcribe(self, audio: np.ndarray, profile: str = None, language: str = None):
+        """
+        Transcribe a 16 kHz mono float32 buffer (see audio_track) with the
+        profile's model; language=None lets Whisper detect it.
+        """
+        from transcription_profiles import transcribe_audio
+        with self._using(self.transcriber_name(profile), lambda: self.transcriber(profile)) as transcriber:
+            return transcribe_audio(transcriber, audio, language, align_model=self.align_model)
+
+    def detect_language(self, audio: np.ndarray, profile: str = None) -> str:
+        """Language code detected once from the first 30 seconds of a 16 kHz buffer"""
+        from transcription_profiles import detect_language
+        with self._using(self.transcriber_name(profile), lambda: self.transcriber(profile)) as transcriber:
+            return detect_language(transcriber, audio)
+
+    def find_clips(self, transcription) -> list:
+        with self._using('clip_finder', self.clip_finder) as clip_finder:
+            return clip_finder.find_clips(transcription=transcription)
+
+    def diarize(self, audio: np.ndarray) -> list:
+        """
+        Speaker segments ({'speakers', 'start_time', 'end_time'}) for a 16 kHz
+        buffer. PyannoteDiarizer.diarize() only takes files, so the buffer goes
+        to its pyannote pipeline directly, followed by the same segment cleanup.
+        """
+        import torch
+
+        waveform = torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32)).unsqueeze(0)
+        with self._using('diarizer', self.diarizer) as diarizer:
+            annotation = diarizer.pipeline({'waveform': waveform, 'sample_rate': SAMPLE_RATE})
+        return speaker_segments(annotation, duration=len(audio) / SAMPLE_RATE)
+
+    def resize(self, video_file_path: str, aspect_ratio: tuple = (9, 16), speaker_segments: list = None):
+        """
+        Same steps as clipsai.resize(), but with the shared diarizer and face
+        detector; pass speaker_segments to reuse an earlier diarize() of the
+        source's audio track.
+        """
+        from clipsai.media.audiovideo_file import AudioVideoFile
+        from clipsai.resize.vid_proc import detect_scenes
+
+        media = AudioVideoFile(video_file_path)
+        media.assert_has_audio_stream()
+        media.assert_has_video_stream()
+        if speaker_segments is None:
+            speaker_segments = self.diarize(extract_audio(video_file_path).samples)
+        scene_changes = detect_scenes(media, min_scene_duration=0.25)
+        with self._using('resizer', self.resizer) as resizer:
+            return resizer.resize(
+                video_file=media,
+                speaker_segments=speaker_segments,
+                scene_changes=scene_changes,
+                aspect_ratio=aspect_ratio,
+                samples_per_segment=13,
+                face_detect_width=960,
+                n_face_detect_batches=8,
+                scene_merge_threshold=0.25,
+            )
+
+    def warm_up(self, profile: str = None, transcribe: bool = True, clips: bool = True, resize: bool = False):
+        """
+        Load the requested models and push a second of silence (or a blank clip)
+        through them, so the first real job doesn't pay for loading or for
+        one-off kernel setup. Failures on the synthetic input are ignored.
+        Under a memory budget, models that would only fit by evicting another
+        one are left to load on first use.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            if transcribe and self._fits(self.transcriber_name(profile)):
+                self.transcriber(profile)
+                try:
+                    self.transcribe(np.zeros(int(WARMUP_SECONDS * SAMPLE_RATE), dtype=np.float32), profile)
+                except Exception:
+                    pass
+            if clips and self._fits('text_embedder', 'clip_finder'):
+                self.clip_finder()
+                self.text_embedder().embed_sentences(['Warming up.'])
+            if resize and self._fits('diarizer', 'resizer'):
+                self.diarizer()
+                self.resizer()
+                try:
+                    self.resize(write_blank_video(os.path.join(tmp, 'warmup.mp4')))
+                except Exception:
+                    pass
+
+    def unload(self, *names: str):
+        """Drop the named models (all of them if none are given) and free their memory"""
+        with self._load_lock:
+            self._drop(list(names or self._models))
+        release_memory()
+
+    def unload_matching(self, *prefixes: str):
+        """Drop every loaded model whose name starts with one of the prefixes (e.g. 'transcriber:')"""
+        with self._load_lock:
+            names = [n for n in self._models if n.startswith(prefixes)]
+        if names:
+            self.unload(*names)
+
+    def _drop(self, names: list):
+        """Forget the named models; the caller holds the load lock and releases the memory"""
+        if 'text_embedder' in names and 'clip_finder' not in names:
+            names.append('clip_finder')  # it holds on to the shared embedder
+        for name in names:
+            model = self._models.pop(name, None)
+            if model is not None and hasattr(model, 'cleanup'):
+                model.cleanup()
+
+
+def warm_up_report(profile: str = None, **kwargs) -> dict:
+    """
+    Warm this process's registry (see ModelRegistry.warm_up) for a worker pool
+    initializer. Returns {'pid', 'loaded', 'error'} instead of raising, so a
+    failed warm-up leaves the models to load on first use rather than
+    breaking the pool.
+    """
+    registry = get_registry()
+    error = None
+    try:
+        registry.warm_up(profile, **kwargs)
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    return {'pid': os.getpid(), 'loaded': registry.loaded(), 'error': error}
+
+
+def start_workers(pool, workers: int, ready) -> list:
+    """
+    Start all `workers` processes of a ProcessPoolExecutor whose initializer
+    puts a warm_up_report() on the `ready` queue, and wait for every report.
+    Tasks can't be aimed at a particular worker, so the warm-up has to run in
+    the initializer to happen exactly once in each process. A None on the
+    queue stops the wait early (e.g. at shutdown).
+    """
+    futures = [pool.submit(os.getpid) for _ in range(workers)]  # the pool spawns a process per pending task
+    reports = []
+    while len(reports) < workers:
+        try:
+            report = ready.get(timeout=1)
+        except queue.Empty:
+            failed = next((f for f in futures if f.done() and f.exception() is not None), None)
+            if failed is not None:
+                raise failed.exception()  # an initializer crashed; the pool is broken
+            continue
+        if report is None:
+            break
+        reports.append(report)
+    return reports
+
+
+_registry = None
+
+
+def get_registry(huggingface_token: str = None, device: str = None, memory_budget_mb: float = None) -> ModelRegistry:
+    """The registry shared by everything in this process"""
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry(huggingface_token, device)
+    elif huggingface_token and not _registry.huggingface_token:
+        _registry.huggingface_token = huggingface_token
+    if memory_budget_mb:
+        _registry.memory_budget_mb = memory_budget_mb
+    return _registry
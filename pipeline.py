@@ -0,0 +1,111 @@
+"""
+Stage pipeline.
+Work items flow through a chain of stages connected by bounded queues; each
+stage has its own pool of worker threads, so different items can occupy
+different stages at the same time and a slow stage only holds back the
+items behind it. With the heavy lifting done in ffmpeg subprocesses, worker
+processes or torch (all of which release the GIL), threads are enough.
+"""
+
+import queue
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+Stage = namedtuple('Stage', 'name fn workers')
+_STOP = object()
+
+
+class Pipeline:
+    """
+    Runs item -> stage1.fn -> stage2.fn -> ... concurrently. A stage function
+    returns the item to pass on, or None to drop it. A stage that raises
+    drops the item and reports it to on_error(item, stage_name, exc);
+    items that make it through every stage go to on_done(item). An
+    exception in either callback is printed and the worker carries on.
+    """
+
+    def __init__(self, stages: list, queue_size: int = 2, on_done=None, on_error=None):
+        self.stages = [Stage(s.name, s.fn, max(1, int(s.workers))) for s in stages]
+        self.queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in self.stages]
+        self.on_done = on_done
+        self.on_error = on_error
+        self.busy_seconds = {s.name: 0.0 for s in self.stages}
+        self._lock = threading.Lock()
+        self._running = [0] * len(self.stages)
+        self._threads = []
+        self._closed = False
+
+    def start(self):
+        for i, stage in enumerate(self.stages):
+            self._running[i] = stage.workers
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(i,), name=f'{stage.name}-{n + 1}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def put(self, item, block: bool = True, timeout: float = None):
+        """Feed an item to the first stage; raises queue.Full when non-blocking and the queue is full"""
+        if self._closed:
+            raise RuntimeError('pipeline is closed')
+        self.queues[0].put(item, block, timeout)
+
+    def close(self):
+        """Finish every queued item, then stop the workers"""
+        if not self._closed:
+            self._closed = True
+            for _ in range(self.stages[0].workers):
+                self.queues[0].put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self, index: int):
+        stage, inbox = self.stages[index], self.queues[index]
+        outbox = self.queues[index + 1] if index + 1 < len(self.stages) else None
+        try:
+            while True:
+                item = inbox.get()
+                if item is _STOP:
+                    break
+                started = time.perf_counter()
+                try:
+                    result = stage.fn(item)
+                except Exception as e:
+                    result = None
+                    self._callback(self.on_error, item, stage.name, e)
+                finally:
+                    with self._lock:
+                        self.busy_seconds[stage.name] += time.perf_counter() - started
+                if result is None:
+                    continue
+                if outbox is not None:
+                    outbox.put(result)  # blocks while the next stage is backed up
+                else:
+                    self._callback(self.on_done, result)
+        finally:
+            # The last worker of a stage to stop passes the stop on to the next stage,
+            # even if this one died, so close() never waits on a stage that gets no stop
+            with self._lock:
+                self._running[index] -= 1
+                last = self._running[index] == 0
+            if last and outbox is not None:
+                for _ in range(self.stages[index + 1].workers):
+                    outbox.put(_STOP)
+
+    @staticmethod
+    def _callback(fn, *args):
+        """Run on_done / on_error; an exception in it is printed rather than killing the worker"""
+        if fn is None:
+            return
+        try:
+            fn(*args)
+        except Exception:
+            traceback.print_exc()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark for the main.py and Telegram bot flows.
+Generates synthetic sources with ffmpeg (testsrc2 video, sine audio) at
+several lengths and resolutions, stands in deterministic fakes for the
+models (transcription with realistic word density, clip finding, face
+tracking) and times every real stage around them: decoding, caching,
+selection, crop tracks, subtitles and rendering. The bot flow runs the
+bot's own job code against a fake Telegram bot, with the real two-phase
+yt-dlp ingest fetching the source from a local HTTP server (serve_media).
+Reports wall time, CPU time (including ffmpeg children) and peak RSS per
+stage as JSON, and flags regressions against a saved baseline.
+
+    python pipeline_benchmark.py --output bench.json
+    python pipeline_benchmark.py --compare bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+from functools import partial, wraps
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import quote
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_LENGTHS = [120, 600]
+DEFAULT_RESOLUTIONS = ['1280x720', '1920x1080']
+DEFAULT_SOURCE_DIR = os.path.join('cache', 'bench')
+WORDS_PER_SECOND = 2.5  # ~150 words per minute of conversational speech
+CLIP_SECONDS = 60
+CLIP_EVERY_SECONDS = 90
+CROP_SEGMENT_SECONDS = 5
+REGRESSION_THRESHOLD = 0.10  # 10% slower
+NOISE_FLOOR_SECONDS = 0.05  # ignore changes smaller than this
+
+VOCABULARY = (
+    "so I think the thing is that we really wanted to build something people would love and "
+    "it turns out that was much harder than anyone expected because nobody knew what they wanted "
+    "until we showed them the first version and then everything changed overnight"
+).split()
+HOOK_WORDS = ['amazing', 'never', 'secret', 'crazy', 'million', '$1,000', '100%', 'shocking', 'why', 'how']
+
+FakeWord = namedtuple('FakeWord', 'word start end')
+FakeClip = namedtuple('FakeClip', 'start_time end_time start_char end_char')
+
+
+class FakeTranscription:
+    """Deterministic transcript with the word density of real speech and the interface the stages read"""
+
+    source_software = 'benchmark'
+    language = 'en'
+    _num_speakers = None
+
+    def __init__(self, duration: float, seed: int = 0):
+        rng = random.Random(seed)
+        self.created_time = datetime(2024, 1, 1)
+        self.words = []
+        t = 0.3
+        sentence_left = rng.randint(8, 20)
+        while t < duration - 1:
+            word = rng.choice(HOOK_WORDS) if rng.random() < 0.04 else rng.choice(VOCABULARY)
+            length = (0.08 + 0.05 * len(word)) * rng.uniform(0.8, 1.2)
+            sentence_left -= 1
+            if sentence_left == 0:
+                word += rng.choice('..?!')
+                sentence_left = rng.randint(8, 20)
+            self.words.append(FakeWord(word, round(t, 3), round(min(t + length, duration), 3)))
+            t += length + rng.expovariate(WORDS_PER_SECOND * 6) + (0.4 if sentence_left == 0 else 0)
+
+    def get_word_info(self) -> list:
+        return [{'word': w.word, 'start_time': w.start, 'end_time': w.end} for w in self.words]
+
+    def get_char_info(self) -> list:
+        chars = []
+        for w in self.words:
+            step = (w.end - w.start) / len(w.word)
+            chars.extend({'char': c, 'start_time': w.start + i * step, 'end_time': w.start + (i + 1) * step,
+                          'speaker': None} for i, c in enumerate(w.word))
+            chars.append({'char': ' ', 'start_time': None, 'end_time': None, 'speaker': None})
+        return chars[:-1]
+
+
+class FakeCrops:
+    def __init__(self, crop_width: int, crop_height: int, segments: list):
+        self.crop_width = crop_width
+        self.crop_height = crop_height
+        self._segments = segments
+
+    def to_dict(self) -> dict:
+        return {'segments': self._segments}
+
+
+class StubModels:
+    """ModelRegistry stand-in: same methods, deterministic answers, no model weights"""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+
+    def transcribe(self, audio, profile=None, language=None):
+        from audio_track import SAMPLE_RATE
+        return FakeTranscription(len(audio) / SAMPLE_RATE)
+
+    def detect_language(self, audio, profile=None):
+        return 'en'
+
+    def find_clips(self, transcription) -> list:
+        """A CLIP_SECONDS clip every CLIP_EVERY_SECONDS, snapped to word boundaries; also takes a WordIndex"""
+        from word_index import WordIndex
+        index = transcription if isinstance(transcription, WordIndex) else WordIndex.from_transcription(transcription)
+        clips, t = [], 0.0
+        while t + CLIP_SECONDS <= index.ends[-1]:
+            inside = index.indices(t, t + CLIP_SECONDS)
+            if inside:
+                clips.append(FakeClip(float(index.starts[inside[0]]), float(index.ends[inside[-1]]), 0, 0))
+            t += CLIP_EVERY_SECONDS
+        return clips
+
+    def diarize(self, audio) -> list:
+        from audio_track import SAMPLE_RATE
+        duration = len(audio) / SAMPLE_RATE
+        return [{'speakers': [i % 2], 'start_time': float(t), 'end_time': float(min(t + 30, duration))}
+                for i, t in enumerate(range(0, int(duration), 30))]
+
+    def resize(self, video_path, aspect_ratio=(9, 16), speaker_segments=None):
+        from audio_track import media_duration
+        crop_width = int(self.height * aspect_ratio[0] / aspect_ratio[1]) // 2 * 2
+        duration = media_duration(video_path)
+        segments, t, i = [], 0.0, 0
+        while t < duration:
+            x = (self.width - crop_width) * (i % 3) // 2  # left, centre, right
+            segments.append({'start_time': t, 'end_time': min(t + CROP_SEGMENT_SECONDS, duration), 'x': x, 'y': 0,
+                             'speakers': [i % 2]})
+            t += CROP_SEGMENT_SECONDS
+            i += 1
+        return FakeCrops(crop_width, self.height, segments)
+
+
+def _peak_rss_mb():
+    """Peak RSS of this process since the last reset, in MB (Linux reports it per stage; elsewhere lifetime)"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _cpu_seconds() -> float:
+    """CPU time of this process plus its finished children (ffmpeg does most of the work)"""
+    if resource is None:
+        return time.process_time()
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+class StageTimer:
+    """
+    Collects wall time, CPU time and peak RSS for each `with timer.stage(name):`
+    block, or the summed wall time and call count of a function wrapped with
+    timed() (for stages whose calls run concurrently)
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name: str):
+        return _TimedStage(self, name)
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            stage = self.stages.setdefault(name, {'wall_s': 0.0, 'calls': 0})
+            stage['wall_s'] = round(stage['wall_s'] + seconds, 4)
+            stage['calls'] += 1
+
+    def timed(self, name: str, fn):
+        """fn (plain or async) adding the time of each call to stage `name`"""
+        if asyncio.iscoroutinefunction(fn):
+            async def timed_call(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self.add(name, time.perf_counter() - started)
+        else:
+            def timed_call(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.add(name, time.perf_counter() - started)
+        return wraps(fn)(timed_call)
+
+
+class _TimedStage:
+    def __init__(self, timer: StageTimer, name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        _reset_peak_rss()
+        self.wall, self.cpu = time.perf_counter(), _cpu_seconds()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.timer.stages[self.name] = {
+                'wall_s': round(time.perf_counter() - self.wall, 4),
+                'cpu_s': round(_cpu_seconds() - self.cpu, 4),
+                'peak_rss_mb': round(_peak_rss_mb() or 0, 1),
+            }
+
+
+def check_word_lookups(word_index, transcription, clips):
+    """
+    Raise if the stored word index finds other words inside a clip than the
+    transcription the clip's bounds came from (e.g. times stored at a lower
+    precision dropping the edge words)
+    """
+    from word_index import WordIndex
+    reference = WordIndex.from_transcription(transcription)
+    for clip in clips:
+        stored, expected = (index.indices(clip.start_time, clip.end_time) for index in (word_index, reference))
+        if stored != expected:
+            raise RuntimeError(f'stored words for {clip.start_time:.3f}-{clip.end_time:.3f}s differ: '
+                               f'{word_index.text(clip.start_time, clip.end_time)!r} != '
+                               f'{reference.text(clip.start_time, clip.end_time)!r}')
+
+
+def make_source(duration: int, width: int, height: int, directory: str = DEFAULT_SOURCE_DIR) -> str:
+    """A synthetic H.264/AAC mp4 (moving test pattern, sine tone), generated once and reused"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'synthetic_{duration}s_{width}x{height}.mp4')
+    if not os.path.exists(path):
+        tmp_path = path + '.tmp.mp4'
+        subprocess.run([
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate=30:duration={duration}',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '60', '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac', '-b:a', '128k', '-shortest', '-y', tmp_path
+        ], check=True, capture_output=True)
+        os.replace(tmp_path, path)
+    return path
+
+
+def bench_main_flow(source: str, width: int, height: int, work_dir: str, max_clips: int) -> dict:
+    """The main.py stages for one video, with the models stubbed"""
+    import main
+    from audio_track import extract_audio, media_duration
+    from crop_track import compute_crop_track
+    from render import RenderScheduler
+    from transcription_store import TranscriptionStore, file_content_hash
+
+    models = StubModels(width, height)
+    store = TranscriptionStore(os.path.join(work_dir, 'transcriptions'))
+    settings = main.parse_settings(['--batch', '--output-dir', work_dir, '--clips', str(max_clips),
+                                    '--min-duration', str(CLIP_SECONDS - 15), '--max-duration', str(CLIP_SECONDS + 15)])
+    timer = StageTimer()
+    with timer.stage('ingest'):
+        file_content_hash(source)
+        media_duration(source)
+        audio = extract_audio(source, cache_dir=os.path.join(work_dir, 'audio'))
+    with timer.stage('transcribe'):
+        transcription = models.transcribe(audio.samples)
+        word_index = store.put('bench', transcription, source_name=os.path.basename(source)).word_index()
+    with timer.stage('select'):
+        selected = main.select_clips(transcription, word_index, models, settings, max_clips)
+    # The clip bounds come from the in-memory transcription, as on a first run; the subtitles read the store
+    check_word_lookups(word_index, transcription, [clip for clip, _ in selected])
+    with timer.stage('crop'):
+        crop_track = compute_crop_track(models, source)
+        for clip, _ in selected:
+            crop_track.slice(clip.start_time, clip.end_time)
+    with timer.stage('subtitles'):
+        for i, (clip, _) in enumerate(selected):
+            os.remove(main.create_animated_subtitles(word_index, clip, os.path.join(work_dir, f'bench_{i}.ass')))
+    with timer.stage('render'):
+        with RenderScheduler(workers=settings.render_workers) as scheduler:
+            rendered = scheduler.map(main.render_selected_clip, [
+                (source, word_index, crop_track, i, clip, len(selected), work_dir, False)
+                for i, (clip, _) in enumerate(selected)])
+    if not all(rendered):
+        raise RuntimeError('rendering failed')
+    return {'clips': len(selected), 'stages': timer.stages}
+
+
+class FakeMessage:
+    def __init__(self, file_id: str = None):
+        self.video = SimpleNamespace(file_id=file_id)
+
+    async def delete(self):
+        pass
+
+
+class FakeBot:
+    """Telegram bot stand-in: reads each uploaded video like the real client would and keeps the messages"""
+
+    def __init__(self, timer: StageTimer):
+        self.messages = []
+        self.uploads = 0
+        self.send_video = timer.timed('upload', self.send_video)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        self.messages.append(text)
+        return FakeMessage()
+
+    async def send_video(self, chat_id: int, video, **kwargs):
+        if hasattr(video, 'read'):
+            while video.read(1024 * 1024):
+                pass
+        self.uploads += 1
+        return FakeMessage(f'benchmark-{self.uploads}')
+
+
+async def fake_titles(texts: list) -> list:
+    return [f'Benchmark short {i} 🔥' for i in range(1, len(texts) + 1)]
+
+
+def bench_bot_flow(source: str, width: int, height: int, work_dir: str, max_clips: int) -> dict:
+    """
+    telegram_bot.run_pipeline() -> process_video_task() for one video, with
+    the models stubbed, the analysis pool run in-process and a FakeBot. The
+    ingest is real: yt-dlp probes the source and fetches its audio and clip
+    sections over local HTTP. Renders run concurrently, so each stage's
+    wall_s is summed over its calls and total_wall_s is the job's wall time.
+    """
+    import bot_workers
+    import ingest
+    import telegram_bot
+    import yt_dlp  # noqa: F401  the ingest runs for real, so skip the flow without it
+    from audio_track import extract_audio
+    from checkpoint import Checkpoint
+    from render import RenderScheduler
+    from transcription_store import TranscriptionStore
+
+    models = StubModels(width, height)
+    store = TranscriptionStore(os.path.join(work_dir, 'transcriptions'))
+    timer = StageTimer()
+    bot = FakeBot(timer)
+    job = {'id': 1, 'chat_id': 1, 'num_clips': max_clips, 'created_at': time.time()}
+
+    def find_clips(cache_key: str) -> list:
+        # bot_workers.find_clips() rebuilds the clipsai Transcription for ClipFinder; the stub only needs the words
+        return models.find_clips(store.get(cache_key).word_index())
+
+    async def run_job():
+        telegram_bot.transcribe_slots = asyncio.Semaphore(telegram_bot.TRANSCRIBE_SLOTS)
+        started = time.perf_counter()
+        result = await telegram_bot.run_pipeline(job, bot)
+        return result, time.perf_counter() - started
+
+    with ExitStack() as stack:
+        def patch(target, name, value):
+            stack.enter_context(mock.patch.object(target, name, value))
+
+        # The bot_workers stages run in this process, so they see the stubs
+        analysis_pool = stack.enter_context(ThreadPoolExecutor(max_workers=1))
+        scheduler = stack.enter_context(RenderScheduler(workers=telegram_bot.RENDER_WORKERS))
+        server = ingest.serve_media(os.path.dirname(os.path.abspath(source)))
+        stack.callback(server.server_close)
+        stack.callback(server.shutdown)
+        job['url'] = f'http://127.0.0.1:{server.server_port}/{quote(os.path.basename(source))}'
+        for name, stage in (('probe_url', 'probe'), ('fetch_audio', 'fetch_audio'), ('fetch_section', 'fetch_section')):
+            patch(ingest, name, timer.timed(stage, getattr(ingest, name)))
+        patch(bot_workers, 'get_registry', lambda *args, **kwargs: models)
+        patch(bot_workers, 'TranscriptionStore', lambda: store)
+        patch(bot_workers, 'extract_audio', partial(extract_audio, cache_dir=os.path.join(work_dir, 'audio')))
+        patch(bot_workers, 'transcribe', timer.timed('transcribe', bot_workers.transcribe))
+        patch(bot_workers, 'find_clips', timer.timed('select', find_clips))
+        patch(telegram_bot, 'analysis_pool', analysis_pool)
+        patch(telegram_bot, 'render_scheduler', scheduler)
+        patch(telegram_bot, 'transcription_store', store)
+        patch(telegram_bot, 'job_checkpoint',
+              lambda url: Checkpoint.open(os.path.join(work_dir, 'manifest.json'), source=url))
+        patch(telegram_bot, 'generate_viral_titles', fake_titles)
+        patch(telegram_bot, 'write_srt_subtitles', timer.timed('subtitles', telegram_bot.write_srt_subtitles))
+        patch(telegram_bot, 'render_clip_async', timer.timed('render', telegram_bot.render_clip_async))
+        result, wall = asyncio.run(run_job())
+
+    errors = [m for m in bot.messages if m.startswith(('❌', '⚠️'))]
+    if errors or not result:
+        raise RuntimeError(errors[0] if errors else 'the bot flow sent no shorts')
+    return {'clips': len(result['shorts']), 'stages': timer.stages, 'total_wall_s': round(wall, 4)}
+
+
+FLOWS = {'main': bench_main_flow, 'bot': bench_bot_flow}
+
+
+def run_benchmarks(args) -> dict:
+    results = []
+    for length in args.lengths:
+        for resolution in args.resolutions:
+            width, height = (int(v) for v in resolution.lower().split('x'))
+            source = make_source(length, width, height, args.source_dir)
+            for flow in args.flows:
+                work_dir = tempfile.mkdtemp(prefix=f'bench_{flow}_')
+                try:
+                    result = FLOWS[flow](source, width, height, work_dir, args.clips)
+                except ImportError as e:
+                    print(f'Skipping the {flow} flow: {e}')
+                    break
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+                result.update(flow=flow, source=f'{length}s_{resolution}')
+                result.setdefault('total_wall_s', round(sum(s['wall_s'] for s in result['stages'].values()), 4))
+                results.append(result)
+                print(f"{flow:<5} {result['source']:<16} {result['total_wall_s']:>8.2f}s  " + '  '.join(
+                    f"{name} {s['wall_s']:.2f}s" for name, s in result['stages'].items()))
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'host': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'config': {'lengths': args.lengths, 'resolutions': args.resolutions, 'clips': args.clips},
+        'results': results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    """Stages whose wall time grew by more than threshold (and the noise floor), as printable lines"""
+    before = {(r['flow'], r['source']): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = before.get((result['flow'], result['source']))
+        if old is None:
+            continue
+        for name, stage in result['stages'].items():
+            if name not in old['stages']:
+                continue
+            was, now = old['stages'][name]['wall_s'], stage['wall_s']
+            change = (now - was) / was if was else 0.0
+            line = f"{result['flow']:<5} {result['source']:<16} {name:<14} {was:>8.2f}s -> {now:>8.2f}s ({change:+.0%})"
+            if change > threshold and now - was > NOISE_FLOOR_SECONDS:
+                regressions.append(line)
+            print(('REGRESSION ' if line in regressions else '           ') + line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--lengths', nargs='+', type=int, default=DEFAULT_LENGTHS, help='source lengths in seconds')
+    parser.add_argument('--resolutions', nargs='+', default=DEFAULT_RESOLUTIONS, help='source sizes, e.g. 1920x1080')
+    parser.add_argument('--flows', nargs='+', choices=list(FLOWS), default=list(FLOWS))
+    parser.add_argument('--clips', type=int, default=3, help='clips rendered per source')
+    parser.add_argument('--source-dir', default=DEFAULT_SOURCE_DIR, help='where the synthetic sources are kept')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='flag stages slower than this saved run')
+    parser.add_argument('--against', metavar='RESULTS', help='with --compare: compare this saved run instead of running now')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help='slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    if args.against:
+        with open(args.against, 'r', encoding='utf-8') as f:
+            current = json.load(f)
+    else:
+        current = run_benchmarks(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        print(f'\n{len(regressions)} regression(s) over {args.threshold:.0%}')
+        if regressions:
+            sys.exit(1)
+    elif not args.output:
+        print(json.dumps(current, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Single-pass rendering for ClippedAI shorts.
+Seeking, 9:16 cropping, scaling to the output profile and subtitle burn-in
+are built into one ffmpeg filter graph so every clip is decoded and encoded
+exactly once.
+"""
+
+import asyncio
+import os
+import threading
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import run_ffmpeg, run_ffmpeg_async
+
+VIDEO_CODEC_ARGS = ['-c:v', 'libx264', '-preset', 'medium', '-crf', '23', '-pix_fmt', 'yuv420p']
+AUDIO_CODEC_ARGS = ['-c:a', 'aac', '-b:a', '192k']
+
+# Target frame size and encoder settings of a rendered short. The size is a
+# ceiling: output_size() never scales the cropped source up.
+OutputProfile = namedtuple('OutputProfile', 'name width height preset crf audio_bitrate')
+OUTPUT_PROFILES = {
+    'preview': OutputProfile('preview', 540, 960, 'ultrafast', 30, '96k'),  # a draft in seconds
+    'standard': OutputProfile('standard', 720, 1280, 'veryfast', 23, '128k'),
+    'premium': OutputProfile('premium', 1080, 1920, 'medium', 21, '192k'),
+}
+DEFAULT_OUTPUT_PROFILE = 'premium'
+# x264 stops scaling well beyond a handful of threads per encode, so by default
+# the core budget is split into concurrent encodes of about this many threads
+THREADS_PER_ENCODE = 4
+
+
+def job_temp_path(directory: str, prefix: str, suffix: str) -> str:
+    """Unique scratch file path so concurrent render jobs never share temp files"""
+    return os.path.join(directory, f'{prefix}_{uuid.uuid4().hex[:12]}{suffix}')
+
+
+def escape_filter_path(path: str) -> str:
+    """Escape a file path for use as a filter option value inside a filter graph"""
+    path = os.path.abspath(path).replace('\\', '/')
+    return path.replace(':', '\\:').replace("'", "\\'")
+
+
+def resolve_output_profile(name: str = None) -> OutputProfile:
+    if name not in (None, *OUTPUT_PROFILES):
+        raise ValueError(f"unknown output profile '{name}' (use {', '.join(OUTPUT_PROFILES)})")
+    return OUTPUT_PROFILES[name or DEFAULT_OUTPUT_PROFILE]
+
+
+def _even(value: float) -> int:
+    return max(2, int(value) // 2 * 2)  # libx264 with yuv420p needs even dimensions
+
+
+def output_size(profile: OutputProfile, width: int, height: int) -> tuple:
+    """
+    (width, height) to render a width x height (cropped) source at: scaled down
+    to fit the profile's frame, but never up, so a 720p source isn't upscaled
+    to 1080x1920 only to spend encode time on interpolated detail. A landscape
+    source (an uncropped render) fits the frame turned sideways, so premium
+    keeps 1920x1080 rather than shrinking it to 1080 wide.
+    """
+    frame_width, frame_height = (profile.width, profile.height) if width <= height else (profile.height, profile.width)
+    scale = min(1.0, frame_width / width, frame_height / height)
+    return _even(width * scale), _even(height * scale)
+
+
+def center_crop_size(width: int, height: int, aspect_ratio: tuple = (9, 16)) -> tuple:
+    """The largest aspect_ratio region of a width x height frame"""
+    crop_width = min(width, height * aspect_ratio[0] / aspect_ratio[1])
+    return int(crop_width), int(min(height, crop_width * aspect_ratio[1] / aspect_ratio[0]))
+
+
+def video_codec_args(profile: OutputProfile = None) -> list:
+    if profile is None:
+        return VIDEO_CODEC_ARGS
+    return ['-c:v', 'libx264', '-preset', profile.preset, '-crf', str(profile.crf), '-pix_fmt', 'yuv420p']
+
+
+def audio_codec_args(profile: OutputProfile = None) -> list:
+    return AUDIO_CODEC_ARGS if profile is None else ['-c:a', 'aac', '-b:a', profile.audio_bitrate]
+
+
+def crop_segments_graph(segments: list, crop_width: int, crop_height: int, size: tuple = None) -> str:
+    """
+    Build a filter graph fragment from [0:v] to [v] that applies the crop
+    segments returned by clipsai's resize() (times relative to the clip start),
+    then scales the result to size=(width, height) if given.
+    """
+    scale = f',scale={size[0]}:{size[1]}' if size and tuple(size) != (crop_width, crop_height) else ''
+    if not segments:
+        return f'[0:v]crop={crop_width}:{crop_height}{scale}[v]'
+    if len(segments) == 1:
+        seg = segments[0]
+        return f"[0:v]crop={crop_width}:{crop_height}:{seg['x']}:{seg['y']}{scale}[v]"
+
+    chains = [f'[0:v]split={len(segments)}' + ''.join(f'[s{i}]' for i in range(len(segments)))]
+    for i, seg in enumerate(segments):
+        chains.append(
+            f"[s{i}]trim=start={seg['start_time']}:end={seg['end_time']},setpts=PTS-STARTPTS,"
+            f"crop={crop_width}:{crop_height}:{seg['x']}:{seg['y']}[c{i}]"
+        )
+    chains.append(''.join(f'[c{i}]' for i in range(len(segments))) + f'concat=n={len(segments)}:v=1:a=0{scale}[v]')
+    return ';'.join(chains)
+
+
+def center_crop_graph(width: int, height: int) -> str:
+    """Build a filter graph fragment that scales and center-crops [0:v] to width x height"""
+    return f'[0:v]scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height}[v]'
+
+
+def passthrough_graph(size: tuple = None) -> str:
+    """Build a filter graph fragment that leaves the video frames untouched (apart from scaling them to size)"""
+    return f'[0:v]scale={size[0]}:{size[1]}[v]' if size else '[0:v]null[v]'
+
+
+def ass_filter(ass_path: str) -> str:
+    """Filter that burns an ASS subtitle file into the video"""
+    return f"ass=filename='{escape_filter_path(ass_path)}'"
+
+
+def srt_filter(srt_path: str, force_style: str = None) -> str:
+    """Filter that burns an SRT subtitle file into the video, optionally overriding its style"""
+    flt = f"subtitles=filename='{escape_filter_path(srt_path)}'"
+    if force_style:
+        flt += f":force_style='{force_style}'"
+    return flt
+
+
+def build_render_command(source_path: str, start_time: float, end_time: float, output_path: str,
+                         video_graph: str, subtitle_filter: str = None, threads: int = None,
+                         profile: OutputProfile = None) -> list:
+    """
+    Build the ffmpeg command that renders one clip straight to output_path,
+    with the profile's encoder settings (the frame size is up to video_graph)
+    """
+    duration = end_time - start_time
+    filter_complex = video_graph
+    if subtitle_filter:
+        filter_complex += f';[v]{subtitle_filter}[vout]'
+        video_label = '[vout]'
+    else:
+        video_label = '[v]'
+    thread_args = ['-threads', str(threads), '-filter_complex_threads', str(threads)] if threads else []
+
+    return [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-ss', f'{start_time:.3f}',
+        '-i', os.path.abspath(source_path),
+        '-t', f'{duration:.3f}',
+        '-filter_complex', filter_complex,
+        '-map', video_label, '-map', '0:a?',
+        *video_codec_args(profile),
+        *audio_codec_args(profile),
+        *thread_args,
+        '-movflags', '+faststart',
+        '-y', os.path.abspath(output_path),
+    ]
+
+
+def render_clip(source_path: str, start_time: float, end_time: float, output_path: str,
+                video_graph: str = None, subtitle_filter: str = None, threads: int = None,
+                profile: OutputProfile = None) -> str:
+    """
+    Render [start_time, end_time] of source_path to output_path in a single encode.
+    Raises subprocess.CalledProcessError if ffmpeg fails.
+    """
+    cmd = build_render_command(source_path, start_time, end_time, output_path,
+                               video_graph or passthrough_graph(), subtitle_filter, threads, profile)
+    run_ffmpeg(cmd, 'render', duration=round(end_time - start_time, 3), subtitles=subtitle_filter is not None,
+               profile=profile.name if profile else None)
+    return os.path.abspath(output_path)
+
+
+async def render_clip_async(source_path: str, start_time: float, end_time: float, output_path: str,
+                            video_graph: str = None, subtitle_filter: str = None, threads: int = None,
+                            profile: OutputProfile = None) -> str:
+    """render_clip() for asyncio code: ffmpeg runs as an asyncio subprocess, so the event loop stays free"""
+    cmd = build_render_command(source_path, start_time, end_time, output_path,
+                               video_graph or passthrough_graph(), subtitle_filter, threads, profile)
+    await run_ffmpeg_async(cmd, 'render', duration=round(end_time - start_time, 3),
+                           subtitles=subtitle_filter is not None, profile=profile.name if profile else None)
+    return os.path.abspath(output_path)
+
+
+class RenderScheduler:
+    """
+    Runs independent per-clip render jobs concurrently in a bounded worker pool.
+    The heavy lifting happens in ffmpeg child processes, so threads are enough to
+    keep them busy; each job gets `threads` ffmpeg threads so that
+    workers * threads stays within the core budget.
+    """
+
+    def __init__(self, workers: int = None, total_threads: int = None):
+        cores = total_threads or os.cpu_count() or 1
+        if not workers:
+            workers = max(1, cores // THREADS_PER_ENCODE)
+        self.workers = max(1, min(workers, cores))
+        self.threads = max(1, cores // self.workers)
+        self._pool = None  # started by the first submit(); asyncio callers only use run_async()
+        self._pool_lock = threading.Lock()
+        self._slots = None  # asyncio.Semaphore, created inside the running loop
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule fn(*args, threads=..., **kwargs) and return its concurrent.futures.Future"""
+        kwargs.setdefault('threads', self.threads)
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='render')
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def map(self, fn, items) -> list:
+        """Run fn(*item) for every item concurrently and return the results in input order"""
+        futures = [self.submit(fn, *item) for item in items]
+        return [future.result() for future in futures]
+
+    async def run_async(self, fn, *args, **kwargs):
+        """Await the coroutine fn(*args, threads=..., **kwargs) once one of the worker slots is free"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        kwargs.setdefault('threads', self.threads)
+        async with self._slots:
+            return await fn(*args, **kwargs)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
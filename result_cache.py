@@ -0,0 +1,95 @@
+"""
+Deduplication of repeated videos in the Telegram bot.
+SingleFlight lets concurrent requests for the same video share one running
+pipeline; ResultCache remembers finished results (transcription key, titles
+and Telegram file_ids of the sent shorts) so repeats are answered without
+downloading, transcribing or uploading again.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_RESULTS_PATH = os.path.join('cache', 'results.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    video_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+"""
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight coroutine"""
+
+    def __init__(self):
+        self._in_flight = {}
+
+    def is_running(self, key) -> bool:
+        return key in self._in_flight
+
+    async def run(self, key, coro_factory) -> tuple:
+        """
+        Await coro_factory() for key, or attach to the call already running for it.
+        Returns (result, is_leader); only the leader actually ran the coroutine.
+        """
+        future = self._in_flight.get(key)
+        if future is not None:
+            return await asyncio.shield(future), False
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await coro_factory()
+            future.set_result(result)
+            return result, True
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so an unattended failure is not logged twice
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+
+class ResultCache:
+    """Bounded SQLite cache of pipeline results per video id, with TTL and LRU size eviction"""
+
+    def __init__(self, path: str = DEFAULT_RESULTS_PATH, max_entries: int = 500, ttl_seconds: float = 7 * 24 * 3600):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.executescript(SCHEMA)
+
+    def get(self, video_id: str):
+        """The cached result dict for video_id, or None if missing or expired"""
+        row = self._db.execute("SELECT payload, created_at FROM results WHERE video_id = ?", (video_id,)).fetchone()
+        if row is None:
+            return None
+        if time.time() - row[1] > self.ttl_seconds:
+            self._db.execute("DELETE FROM results WHERE video_id = ?", (video_id,))
+            return None
+        self._db.execute("UPDATE results SET last_used = ? WHERE video_id = ?", (time.time(), video_id))
+        return json.loads(row[0])
+
+    def put(self, video_id: str, result: dict):
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO results (video_id, payload, created_at, last_used) VALUES (?, ?, ?, ?)",
+            (video_id, json.dumps(result, ensure_ascii=False), now, now)
+        )
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones beyond max_entries"""
+        self._db.execute("DELETE FROM results WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM results WHERE video_id IN ("
+            "SELECT video_id FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+        )
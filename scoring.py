@@ -0,0 +1,84 @@
+"""
+Vectorized engagement scoring for candidate clips.
+Per-word flags and their cumulative sums are computed once per transcription,
+after which every candidate is scored in a single NumPy pass.
+"""
+
+import numpy as np
+
+# Weights of the engagement score (0-1 scale)
+WORD_DENSITY_WEIGHT = 0.45
+ENGAGEMENT_RATIO_WEIGHT = 0.30
+DURATION_WEIGHT = 0.25
+TARGET_WORDS_PER_SECOND = 3.0  # Density that earns the full word density score
+TARGET_DURATION = 75.0  # Prefer clips around 75 seconds
+
+
+def is_engagement_word(word: str) -> bool:
+    """Numbers, currency and exclamations are engagement indicators"""
+    return any(char.isdigit() for char in word) or '$' in word or '!' in word
+
+
+class EngagementScorer:
+    """
+    Scores clips by word density (45%), engagement words ratio (30%) and
+    duration balance (25%). Higher scores indicate more engaging content.
+    """
+
+    def __init__(self, word_index):
+        self.word_index = word_index
+        self.starts = np.asarray(word_index.starts, dtype=np.float64)
+        self.ends = np.asarray(word_index.ends, dtype=np.float64)
+        flags = np.fromiter((is_engagement_word(w) for w in word_index.words), dtype=np.int64, count=len(word_index))
+        self.engagement_cumsum = np.concatenate(([0], np.cumsum(flags)))
+        self._flags = flags
+
+    def _word_counts(self, clip_starts, clip_ends) -> tuple:
+        """Per-clip (word_count, engagement_word_count) for words fully inside each clip"""
+        lo = np.searchsorted(self.starts, clip_starts, side='left')
+        hi = np.maximum(np.searchsorted(self.starts, clip_ends, side='right'), lo)
+        if self.word_index.contiguous:
+            hi = np.clip(np.searchsorted(self.ends, clip_ends, side='right'), lo, hi)
+            return hi - lo, self.engagement_cumsum[hi] - self.engagement_cumsum[lo]
+
+        # Words can end out of order: check the end time of every word in each
+        # clip's start-time window, all windows flattened into one array
+        lengths = hi - lo
+        clip_ids = np.repeat(np.arange(len(clip_starts)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        word_ids = np.repeat(lo, lengths) + offsets
+        inside = self.ends[word_ids] <= clip_ends[clip_ids]
+        counts = np.bincount(clip_ids, weights=inside, minlength=len(clip_starts)).astype(np.int64)
+        engaged = np.bincount(clip_ids, weights=inside * self._flags[word_ids],
+                              minlength=len(clip_starts)).astype(np.int64)
+        return counts, engaged
+
+    def score_times(self, clip_starts, clip_ends) -> np.ndarray:
+        """Engagement scores for clips given as arrays of start and end times"""
+        clip_starts = np.asarray(clip_starts, dtype=np.float64)
+        clip_ends = np.asarray(clip_ends, dtype=np.float64)
+        if clip_starts.size == 0:
+            return np.zeros(0)
+
+        word_count, engagement_words = self._word_counts(clip_starts, clip_ends)
+        duration = clip_ends - clip_starts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            word_density = np.where(duration > 0, word_count / duration, 0.0)
+            engagement_ratio = np.where(word_count > 0, engagement_words / word_count, 0.0)
+
+        word_density_score = np.minimum(word_density / TARGET_WORDS_PER_SECOND, 1.0)
+        duration_score = np.minimum(duration / TARGET_DURATION, 1.0)
+        scores = (word_density_score * WORD_DENSITY_WEIGHT +
+                  engagement_ratio * ENGAGEMENT_RATIO_WEIGHT +
+                  duration_score * DURATION_WEIGHT)
+        return np.where(word_count > 0, scores, 0.0)
+
+    def score(self, clips) -> np.ndarray:
+        """Engagement scores for a list of clips (anything with start_time/end_time)"""
+        return self.score_times([c.start_time for c in clips], [c.end_time for c in clips])
+
+    def ranked(self, clips) -> list:
+        """(clip, score) pairs sorted by engagement score, highest first"""
+        scores = self.score(clips)
+        order = np.argsort(-scores, kind='stable')
+        return [(clips[i], float(scores[i])) for i in order]
@@ -8,22 +8,53 @@ import os
 import sys
 import logging
 import asyncio
-import subprocess
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-import yt_dlp
-from groq import Groq
-from huggingface_hub import login
 from dotenv import load_dotenv
 
-from clipsai import Transcriber, ClipFinder, resize, MediaEditor, AudioVideoFile
+import bot_workers
+import ingest
+from checkpoint import DEFAULT_MANIFEST_DIR, Checkpoint
+from job_queue import JobQueue, QueueFullError, DONE, FAILED
+from result_cache import ResultCache, SingleFlight
+from transcription_profiles import DEFAULT_PROFILE, describe_profile
+from transcription_store import TranscriptionStore
+from audio_track import stream_info
+from render import (RenderScheduler, job_temp_path, render_clip_async, center_crop_graph, center_crop_size,
+                    output_size, resolve_output_profile, srt_filter)
+from titles import DEFAULT_BASE_URL, TitleError, TitleService
+from memory import peak_rss_mb, rss_mb
+from models import start_workers
+from tracing import measured_call, span, tracer
 
 load_dotenv()
 
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 HUGGINGFACE_TOKEN = os.getenv('HUGGINGFACE_TOKEN')
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+TITLE_API_URL = os.getenv('TITLE_API_URL', DEFAULT_BASE_URL)  # Any OpenAI-compatible chat completions API
+TITLE_MODEL = os.getenv('TITLE_MODEL', 'llama-3.3-70b-versatile')
+TRANSCRIPTION_PROFILE = os.getenv('TRANSCRIPTION_PROFILE', DEFAULT_PROFILE)  # fast, balanced or accurate
+WHISPER_MODEL = os.getenv('WHISPER_MODEL')  # A plain model size overrides the profile
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', '0')) or None
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', '1'))  # Processes for transcription / clip finding
+TRANSCRIBE_SLOTS = int(os.getenv('TRANSCRIBE_SLOTS', str(ANALYSIS_WORKERS)))  # Jobs transcribing at once
+MAX_ACTIVE_JOBS = int(os.getenv('MAX_ACTIVE_JOBS', str(TRANSCRIBE_SLOTS + 1)))  # Jobs downloading/transcribing/rendering at once
+MAX_QUEUED_JOBS = int(os.getenv('MAX_QUEUED_JOBS', '50'))
+MAX_JOBS_PER_USER = int(os.getenv('MAX_JOBS_PER_USER', '3'))
+# RSS ceiling in MB shared by the analysis workers; each evicts idle models to stay within its share
+MEMORY_BUDGET_MB = float(os.getenv('MEMORY_BUDGET_MB', '0')) or None
+# Output size and encoder settings of the shorts (preview, standard or premium), never above the source resolution
+OUTPUT_PROFILE = resolve_output_profile(os.getenv('OUTPUT_PROFILE', 'standard'))
+# Send a quickly rendered preview of each short first, replaced by the full-quality short when it is ready
+PREVIEW_DRAFTS = os.getenv('PREVIEW_DRAFTS', '0') == '1'
+PREVIEW_PROFILE = resolve_output_profile('preview')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9464'))  # Prometheus /metrics on localhost; 0 turns it off
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -31,111 +62,111 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-login(HUGGINGFACE_TOKEN)
-
 Path("input").mkdir(exist_ok=True)
 Path("output").mkdir(exist_ok=True)
 
-transcriber = None
-clip_finder = None
-groq_client = None
-
-user_processes = {}
+analysis_pool = None
+analysis_ready = None  # queue the workers' initializers report their warm-up on
+
+# Shared by all chats so concurrent jobs together stay within the core budget
+render_scheduler = RenderScheduler(workers=RENDER_WORKERS)
+transcription_store = TranscriptionStore()
+job_queue = JobQueue(max_queued=MAX_QUEUED_JOBS, max_per_user=MAX_JOBS_PER_USER)
+result_cache = ResultCache()
+pipelines = SingleFlight()  # in-flight pipelines by video id
+title_service = TitleService(GROQ_API_KEY, base_url=TITLE_API_URL, model=TITLE_MODEL, max_chars=60)
+transcribe_slots = None  # asyncio primitives are created inside the running loop (post_init)
+job_slots = None
+job_available = None
+running_jobs = set()  # run_job tasks; the event loop only keeps weak references to tasks
+models_status = "loading"  # warmed up in the background while the bot already answers commands
+worker_peak_rss_mb = 0.0  # highest memory use any analysis worker has reported
 
 def init_models():
-    global transcriber, clip_finder, groq_client
-    if transcriber is None:
-        logger.info("🤖 Initializing AI models...")
-        try:
-            transcriber = Transcriber()
-            clip_finder = ClipFinder()
-            groq_client = Groq(api_key=GROQ_API_KEY)
-            logger.info("✅ Models loaded!")
-        except Exception as e:
-            logger.error(f"❌ Model initialization error: {e}")
-            raise
-
-def download_youtube_video(url: str) -> tuple:
-    try:
-        video_id = url.split('v=')[-1].split('&')[0] if 'v=' in url else url.split('/')[-1]
-        output_path = f"input/{video_id}.mp4"
-        
-        ydl_opts = {
-            'format': 'best[ext=mp4][height<=720]',
-            'outtmpl': output_path,
-            'quiet': True,
-            'no_warnings': True,
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            title = info.get('title', 'Video')
-            duration = info.get('duration', 0)
-            
-        return output_path, title, duration
-    except Exception as e:
-        logger.error(f"Download error: {e}")
-        raise
+    """Start the analysis worker processes; each one keeps its models loaded"""
+    global analysis_pool, analysis_ready
+    if analysis_pool is None:
+        logger.info("🤖 Starting analysis workers...")
+        context = multiprocessing.get_context('spawn')
+        analysis_ready = context.Queue()
+        analysis_pool = ProcessPoolExecutor(
+            max_workers=ANALYSIS_WORKERS,
+            mp_context=context,
+            initializer=bot_workers.init_worker,
+            initargs=(WHISPER_MODEL or TRANSCRIPTION_PROFILE, HUGGINGFACE_TOKEN,
+                      MEMORY_BUDGET_MB and MEMORY_BUDGET_MB / ANALYSIS_WORKERS, analysis_ready)
+        )
 
-def generate_viral_title(transcript_text: str) -> str:
+async def warm_up_models():
+    """Start every analysis worker and wait until each one has warmed its models"""
+    global models_status
+    init_models()
     try:
-        response = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{
-                "role": "user",
-                "content": f"Create a short, catchy YouTube Shorts title (max 50 characters) with emojis. Based on this transcript: {transcript_text[:400]}"
-            }],
-            temperature=0.8,
-            max_tokens=50
-        )
-        title = response.choices[0].message.content.strip()
-        return title[:60]
+        reports = await asyncio.get_running_loop().run_in_executor(
+            None, start_workers, analysis_pool, ANALYSIS_WORKERS, analysis_ready)
+        errors = [r['error'] for r in reports if r['error']]
+        if errors:
+            raise RuntimeError(errors[0])
+        models_status = "ready"
+        logger.info(f"🔥 Models warm in {len(reports)} worker(s): {', '.join(reports[0]['loaded'])}")
     except Exception as e:
+        models_status = "loading on first use"
+        logger.error(f"Model warm-up failed, models will load on first use: {e}")
+
+async def run_in_analysis_worker(fn, *args):
+    """Run a CPU-bound bot_workers stage in the analysis process pool without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(analysis_pool, fn, *args)
+
+async def run_traced_in_analysis_worker(name: str, fn, *args):
+    """run_in_analysis_worker() in a span that counts the worker process's CPU time and I/O"""
+    global worker_peak_rss_mb
+    with span(name) as s:
+        result, stats = await run_in_analysis_worker(measured_call, fn, *args)
+        worker_peak_rss_mb = max(worker_peak_rss_mb, stats.pop('peak_rss_mb'))
+        s.add(**stats)
+    return result
+
+def lookup_transcription(audio_path: str) -> tuple:
+    """(cache_key, is_cached) for audio_path in the transcription store"""
+    cache_key = transcription_store.key(audio_path, WHISPER_MODEL or TRANSCRIPTION_PROFILE)
+    return cache_key, transcription_store.get(cache_key) is not None
+
+async def generate_viral_titles(transcript_texts: list) -> list:
+    """Titles for all of a video's shorts in one batched, cached request"""
+    try:
+        return await title_service.titles_async(transcript_texts)
+    except TitleError as e:
         logger.error(f"Title generation error: {e}")
-        return "🔥 Amazing Moment"
+        return ["🔥 Amazing Moment"] * len(transcript_texts)
+
+SUBTITLE_STYLE = 'FontName=Arial,FontSize=24,PrimaryColour=&HFFFFFF,OutlineColour=&H000000,Outline=2,Alignment=10'
 
-def create_subtitled_video(video_path: str, transcription, clip, output_path: str) -> str:
+def write_srt_subtitles(word_index, clip, srt_file: str):
+    """Write clip-relative SRT subtitles and return the path, or None if the clip has no words"""
     try:
-        word_info = [w for w in transcription.words 
-                     if w.start >= clip.start_time and w.end <= clip.end_time]
+        word_info = word_index.word_info(clip.start_time, clip.end_time)
         
         if not word_info:
-            logger.warning("No words found for subtitles, returning original video")
-            return video_path
+            logger.warning("No words found for subtitles, rendering without them")
+            return None
         
-        srt_file = output_path.replace('.mp4', '.srt')
         with open(srt_file, 'w', encoding='utf-8') as f:
             counter = 1
             for i in range(0, len(word_info), 5):
                 words_group = word_info[i:i+5]
-                start_time = words_group[0].start - clip.start_time
-                end_time = words_group[-1].end - clip.start_time
-                text = " ".join([w.word for w in words_group])
+                start_time = words_group[0]["start_time"] - clip.start_time
+                end_time = words_group[-1]["end_time"] - clip.start_time
+                text = " ".join([w["word"] for w in words_group])
                 
                 f.write(f"{counter}\n")
                 f.write(f"{format_srt_time(start_time)} --> {format_srt_time(end_time)}\n")
                 f.write(f"{text}\n\n")
                 counter += 1
         
-        cmd = [
-            'ffmpeg', '-i', video_path,
-            '-vf', f"subtitles={srt_file}:force_style='FontName=Arial,FontSize=24,PrimaryColour=&HFFFFFF,OutlineColour=&H000000,Outline=2,Alignment=10'",
-            '-c:a', 'copy',
-            '-y', output_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            logger.error(f"FFmpeg subtitle error: {result.stderr}")
-            return video_path
-        
-        if os.path.exists(srt_file):
-            os.remove(srt_file)
-        
-        return output_path
+        return srt_file
     except Exception as e:
         logger.error(f"Subtitle error: {e}")
-        return video_path
+        return None
 
 def format_srt_time(seconds: float) -> str:
     hours = int(seconds // 3600)
@@ -144,84 +175,325 @@ def format_srt_time(seconds: float) -> str:
     millis = int((seconds % 1) * 1000)
     return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
 
-async def process_video_task(video_path: str, num_clips: int, chat_id: int, context: ContextTypes.DEFAULT_TYPE):
+def short_size(section_path: str, profile=OUTPUT_PROFILE) -> tuple:
+    """(width, height) of the 9:16 short rendered from section_path: the profile's size, capped by the source"""
+    video = stream_info(section_path, 'video')
+    return output_size(profile, *center_crop_size(int(video['width']), int(video['height'])))
+
+async def build_short(url: str, word_index, clip, idx: int, on_draft=None) -> tuple:
+    """
+    Fetch the clip's video section, then subtitle and render it once a
+    render slot is free. With on_draft, a preview is rendered first and
+    awaited as on_draft(path, width, height) before the full-quality render.
+    Returns (video path, width, height).
+    """
+    output_file = job_temp_path("output", f"short_{idx}", ".mp4")
+    prefix = os.path.splitext(os.path.basename(output_file))[0]
+    section_path = srt_file = None
+    loop = asyncio.get_running_loop()
+    try:
+        section_path, offset = await loop.run_in_executor(
+            None, ingest.fetch_section, url, clip.start_time, clip.end_time, "input", prefix, OUTPUT_PROFILE.height)
+        with span('subtitles', clip=idx):
+            srt_file = write_srt_subtitles(word_index, clip, output_file.replace('.mp4', '.srt'))
+        # SRT subtitles are laid out relative to the frame height, so the same style fits every profile
+        subtitle_filter = srt_filter(srt_file, SUBTITLE_STYLE) if srt_file else None
+        profiles = [PREVIEW_PROFILE, OUTPUT_PROFILE] if on_draft else [OUTPUT_PROFILE]
+        for profile in profiles:
+            width, height = await loop.run_in_executor(None, short_size, section_path, profile)
+            path = output_file if profile is OUTPUT_PROFILE else output_file.replace('.mp4', f'_{profile.name}.mp4')
+            # The section starts `offset` seconds before clip.start_time; the render's seek trims the pre-roll
+            video = await render_scheduler.run_async(
+                render_clip_async,
+                section_path, offset, offset + clip.end_time - clip.start_time, path,
+                video_graph=center_crop_graph(width, height),
+                subtitle_filter=subtitle_filter,
+                profile=profile
+            )
+            if profile is not OUTPUT_PROFILE:
+                try:
+                    await on_draft(video, width, height)
+                except Exception as e:
+                    logger.warning(f"Could not send the preview of short {idx}: {e}")
+                finally:
+                    os.remove(video)
+    finally:
+        for temp_file in [srt_file, section_path]:
+            if temp_file and os.path.exists(temp_file):
+                os.remove(temp_file)
+    
+    return video, width, height
+
+def job_checkpoint(url: str) -> Checkpoint:
+    """The video's checkpoint manifest; a restarted job resumes from it instead of starting over"""
+    video_id = ingest.youtube_video_id(url)
+    return Checkpoint.open(os.path.join(DEFAULT_MANIFEST_DIR, f"youtube_{video_id}.json"),
+                           source=video_id, profile=WHISPER_MODEL or TRANSCRIPTION_PROFILE,
+                           output_profile=OUTPUT_PROFILE.name)
+
+async def process_video_task(url: str, num_clips: int, chat_id: int, bot,
+                             audio_path: str = None, cache_key: str = None, checkpoint: Checkpoint = None):
+    """
+    Transcribe the audio (unless cache_key already names a stored transcription),
+    find clips, then fetch, render and send the shorts. Returns the result to cache
+    ({'cache_key', 'shorts': [{'file_id', 'title'}]}), or None if the job failed.
+    Progress is checkpointed, so a rerun reuses the chosen clips and resends
+    shorts that were already uploaded by file_id instead of rendering them again.
+    """
+    checkpoint = checkpoint or job_checkpoint(url)
     try:
         init_models()
         
-        await context.bot.send_message(chat_id, "📝 Transcribing video... (this may take a few minutes)")
-        transcription = transcriber.transcribe(audio_file_path=video_path)
+        is_cached = True
+        if cache_key is None:
+            # Hashing is plain file I/O: a thread does it without waiting behind other jobs' transcriptions
+            cache_key, is_cached = await asyncio.get_running_loop().run_in_executor(
+                None, lookup_transcription, audio_path)
         
-        await context.bot.send_message(chat_id, "🎯 AI is finding the best moments...")
-        clips = clip_finder.find_clips(transcription=transcription)
+        async with transcribe_slots:
+            if not is_cached:
+                await bot.send_message(chat_id, "📝 Transcribing video... (this may take a few minutes)")
+                await run_traced_in_analysis_worker('transcribe', bot_workers.transcribe, audio_path, cache_key)
+            else:
+                await bot.send_message(chat_id, "📝 Using cached transcription...")
+            checkpoint.complete_stage('transcribe', cache_key=cache_key)
+            
+            if checkpoint.stage('select') is not None:
+                clips = [clip for clip, _ in checkpoint.clips()]
+            else:
+                await bot.send_message(chat_id, "🎯 AI is finding the best moments...")
+                clips = await run_traced_in_analysis_worker('find_clips', bot_workers.find_clips, cache_key)
+                checkpoint.set_clips([(clip, None) for clip in clips])
+                checkpoint.complete_stage('select', clips=len(clips))
         
         if not clips:
-            await context.bot.send_message(chat_id, "❌ Failed to find suitable moments for clips")
-            return
+            await bot.send_message(chat_id, "❌ Failed to find suitable moments for clips")
+            return None
         
         clips = clips[:num_clips]
-        await context.bot.send_message(chat_id, f"✂️ Creating {len(clips)} shorts...")
+        await bot.send_message(chat_id, f"✂️ Creating {len(clips)} shorts...")
+        word_index = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: transcription_store.get(cache_key).word_index())
         
-        for idx, clip in enumerate(clips, 1):
+        # All shorts that weren't uploaded before render concurrently; they are sent in order as they finish
+        uploaded = [checkpoint.clip_step(idx, 'sent') for idx in range(len(clips))]
+        drafts = {}  # preview messages by short index, deleted once the full-quality short is sent
+        
+        def send_draft(idx: int):
+            async def on_draft(path: str, width: int, height: int):
+                with open(path, 'rb') as video:
+                    drafts[idx] = await bot.send_video(
+                        chat_id, video=video, caption=f"👀 Preview of short {idx}/{len(clips)}, full quality on the way...",
+                        supports_streaming=True, width=width, height=height)
+            return on_draft if PREVIEW_DRAFTS else None
+        
+        renders = [None if uploaded[idx - 1] else asyncio.ensure_future(build_short(url, word_index, clip, idx,
+                                                                                    send_draft(idx)))
+                   for idx, clip in enumerate(clips, 1)]
+        # One batched title request for the new shorts, running while they render
+        pending = [idx for idx, render in enumerate(renders) if render is not None]
+        titles_task = asyncio.ensure_future(generate_viral_titles(
+            [word_index.text(clips[idx].start_time, clips[idx].end_time, max_words=40) for idx in pending]))
+        
+        shorts = []
+        for idx, render in enumerate(renders, 1):
+            sent = uploaded[idx - 1]
+            if sent is not None:
+                if chat_id not in sent['chats']:
+                    await bot.send_video(chat_id, video=sent['file_id'],
+                                         caption=f"🎬 Short {idx}/{len(clips)}\n\n{sent['title']}",
+                                         supports_streaming=True)
+                    checkpoint.complete_clip_step(idx - 1, 'sent', file_id=sent['file_id'], title=sent['title'],
+                                                  chats=sent['chats'] + [chat_id])
+                shorts.append({'file_id': sent['file_id'], 'title': sent['title']})
+                continue
             try:
-                await context.bot.send_message(chat_id, f"⚙️ Processing short {idx}/{len(clips)}...")
-                
-                clip_words = [w.word for w in transcription.words 
-                             if w.start >= clip.start_time and w.end <= clip.end_time]
-                clip_text = " ".join(clip_words[:40])
-                viral_title = generate_viral_title(clip_text)
-                
-                temp_cropped = f"output/temp_cropped_{idx}.mp4"
-                
-                cmd = [
-                    'ffmpeg', '-i', video_path,
-                    '-ss', str(clip.start_time),
-                    '-t', str(clip.end_time - clip.start_time),
-                    '-c', 'copy',
-                    '-y', temp_cropped
-                ]
-                subprocess.run(cmd, check=True, capture_output=True)
+                final_video, width, height = await render
+                viral_title = dict(zip(pending, await titles_task))[idx - 1]
                 
-                temp_resized = f"output/temp_resized_{idx}.mp4"
-                cmd = [
-                    'ffmpeg', '-i', temp_cropped,
-                    '-vf', 'scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920',
-                    '-c:a', 'copy',
-                    '-y', temp_resized
-                ]
-                subprocess.run(cmd, check=True, capture_output=True)
-                
-                output_file = f"output/short_{idx}.mp4"
-                final_video = create_subtitled_video(temp_resized, transcription, clip, output_file)
-                
-                with open(final_video, 'rb') as video:
-                    await context.bot.send_video(
+                with open(final_video, 'rb') as video, span('upload', clip=idx) as upload:
+                    message = await bot.send_video(
                         chat_id,
                         video=video,
                         caption=f"🎬 Short {idx}/{len(clips)}\n\n{viral_title}",
                         supports_streaming=True,
-                        width=1080,
-                        height=1920
+                        width=width,
+                        height=height
                     )
+                    upload.add(bytes_read=os.path.getsize(final_video))
+                if idx in drafts:
+                    try:
+                        await drafts.pop(idx).delete()
+                    except Exception as e:
+                        logger.warning(f"Could not delete the preview of short {idx}: {e}")
+                shorts.append({'file_id': message.video.file_id, 'title': viral_title})
+                checkpoint.complete_clip_step(idx - 1, 'sent', file_id=message.video.file_id, title=viral_title,
+                                              chats=[chat_id])
                 
-                for temp_file in [temp_cropped, temp_resized, output_file]:
-                    if os.path.exists(temp_file):
-                        os.remove(temp_file)
+                if os.path.exists(final_video):
+                    os.remove(final_video)
                 
             except Exception as e:
                 logger.error(f"Error processing clip {idx}: {e}")
-                await context.bot.send_message(chat_id, f"⚠️ Error creating short {idx}: {str(e)}")
+                await bot.send_message(chat_id, f"⚠️ Error creating short {idx}: {str(e)}")
         
-        await context.bot.send_message(chat_id, "✅ Done! All shorts sent!")
+        await bot.send_message(chat_id, "✅ Done! All shorts sent!")
+        if len(shorts) == len(clips):
+            checkpoint.update(status='done')
+        return {'cache_key': cache_key, 'shorts': shorts}
         
     except Exception as e:
         logger.error(f"Processing error: {e}")
-        await context.bot.send_message(chat_id, f"❌ Processing error: {str(e)}")
+        await bot.send_message(chat_id, f"❌ Processing error: {str(e)}")
+        return None
+    
+    finally:
+        if audio_path and os.path.exists(audio_path):
+            os.remove(audio_path)
+
+async def send_cached_shorts(bot, chat_id: int, result: dict, num_clips: int):
+    """Resend already uploaded shorts by Telegram file_id, without rendering or uploading"""
+    shorts = result['shorts'][:num_clips]
+    await bot.send_message(chat_id, "⚡ This video was processed recently, sending the shorts right away!")
+    for idx, short in enumerate(shorts, 1):
+        await bot.send_video(
+            chat_id,
+            video=short['file_id'],
+            caption=f"🎬 Short {idx}/{len(shorts)}\n\n{short['title']}",
+            supports_streaming=True
+        )
+    await bot.send_message(chat_id, "✅ Done! All shorts sent!")
+
+async def run_pipeline(job: dict, bot, cached: dict = None):
+    """Download the job's audio (unless its transcription is cached) and run the pipeline"""
+    chat_id = job['chat_id']
+    checkpoint = job_checkpoint(job['url'])
+    transcribed = checkpoint.stage('transcribe')
+    cache_key = cached['cache_key'] if cached else transcribed and transcribed['cache_key']
+    if cache_key and transcription_store.get(cache_key) is not None:
+        if checkpoint.resumed and not cached:
+            await bot.send_message(chat_id, "♻️ Resuming where this video left off...")
+        return await process_video_task(job['url'], job['num_clips'], chat_id, bot, cache_key=cache_key,
+                                         checkpoint=checkpoint)
+    
+    loop = asyncio.get_running_loop()
+    await bot.send_message(chat_id, "📥 Your turn! Fetching video info from YouTube...")
+    info = await loop.run_in_executor(None, ingest.probe_url, job['url'])
+    title = info.get('title', 'Video')
+    duration = info.get('duration') or 0
+    
+    if duration > 1800:
+        await bot.send_message(chat_id, "❌ Video too long! Maximum 30 minutes")
+        return None
     
+    # Only the audio is needed to transcribe; video is fetched per clip later
+    prefix = f"{ingest.youtube_video_id(job['url'])}_{job['id']}"
+    audio_path, _ = await loop.run_in_executor(None, ingest.fetch_audio, job['url'], "input", prefix)
+    
+    duration_min = duration // 60
+    await bot.send_message(
+        chat_id,
+        f"✅ Downloaded audio: *{title}*\n"
+        f"⏱️ Duration: {duration_min} min\n"
+        f"🎬 Creating {job['num_clips']} shorts...\n\n"
+        f"_This will take 5-20 minutes. I'll send clips when ready!_",
+        parse_mode='Markdown'
+    )
+    
+    return await process_video_task(job['url'], job['num_clips'], chat_id, bot, audio_path=audio_path,
+                                     checkpoint=checkpoint)
+
+async def run_job(job: dict, bot):
+    """
+    Serve a job from the result cache, by joining an in-flight pipeline for the
+    same video, or by running the pipeline; then record the outcome in the queue.
+    """
+    chat_id = job['chat_id']
+    video_id = ingest.youtube_video_id(job['url'])
+    status = FAILED
+    tracer.observe('queue_wait', max(0.0, time.time() - job['created_at']), video=video_id)
+    try:
+        cached = result_cache.get(video_id)
+        if cached and len(cached['shorts']) >= job['num_clips']:
+            await send_cached_shorts(bot, chat_id, cached, job['num_clips'])
+            status = DONE
+            return
+        
+        if pipelines.is_running(video_id):
+            await bot.send_message(chat_id, "🤝 Someone is already processing this video, joining in...")
+        result, is_leader = await pipelines.run(video_id, lambda: run_pipeline(job, bot, cached))
+        if not is_leader:
+            if result and len(result['shorts']) >= job['num_clips']:
+                await send_cached_shorts(bot, chat_id, result, job['num_clips'])
+            else:
+                # The shared run made fewer shorts than this user asked for
+                result = await run_pipeline(job, bot, result or cached)
+        
+        # A run that sent no shorts is a failure: don't cache it or report it as done
+        if result and result['shorts']:
+            result_cache.put(video_id, result)
+            status = DONE
+    except Exception as e:
+        logger.error(f"Error in job {job['id']}: {e}")
+        await bot.send_message(chat_id, f"❌ Error: {str(e)}")
     finally:
-        if os.path.exists(video_path):
-            os.remove(video_path)
-        if chat_id in user_processes:
-            del user_processes[chat_id]
+        job_queue.finish(job['id'], status)
+
+async def dispatch_jobs(bot):
+    """Start queued jobs in fair order whenever one of the MAX_ACTIVE_JOBS slots is free"""
+    while True:
+        await job_slots.acquire()
+        job = job_queue.claim_next()
+        if job is None:
+            job_slots.release()
+            try:
+                await asyncio.wait_for(job_available.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                pass
+            job_available.clear()
+            continue
+        task = asyncio.create_task(run_job(job, bot))
+        running_jobs.add(task)
+        task.add_done_callback(running_jobs.discard)
+        task.add_done_callback(lambda _: job_slots.release())
+
+async def post_init(application: Application):
+    global transcribe_slots, job_slots, job_available
+    transcribe_slots = asyncio.Semaphore(TRANSCRIBE_SLOTS)
+    job_slots = asyncio.Semaphore(MAX_ACTIVE_JOBS)
+    job_available = asyncio.Event()
+    requeued = job_queue.requeue_interrupted()
+    if requeued:
+        logger.info(f"♻️ Re-queued {requeued} job(s) interrupted by the last shutdown")
+    if METRICS_PORT:
+        tracer.gauge('jobs_queued', 'Jobs waiting in the queue', lambda: job_queue.depth()['queued'])
+        tracer.gauge('jobs_running', 'Jobs being processed', lambda: job_queue.depth()['running'])
+        tracer.gauge('rss_mb', 'Memory used by the bot process', lambda: round(rss_mb()))
+        tracer.gauge('peak_rss_mb', 'Peak memory of the bot process', lambda: round(peak_rss_mb()))
+        tracer.gauge('worker_peak_rss_mb', 'Peak memory of any analysis worker', lambda: round(worker_peak_rss_mb))
+        application.bot_data['metrics_server'] = tracer.serve(METRICS_PORT, METRICS_HOST)
+        logger.info(f"📈 Metrics at http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    # Keep references so the tasks aren't garbage-collected while they run
+    application.bot_data['background_tasks'] = [asyncio.create_task(warm_up_models()),
+                                                asyncio.create_task(dispatch_jobs(application.bot))]
+
+async def post_shutdown(application: Application):
+    """Stop the background tasks and the worker processes (each unloads its models as it exits)"""
+    tasks = application.bot_data.pop('background_tasks', [])
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if analysis_pool is not None:
+        analysis_ready.put(None)  # in case the warm-up is still waiting for a worker
+        analysis_pool.shutdown(wait=True)
+    render_scheduler.shutdown()
+    title_service.close()
+    if 'metrics_server' in application.bot_data:
+        application.bot_data['metrics_server'].shutdown()
+
+def format_eta(seconds: float) -> str:
+    minutes = max(1, round(seconds / 60))
+    return f"~{minutes} min"
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     welcome_text = """
@@ -255,14 +527,16 @@ You can add number of clips:
     await update.message.reply_text(welcome_text, parse_mode='Markdown')
 
 async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    active_tasks = len(user_processes)
+    depth = job_queue.depth()
+    availability = "Ready to work" if depth['running'] < MAX_ACTIVE_JOBS else f"Busy, {format_eta(job_queue.eta_seconds(depth['queued'] + 1, MAX_ACTIVE_JOBS))} wait"
     status_text = f"""
 📊 *Bot Status:*
 
 🟢 Status: Active
-⚙️ Model: Whisper Large-v2
-📝 Active tasks: {active_tasks}
-🎬 Availability: Ready to work
+⚙️ Model: {describe_profile(WHISPER_MODEL or TRANSCRIPTION_PROFILE)} ({models_status})
+📝 Active tasks: {depth['running']}/{MAX_ACTIVE_JOBS}
+🧾 Queued: {depth['queued']}
+🎬 Availability: {availability}
 """
     await update.message.reply_text(status_text, parse_mode='Markdown')
 
@@ -295,10 +569,6 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     message_text = update.message.text.strip()
     
-    if chat_id in user_processes:
-        await update.message.reply_text("⏳ Already processing your previous video. Please wait!")
-        return
-    
     parts = message_text.split()
     if not parts:
         await update.message.reply_text("❌ Send a YouTube video link")
@@ -318,39 +588,30 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Invalid YouTube link. Send youtube.com or youtu.be format")
         return
     
-    user_processes[chat_id] = True
-    
     try:
-        await update.message.reply_text("📥 Downloading video from YouTube...")
-        video_path, title, duration = download_youtube_video(url)
-        
-        if duration > 1800:
-            os.remove(video_path)
-            del user_processes[chat_id]
-            await update.message.reply_text("❌ Video too long! Maximum 30 minutes")
-            return
-        
-        duration_min = duration // 60
+        job_id = job_queue.enqueue(chat_id, url, num_clips)
+    except QueueFullError as e:
+        await update.message.reply_text(f"⏳ {e}")
+        return
+    
+    job_available.set()
+    position = job_queue.position(job_id)
+    free_slots = MAX_ACTIVE_JOBS - job_queue.depth()['running']
+    if position is None or position <= free_slots:
+        await update.message.reply_text("📥 Starting now...")
+    else:
+        eta = format_eta(job_queue.eta_seconds(position - max(0, free_slots), MAX_ACTIVE_JOBS))
         await update.message.reply_text(
-            f"✅ Downloaded: *{title}*\n"
-            f"⏱️ Duration: {duration_min} min\n"
-            f"🎬 Creating {num_clips} shorts...\n\n"
-            f"_This will take 5-20 minutes. I'll send clips when ready!_",
+            f"🧾 Queued! Position: {position}\n"
+            f"⏱️ Estimated wait: {eta}\n\n"
+            f"_I'll message you when your video starts._",
             parse_mode='Markdown'
         )
-        
-        asyncio.create_task(process_video_task(video_path, num_clips, chat_id, context))
-        
-    except Exception as e:
-        logger.error(f"Error in handle_message: {e}")
-        if chat_id in user_processes:
-            del user_processes[chat_id]
-        await update.message.reply_text(f"❌ Error: {str(e)}")
 
 def main():
     logger.info("🚀 Starting ClippedAI Telegram Bot...")
     
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = Application.builder().token(TELEGRAM_BOT_TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
     
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("status", status_command))
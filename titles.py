@@ -0,0 +1,213 @@
+"""
+Viral title generation.
+All clips of a video are titled with one chat completion request against an
+OpenAI-compatible API (Groq by default; any compatible server, e.g. a local
+stand-in, via base_url). Requests go over a pooled keep-alive session with
+timeouts and jittered exponential backoff on 429/5xx, and titles are cached
+by a hash of the transcript text so reruns and repeated videos cost nothing.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import span
+
+DEFAULT_BASE_URL = 'https://api.groq.com/openai/v1'
+DEFAULT_MODEL = 'llama3-8b-8192'
+DEFAULT_TITLE_CACHE = os.path.join('cache', 'titles.sqlite3')
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 1.0  # first retry delay; doubles per attempt, with full jitter
+MAX_BACKOFF_SECONDS = 30.0
+TIMEOUT = (5, 60)  # connect, read seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+FALLBACK_TITLE = "Untitled Clip"  # for an answer with no usable title; never cached
+
+EXAMPLE_TITLES = [
+    "She was almost dead 😵", "He made $1,000,000 in 1 hour 💸", "This changed everything... 😲", "They couldn't believe what happened! 😱", "He risked it all for this 😬", "She said YES! 💍", "He lost everything in seconds 😢", "The offer that shocked everyone 🤯", "He walked away with $500,000 🤑", "She turned down the deal! 🙅‍♀️", "He quit his job for this 😳", "She broke the record! 🏆", "He lost it all in Vegas 🎰", "She found out the truth 😳", "He got a second chance 🙌", "She saved his life 🦸‍♀️", "He was left speechless 😶", "She made history 📚", "He got the golden buzzer! 🔔", "She walked away a millionaire 💰", "He faced his fears 😨", "She got the surprise of her life 😮", "He made the impossible possible 🤯", "She said what?! 😲", "He got caught on camera 🎥", "She made the deal of a lifetime 🤝", "He risked everything for love ❤️", "She shocked the judges 😱", "He got the last laugh 😂", "She turned the tables 🔄", "He made the ultimate sacrifice 🥲", "She got the call she was waiting for ☎️", "He pulled off the impossible 😮", "She got the offer of a lifetime 💼", "He made the crowd go wild 🙌", "She got the biggest surprise 😲", "He made the judges cry 😢", "She got the golden ticket 🎫", "He made the world record 🌍", "She got the best deal ever 🏆", "He made the crowd cheer 👏", "She got the shock of her life 😱", "He made the impossible happen 🤯", "She got the best surprise 🎉", "He made the judges laugh 😂", "She got the golden opportunity 🥇", "He made the best deal 💰", "She got the best offer 🏅", "He made the impossible real 😲", "She got the best surprise ever 🎉", "He made the judges smile 😊", "She got the golden chance 🥇", "He made the best offer 💸", "She got the best deal 💰", "He made the impossible true 🤯", "She got the best opportunity 🏆", "He made the judges happy 😃", "She got the golden moment 🥇", "He made the best surprise 🎉", "She got the best chance 🍀", "He made the impossible work 🤔", "She got the best moment 🏆", "He made the judges proud 👏", "She got the golden surprise 🥇", "He made the best opportunity 🏅", "She got the best smile 😊", "He made the impossible win 🏆", "She got the best win 🏆", "He made the judges amazed 😲", "She got the golden win 🥇", "He made the best smile 😊", "She got the best proud 😃", "He made the impossible proud 😎", "She got the best amazed 😲", "He made the judges win 🏆", "She got the golden proud 🥇", "He made the best amazed 😲", "She got the best win ever 🏆"
+]
+
+STYLE = (
+    "generate a catchy, viral YouTube Shorts title (max 7 words). ALWAYS include an emoji in the title. "
+    "Do NOT use hashtags. Do NOT explain, do NOT repeat the prompt, do NOT add quotes. "
+    "The title should be in the style of these examples: " + ", ".join(EXAMPLE_TITLES) + "."
+)
+
+
+class TitleError(Exception):
+    """Raised when the API keeps failing or its answer can't be parsed"""
+
+
+def text_key(text: str, model: str) -> str:
+    return hashlib.blake2b(f'{model}\0{STYLE}\0{text}'.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def batch_prompt(texts: list) -> str:
+    """One prompt for all transcripts; the examples are sent once per video instead of once per clip"""
+    numbered = '\n\n'.join(f'Transcript {i}:\n{text}' for i, text in enumerate(texts, 1))
+    return (
+        f"For each of the {len(texts)} transcripts below, {STYLE}\n\n"
+        f"Answer with ONLY a JSON array of {len(texts)} strings, the titles in transcript order.\n\n" + numbered
+    )
+
+
+def single_prompt(text: str) -> str:
+    return (
+        f"Given the following transcript, {STYLE} ONLY output the title, nothing else. "
+        "If you do not follow these instructions, your output will be discarded.\n\nTranscript:\n" + text
+    )
+
+
+def clean_title(line: str) -> str:
+    return line.strip().strip('"').strip()
+
+
+def parse_single(content: str):
+    """The first line that looks like a title, skipping 'Here is...' / 'Title:' preambles; None if there is none"""
+    lines = [clean_title(l) for l in content.strip().split('\n')
+             if l.strip() and not l.lower().startswith('here') and not l.lower().startswith('title:')]
+    return lines[0] if lines else None
+
+
+def parse_batch(content: str, count: int) -> list:
+    match = re.search(r'\[.*\]', content, re.DOTALL)
+    if not match:
+        raise TitleError('no JSON array in the batched answer')
+    try:
+        titles = json.loads(match.group(0))
+    except ValueError as e:
+        raise TitleError(f'unparseable batched answer: {e}')
+    if len(titles) != count or not all(isinstance(t, str) and t.strip() for t in titles):
+        raise TitleError(f'expected {count} titles, got {len(titles)}')
+    return [clean_title(t) for t in titles]
+
+
+class TitleCache:
+    """Titles by transcript hash in SQLite"""
+
+    def __init__(self, path: str = DEFAULT_TITLE_CACHE):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("CREATE TABLE IF NOT EXISTS titles (key TEXT PRIMARY KEY, title TEXT NOT NULL, created_at REAL NOT NULL)")
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: list) -> dict:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT key, title FROM titles WHERE key IN ({','.join('?' * len(keys))})", keys).fetchall()
+        return dict(rows)
+
+    def put_many(self, items: dict):
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO titles (key, title, created_at) VALUES (?, ?, ?)",
+                                 [(k, t, time.time()) for k, t in items.items()])
+
+
+class TitleService:
+    """
+    Titles for clip transcripts. titles() serves what it can from the cache
+    and asks for the rest in one batched request, falling back to
+    concurrent single requests on the same session if the batched answer
+    doesn't parse. Thread safe; titles_async() is the asyncio variant.
+    """
+
+    def __init__(self, api_key: str, base_url: str = DEFAULT_BASE_URL, model: str = DEFAULT_MODEL,
+                 cache: TitleCache = None, max_retries: int = MAX_RETRIES, timeout=TIMEOUT,
+                 concurrency: int = 4, max_chars: int = None):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.cache = cache if cache is not None else TitleCache()
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.max_chars = max_chars
+        self._session = requests.Session()  # keep-alive: one TCP/TLS handshake per host, not per clip
+        self._session.headers.update({'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'})
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._requests = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='title-request')
+        self._jobs = ThreadPoolExecutor(max_workers=2, thread_name_prefix='titles')
+
+    def titles(self, texts: list) -> list:
+        """A title per transcript text, in order; raises TitleError if the API can't be reached"""
+        keys = [text_key(text, self.model) for text in texts]
+        known = self.cache.get_many(sorted(set(keys))) if keys else {}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in known:
+                missing[key] = text
+        if missing:
+            with span('title', clips=len(texts), generated=len(missing), model=self.model):
+                new = self._generate(list(missing.values()))
+            generated = {key: title for key, title in zip(missing, new) if title}
+            self.cache.put_many(generated)  # answers without a title are asked for again next time
+            known.update(generated)
+        return [self._trim(known.get(key) or FALLBACK_TITLE) for key in keys]
+
+    def title(self, text: str) -> str:
+        return self.titles([text])[0]
+
+    def submit(self, texts: list):
+        """titles(texts) in the background; returns a concurrent.futures.Future"""
+        return self._jobs.submit(self.titles, texts)
+
+    async def titles_async(self, texts: list) -> list:
+        return await asyncio.wrap_future(self.submit(texts))
+
+    def close(self):
+        self._jobs.shutdown(wait=True)
+        self._requests.shutdown(wait=True)
+        self._session.close()
+
+    def _trim(self, title: str) -> str:
+        return title[:self.max_chars] if self.max_chars else title
+
+    def _generate(self, texts: list) -> list:
+        if len(texts) > 1:
+            try:
+                content = self._complete(batch_prompt(texts), max_tokens=40 * len(texts), temperature=0.8)
+                return parse_batch(content, len(texts))
+            except TitleError:
+                pass  # the model ignored the format; ask per clip instead
+        futures = [self._requests.submit(self._complete, single_prompt(text), 30, 0.8) for text in texts]
+        return [parse_single(future.result()) for future in futures]
+
+    def _complete(self, prompt: str, max_tokens: int, temperature: float) -> str:
+        """One chat completion, retried with jittered exponential backoff on 429/5xx and connection errors"""
+        import requests
+
+        payload = {
+            'model': self.model,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+        }
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = self._session.post(f'{self.base_url}/chat/completions', json=payload, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.json()['choices'][0]['message']['content']
+                error = TitleError(f'HTTP {response.status_code} from the title API')
+                retry_after = response.headers.get('Retry-After')
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except (requests.HTTPError, KeyError, IndexError, ValueError) as e:
+                raise TitleError(f'title request failed: {e}')
+            if attempt == self.max_retries:
+                break
+            delay = random.uniform(0, min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** attempt))
+            if retry_after and retry_after.replace('.', '', 1).isdigit():
+                delay = max(delay, float(retry_after))
+            time.sleep(delay)
+        raise TitleError(f'title request failed after {self.max_retries + 1} attempts: {error}')
@@ -0,0 +1,338 @@
+"""
+Lightweight tracing for the pipeline stages.
+`with span('transcribe', video=...)` records a stage's wall time, CPU time
+and bytes read/written (per thread, from /proc on Linux); ffmpeg runs
+started through run_ffmpeg() also report the encoder's speed, output size
+and the child process's CPU time from ffmpeg's -progress output. Spans are
+kept by a process-wide Tracer that main.py dumps as a per-run JSON trace
+and the bot serves as Prometheus text metrics.
+"""
+
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from memory import peak_rss_mb
+
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, float('inf'))
+METRIC_PREFIX = 'clippedai'
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+_current = contextvars.ContextVar('current_span', default=None)
+_ids = itertools.count(1)
+
+
+def _thread_io():
+    """(bytes read, bytes written) by the calling thread so far, or None where /proc isn't available"""
+    try:
+        with open(f'/proc/self/task/{threading.get_native_id()}/io', 'r') as f:
+            fields = dict(line.split(':') for line in f)
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError, AttributeError):
+        return None
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def _process_stats(pid: int) -> dict:
+    """CPU seconds and bytes read/written so far by another (child) process, from /proc"""
+    stats = {}
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        stats['cpu_s'] = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS  # utime + stime
+        with open(f'/proc/{pid}/io', 'r') as f:
+            io = dict(line.split(':') for line in f)
+        stats['bytes_read'], stats['bytes_written'] = int(io['rchar']), int(io['wchar'])
+    except (OSError, IndexError, KeyError, ValueError):
+        pass
+    return stats
+
+
+class Span:
+    """One timed operation; attributes set with set() end up in the trace"""
+
+    def __init__(self, name: str, parent=None, **attrs):
+        self.id = next(_ids)
+        self.name = name
+        self.parent_id = parent.id if parent is not None else None
+        self.attrs = attrs
+        self.start = time.time()
+        self.wall_s = self.cpu_s = 0.0
+        self.bytes_read = self.bytes_written = 0
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, cpu_s: float = 0.0, bytes_read: int = 0, bytes_written: int = 0):
+        """Count work done on this span's behalf elsewhere, e.g. by a child process"""
+        self.cpu_s += cpu_s
+        self.bytes_read += bytes_read
+        self.bytes_written += bytes_written
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id, 'parent': self.parent_id, 'name': self.name, 'start': round(self.start, 6),
+            'wall_s': round(self.wall_s, 4), 'cpu_s': round(self.cpu_s, 4),
+            'bytes_read': self.bytes_read, 'bytes_written': self.bytes_written,
+            'error': self.error, **self.attrs,
+        }
+
+
+class Tracer:
+    """
+    Collects finished spans: the most recent `keep` in full, and running
+    totals per span name that never grow (for a long-running bot).
+    """
+
+    def __init__(self, keep: int = 10000):
+        self._spans = deque(maxlen=keep)
+        self._totals = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """
+        Time the block and count the calling thread's CPU time and I/O. In an
+        asyncio task the thread is shared with every other task, so there
+        only the work added with Span.add() (child and worker processes) counts.
+        """
+        span = Span(name, _current.get(), **attrs)
+        token = _current.set(span)
+        measure = not _in_event_loop()
+        wall = time.perf_counter()
+        cpu, io = (time.thread_time(), _thread_io()) if measure else (None, None)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            _current.reset(token)
+            span.wall_s = time.perf_counter() - wall
+            if measure:
+                span.cpu_s += time.thread_time() - cpu
+            end_io = _thread_io() if measure else None
+            if io and end_io:
+                span.bytes_read += end_io[0] - io[0]
+                span.bytes_written += end_io[1] - io[1]
+            self._record(span)
+
+    def observe(self, name: str, seconds: float, **attrs):
+        """Record a duration measured elsewhere (e.g. time spent waiting in a queue) as a span"""
+        span = Span(name, _current.get(), **attrs)
+        span.start -= seconds
+        span.wall_s = seconds
+        self._record(span)
+
+    def _record(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+            totals = self._totals.get(span.name)
+            if totals is None:
+                totals = self._totals[span.name] = {
+                    'count': 0, 'errors': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'bytes_read': 0, 'bytes_written': 0,
+                    'buckets': [0] * len(DURATION_BUCKETS), 'ffmpeg_speed': None,
+                }
+            totals['count'] += 1
+            totals['errors'] += span.error is not None
+            totals['wall_s'] += span.wall_s
+            totals['cpu_s'] += span.cpu_s
+            totals['bytes_read'] += span.bytes_read
+            totals['bytes_written'] += span.bytes_written
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.wall_s <= bound:
+                    totals['buckets'][i] += 1
+            if span.attrs.get('ffmpeg_speed') is not None:
+                totals['ffmpeg_speed'] = span.attrs['ffmpeg_speed']
+
+    def spans(self) -> list:
+        with self._lock:
+            return [s.to_dict() for s in self._spans]
+
+    def summary(self) -> dict:
+        """Totals per span name, slowest first"""
+        with self._lock:
+            items = sorted(self._totals.items(), key=lambda kv: kv[1]['wall_s'], reverse=True)
+            return {name: {k: round(v, 4) if isinstance(v, float) else v for k, v in t.items() if k != 'buckets'}
+                    for name, t in items}
+
+    def write_json(self, path: str, **meta) -> str:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({**meta, 'summary': self.summary(), 'spans': self.spans()}, f, indent=2, ensure_ascii=False)
+        return path
+
+    def gauge(self, name: str, help_text: str, fn):
+        """Export fn()'s current value as a gauge on every scrape"""
+        self._gauges[name] = (help_text, fn)
+
+    def prometheus_text(self) -> str:
+        """All totals in the Prometheus text exposition format"""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {METRIC_PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name} {kind}')
+            lines.extend(f'{METRIC_PREFIX}_{name}{labels} {value}' for labels, value in samples)
+
+        with self._lock:
+            totals = {name: dict(t, buckets=list(t['buckets'])) for name, t in self._totals.items()}
+        stage = lambda name: f'{{stage="{name}"}}'
+        metric('stage_runs_total', 'counter', 'Finished spans per stage',
+               [(stage(n), t['count']) for n, t in totals.items()])
+        metric('stage_errors_total', 'counter', 'Spans per stage that raised',
+               [(stage(n), t['errors']) for n, t in totals.items()])
+        metric('stage_cpu_seconds_total', 'counter', 'CPU time per stage, including ffmpeg children',
+               [(stage(n), round(t['cpu_s'], 4)) for n, t in totals.items()])
+        metric('stage_read_bytes_total', 'counter', 'Bytes read per stage',
+               [(stage(n), t['bytes_read']) for n, t in totals.items()])
+        metric('stage_written_bytes_total', 'counter', 'Bytes written per stage',
+               [(stage(n), t['bytes_written']) for n, t in totals.items()])
+        histogram = []
+        for n, t in totals.items():
+            histogram.extend((f'_bucket{{stage="{n}",le="{"+Inf" if b == float("inf") else b}"}}', c)
+                             for b, c in zip(DURATION_BUCKETS, t['buckets']))
+            histogram.append((f'_sum{stage(n)}', round(t['wall_s'], 4)))
+            histogram.append((f'_count{stage(n)}', t['count']))
+        lines.append(f'# HELP {METRIC_PREFIX}_stage_duration_seconds Wall time per stage')
+        lines.append(f'# TYPE {METRIC_PREFIX}_stage_duration_seconds histogram')
+        lines.extend(f'{METRIC_PREFIX}_stage_duration_seconds{suffix} {value}' for suffix, value in histogram)
+        metric('ffmpeg_speed', 'gauge', 'Encoding speed of the last ffmpeg run per stage (1.0 = real time)',
+               [(stage(n), t['ffmpeg_speed']) for n, t in totals.items() if t['ffmpeg_speed'] is not None])
+        for name, (help_text, fn) in list(self._gauges.items()):
+            try:
+                metric(name, 'gauge', help_text, [('', fn())])
+            except Exception:
+                pass  # a failing gauge must not break the scrape
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port: int, host: str = '127.0.0.1'):
+        """Serve /metrics from a daemon thread; returns the server (call shutdown() to stop)"""
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+        return server
+
+
+tracer = Tracer()  # process-wide
+span = tracer.span
+
+
+def measured_call(fn, *args):
+    """
+    (fn(*args), {cpu_s, bytes_read, bytes_written}) for a call in a worker
+    process that runs one task at a time, so the whole process's CPU time
+    and I/O are the call's. Pass the stats to Span.add() in the parent,
+    except for peak_rss_mb, the worker's memory high-water mark so far.
+    """
+    cpu, io = time.process_time(), _process_stats(os.getpid())
+    result = fn(*args)
+    stats = {'cpu_s': time.process_time() - cpu, 'peak_rss_mb': peak_rss_mb()}
+    end_io = _process_stats(os.getpid())
+    if 'bytes_read' in io and 'bytes_read' in end_io:
+        stats['bytes_read'] = end_io['bytes_read'] - io['bytes_read']
+        stats['bytes_written'] = end_io['bytes_written'] - io['bytes_written']
+    return result, stats
+
+
+def _with_progress(cmd: list) -> list:
+    """ffmpeg command that writes key=value progress blocks to stdout"""
+    return [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+
+
+class _ProgressReader:
+    """Folds ffmpeg -progress blocks into a span, sampling the child's CPU and I/O at each block"""
+
+    def __init__(self, span: Span, pid: int):
+        self.span = span
+        self.pid = pid
+        self.stats = {}
+
+    def line(self, line: str):
+        key, _, value = line.strip().partition('=')
+        if key == 'speed' and value.endswith('x'):
+            try:
+                self.span.set(ffmpeg_speed=float(value[:-1]))
+            except ValueError:
+                pass
+        elif key == 'total_size' and value.isdigit():
+            self.span.set(output_bytes=int(value))
+        elif key == 'out_time_us' and value.isdigit():
+            self.span.set(media_seconds=int(value) / 1e6)
+        elif key == 'progress':
+            self.stats = _process_stats(self.pid) or self.stats
+
+    def finish(self):
+        self.span.add(**self.stats)
+
+
+def run_ffmpeg(cmd: list, name: str = 'ffmpeg', **attrs) -> subprocess.CompletedProcess:
+    """
+    subprocess.run(cmd, check=True, capture_output=True) for an ffmpeg
+    command, traced as a span with the encoder's speed and the child's CPU
+    time and I/O. Raises CalledProcessError (with stderr) on failure.
+    """
+    with span(name, **attrs) as s:
+        proc = subprocess.Popen(_with_progress(cmd), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        reader = _ProgressReader(s, proc.pid)
+        stderr = []
+        drain = threading.Thread(target=lambda: stderr.append(proc.stderr.read()), daemon=True)
+        drain.start()
+        for line in proc.stdout:
+            reader.line(line)
+        drain.join()
+        returncode = proc.wait()
+        reader.finish()
+        err = (stderr[0] if stderr else '').encode()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd, b'', err)
+        return subprocess.CompletedProcess(cmd, returncode, b'', err)
+
+
+async def run_ffmpeg_async(cmd: list, name: str = 'ffmpeg', **attrs):
+    """run_ffmpeg() for asyncio code: ffmpeg runs as an asyncio subprocess, so the event loop stays free"""
+    with span(name, **attrs) as s:
+        proc = await asyncio.create_subprocess_exec(*_with_progress(cmd), stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.PIPE)
+        reader = _ProgressReader(s, proc.pid)
+        stderr_task = asyncio.ensure_future(proc.stderr.read())
+        async for line in proc.stdout:
+            reader.line(line.decode('utf-8', 'replace'))
+        err = await stderr_task
+        returncode = await proc.wait()
+        reader.finish()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd, b'', err)
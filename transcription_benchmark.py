@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Speed/accuracy check for the transcription profiles.
+Transcribes a sample with each profile and reports load time, real-time
+factor (processing seconds per second of audio, lower is faster) and word
+error rate against a reference transcript.
+
+    python transcription_benchmark.py --sample samples/sample.wav --reference samples/sample.txt
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+from audio_track import SAMPLE_RATE, decode_audio
+from transcription_profiles import PROFILES, describe_profile
+
+DEFAULT_SAMPLE = os.path.join('samples', 'sample.wav')
+DEFAULT_REFERENCE = os.path.join('samples', 'sample.txt')
+
+
+def normalize_words(text: str) -> list:
+    """Lowercase words without punctuation, so WER only counts real word differences"""
+    return re.findall(r"[\w']+", text.lower())
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """(substitutions + deletions + insertions) / reference words, via word-level edit distance"""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    if not ref:
+        return float(bool(hyp))
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def benchmark_profile(profile: str, audio, reference: str, language: str = None) -> dict:
+    from models import ModelRegistry
+
+    registry = ModelRegistry()
+    started = time.perf_counter()
+    registry.transcriber(profile)
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    transcription = registry.transcribe(audio, profile, language)
+    seconds = time.perf_counter() - started
+    registry.unload()
+    return {
+        'profile': profile,
+        'model': describe_profile(profile),
+        'load_seconds': round(load_seconds, 2),
+        'transcribe_seconds': round(seconds, 2),
+        'rtf': round(seconds / (len(audio) / SAMPLE_RATE), 3),
+        'wer': round(word_error_rate(reference, transcription.text), 4) if reference else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--sample', default=DEFAULT_SAMPLE, help='audio or video file to transcribe')
+    parser.add_argument('--reference', default=DEFAULT_REFERENCE, help='reference transcript (plain text)')
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), help='profiles or model sizes to compare')
+    parser.add_argument('--language', default=None, help='language code; detected by Whisper if omitted')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.sample):
+        parser.error(f'sample not found: {args.sample}')
+    reference = None
+    if os.path.exists(args.reference):
+        with open(args.reference, 'r', encoding='utf-8') as f:
+            reference = f.read()
+    else:
+        print(f'No reference transcript at {args.reference}, skipping WER')
+
+    audio = decode_audio(args.sample)  # decoded once, shared by every profile
+    duration = len(audio) / SAMPLE_RATE
+    results = [benchmark_profile(p, audio, reference, args.language) for p in args.profiles]
+
+    if args.json:
+        print(json.dumps({'sample': args.sample, 'duration': duration, 'results': results}, indent=2))
+        return
+    print(f'\nSample: {args.sample} ({duration:.1f}s)')
+    print(f"{'profile':<10} {'model':<36} {'load s':>7} {'RTF':>7} {'WER':>7}")
+    for r in results:
+        wer = f"{r['wer'] * 100:.1f}%" if r['wer'] is not None else '-'
+        print(f"{r['profile']:<10} {r['model']:<36} {r['load_seconds']:>7.1f} {r['rtf']:>7.3f} {wer:>7}")
+
+
+if __name__ == '__main__':
+    main()
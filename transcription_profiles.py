@@ -0,0 +1,131 @@
+"""
+Transcription profiles.
+A profile picks the Whisper model size, compute type (int8 quantized or
+float), beam size and CPU threads in one name, so the speed/accuracy
+tradeoff is a single setting. Plain model sizes still work and keep
+clipsai's defaults for everything else. The whisperx model is owned here
+(WhisperModel) rather than borrowed from clipsai's Transcriber, whose
+constructor can't take decoding options.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from audio_track import SAMPLE_RATE
+
+TranscriptionProfile = namedtuple('TranscriptionProfile', 'name model_size compute_type beam_size threads')
+
+PROFILES = {
+    'fast': TranscriptionProfile('fast', 'base', 'int8', 1, None),
+    'balanced': TranscriptionProfile('balanced', 'small', 'int8', 5, None),
+    'accurate': TranscriptionProfile('accurate', 'large-v2', 'float32', 5, None),
+}
+DEFAULT_PROFILE = 'balanced'
+MODEL_SIZES = ('tiny', 'base', 'small', 'medium', 'large-v1', 'large-v2')  # what clipsai's Transcriber accepts
+LANGUAGE_DETECT_SECONDS = 30
+
+
+def resolve_profile(name: str = None) -> TranscriptionProfile:
+    """
+    The profile called `name`. A bare model size (e.g. 'large-v1') or None
+    gives a profile that only sets the model size.
+    """
+    if name in PROFILES:
+        return PROFILES[name]
+    return TranscriptionProfile(name or 'default', name, None, None, None)
+
+
+def is_valid_profile(name: str) -> bool:
+    """True for a profile name or a plain model size"""
+    return name in PROFILES or name in MODEL_SIZES
+
+
+def describe_profile(name: str = None) -> str:
+    """Human readable summary, e.g. 'Whisper small (int8, beam 5)'"""
+    profile = resolve_profile(name)
+    model = profile.model_size or 'default (large-v2 on GPU, tiny on CPU)'
+    details = [d for d in (profile.compute_type, profile.beam_size and f'beam {profile.beam_size}') if d]
+    return f"Whisper {model}" + (f" ({', '.join(details)})" if details else '')
+
+
+class WhisperModel:
+    """A loaded whisperx model with the device, model size and compute type it was loaded with"""
+
+    def __init__(self, model, device: str, model_size: str, compute_type: str):
+        self.model = model
+        self.device = device
+        self.model_size = model_size
+        self.compute_type = compute_type
+
+
+def load_transcriber(profile: TranscriptionProfile, device: str = None, threads: int = None) -> WhisperModel:
+    """
+    Load the profile's whisperx model. Unset fields get clipsai's Transcriber
+    defaults: large-v2 in float16 on a GPU, tiny in int8 on the CPU.
+    """
+    import torch
+    import whisperx
+    from clipsai.utils.pytorch import get_compute_device
+
+    model_size = profile.model_size or ('large-v2' if torch.cuda.is_available() else 'tiny')
+    compute_type = profile.compute_type or ('float16' if torch.cuda.is_available() else 'int8')
+    if model_size not in MODEL_SIZES:
+        raise ValueError(f"unknown Whisper model size '{model_size}' (use {', '.join(MODEL_SIZES)})")
+    device = device or get_compute_device()
+    options = {}
+    threads = threads or profile.threads
+    if profile.beam_size:
+        options['asr_options'] = {'beam_size': profile.beam_size, 'best_of': profile.beam_size}
+    if threads:
+        options['threads'] = threads
+    model = whisperx.load_model(whisper_arch=model_size, device=device, compute_type=compute_type, **options)
+    return WhisperModel(model, device, model_size, compute_type)
+
+
+def detect_language(transcriber: WhisperModel, audio, seconds: float = LANGUAGE_DETECT_SECONDS) -> str:
+    """ISO 639-1 code of the language spoken in the first `seconds` of a 16 kHz audio buffer"""
+    return transcriber.model.detect_language(np.ascontiguousarray(audio[:int(seconds * SAMPLE_RATE)]))
+
+
+def transcribe_audio(transcriber: WhisperModel, audio, language: str = None, align_model=None, batch_size: int = 16):
+    """
+    Transcribe and word-align an already decoded 16 kHz float32 buffer into a
+    clipsai Transcription. The char_info layout is the one clipsai 0.2.1's
+    Transcriber.transcribe() produces (recheck it when upgrading clipsai).
+    align_model(language) may return a cached (model, metadata) pair instead
+    of loading the alignment model per call.
+    """
+    import whisperx
+    from clipsai.transcribe.exceptions import NoSpeechError
+    from clipsai.transcribe.transcription import Transcription
+
+    result = transcriber.model.transcribe(audio, language=language, batch_size=batch_size)
+    if align_model is not None:
+        model_a, metadata = align_model(result["language"])
+    else:
+        model_a, metadata = whisperx.load_align_model(language_code=result["language"], device=transcriber.device)
+    aligned = whisperx.align(result["segments"], model_a, metadata, audio, transcriber.device,
+                             return_char_alignments=True)
+    if len(aligned["segments"]) == 0:
+        raise NoSpeechError("Audio contains no active speech.")
+
+    # The first character is always a space
+    del aligned["segments"][0]["chars"][0]
+    char_info = [
+        {
+            "char": char["char"],
+            "start_time": float(char["start"]) if "start" in char else None,
+            "end_time": float(char["end"]) if "end" in char else None,
+            "speaker": None,
+        }
+        for segment in aligned["segments"] for char in segment["chars"]
+    ]
+    return Transcription({
+        "source_software": "whisperx-v3",
+        "time_created": datetime.now(),
+        "language": result["language"],
+        "num_speakers": None,
+        "char_info": char_info,
+    })
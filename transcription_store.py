@@ -0,0 +1,267 @@
+"""
+Content-addressed transcription cache.
+Entries are keyed by a hash of the media file's bytes plus the transcription
+profile and language, and stored as compact columnar arrays (float64 times, an
+offset-indexed UTF-8 text blob) that are memory-mapped on load. The times are
+kept at full precision so clip bounds taken from the transcription land on
+the same words in the stored index. Whole-video
+crop tracks are kept alongside, keyed by the same content hash. The store
+evicts least recently used entries once it grows past a disk budget.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+
+DEFAULT_STORE_DIR = os.path.join('cache', 'transcriptions')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+META_FILE = 'meta.json'
+STORE_FORMAT = 2  # 1 kept float32 times; those entries are treated as misses
+
+_hash_memo = {}  # (path, size, mtime) -> digest, so a file is hashed once per process
+
+
+def file_content_hash(path: str) -> str:
+    """BLAKE2b hex digest of the file's contents"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key in _hash_memo:
+        return _hash_memo[memo_key]
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    _hash_memo[memo_key] = digest.hexdigest()
+    return _hash_memo[memo_key]
+
+
+def _write_text_column(directory: str, name: str, values: list):
+    """Store strings as one UTF-8 blob plus an int64 offsets array (len(values) + 1)"""
+    encoded = [v.encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+    np.save(os.path.join(directory, f'{name}_offsets.npy'), offsets)
+    with open(os.path.join(directory, f'{name}.bin'), 'wb') as f:
+        f.write(b''.join(encoded))
+
+
+class TextColumn:
+    """Read-only sequence over a stored text column; each string is decoded from the mmap when accessed"""
+
+    def __init__(self, directory: str, name: str):
+        self.offsets = np.load(os.path.join(directory, f'{name}_offsets.npy'), mmap_mode='r')
+        blob_path = os.path.join(directory, f'{name}.bin')
+        self.blob = np.memmap(blob_path, dtype=np.uint8, mode='r') if os.path.getsize(blob_path) else None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('text column index out of range')
+        if self.blob is None:
+            return ''
+        return self.blob[int(self.offsets[index]):int(self.offsets[index + 1])].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        bounds = self.offsets.tolist() if self.blob is not None else [0] * len(self.offsets)
+        for i in range(len(bounds) - 1):
+            yield self.blob[bounds[i]:bounds[i + 1]].tobytes().decode('utf-8') if self.blob is not None else ''
+
+
+def _read_text_column(directory: str, name: str) -> list:
+    return list(TextColumn(directory, name))
+
+
+def _optional_times(values: list) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _times_to_optional(values: np.ndarray) -> list:
+    return [None if v != v else float(v) for v in values.tolist()]
+
+
+class StoredTranscription:
+    """A cached transcription; arrays are memory-mapped and decoded on demand"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self._transcription = None
+
+    @property
+    def language(self) -> str:
+        return self.meta.get('language')
+
+    def _array(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.directory, f'{name}.npy'), mmap_mode='r')
+
+    def word_index(self):
+        """WordIndex over the memory-mapped word columns, without rebuilding the transcription"""
+        from word_index import WordIndex
+        return WordIndex(TextColumn(self.directory, 'words'), self._array('word_starts'), self._array('word_ends'))
+
+    def transcription(self):
+        """
+        Rebuild the clipsai Transcription from the char columns. This is the
+        expensive load, so only call it where clipsai needs the object (ClipFinder).
+        """
+        if self._transcription is None:
+            from clipsai.transcribe.transcription import Transcription
+            chars = _read_text_column(self.directory, 'chars')
+            starts = _times_to_optional(self._array('char_starts'))
+            ends = _times_to_optional(self._array('char_ends'))
+            speakers = self._array('char_speakers').tolist()
+            self._transcription = Transcription({
+                "source_software": self.meta['source_software'],
+                "time_created": self.meta['time_created'],
+                "language": self.meta['language'],
+                "num_speakers": self.meta['num_speakers'],
+                "char_info": [
+                    {"char": c, "start_time": s, "end_time": e, "speaker": None if spk < 0 else spk}
+                    for c, s, e, spk in zip(chars, starts, ends, speakers)
+                ],
+            })
+        return self._transcription
+
+
+class TranscriptionStore:
+    """Transcription cache keyed by media content hash, model size and language"""
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, media_path: str, profile: str, language: str = None) -> str:
+        """Cache key for transcribing media_path with the given profile (or model size) and language"""
+        return f"{file_content_hash(media_path)}_{profile or 'default'}_{language or 'auto'}"
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str):
+        """The StoredTranscription for key, or None on a cache miss"""
+        directory = self._entry_dir(key)
+        meta_path = os.path.join(directory, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            stored = StoredTranscription(directory)
+        except (OSError, ValueError):
+            return None
+        if stored.meta.get('format') != STORE_FORMAT:
+            return None
+        os.utime(meta_path)  # mark as recently used for LRU eviction
+        return stored
+
+    def put(self, key: str, transcription, source_name: str = None):
+        """Store a clipsai Transcription under key and return the StoredTranscription"""
+        tmp_dir = os.path.join(self.root, f'.tmp_{uuid.uuid4().hex}')
+        os.makedirs(tmp_dir)
+        try:
+            char_info = transcription.get_char_info()
+            word_info = transcription.get_word_info()
+
+            _write_text_column(tmp_dir, 'chars', [c["char"] for c in char_info])
+            np.save(os.path.join(tmp_dir, 'char_starts.npy'), _optional_times([c["start_time"] for c in char_info]))
+            np.save(os.path.join(tmp_dir, 'char_ends.npy'), _optional_times([c["end_time"] for c in char_info]))
+            np.save(os.path.join(tmp_dir, 'char_speakers.npy'),
+                    np.array([-1 if c.get("speaker") is None else c["speaker"] for c in char_info], dtype=np.int16))
+
+            _write_text_column(tmp_dir, 'words', [w["word"] for w in word_info])
+            np.save(os.path.join(tmp_dir, 'word_starts.npy'), np.array([w["start_time"] for w in word_info], dtype=np.float64))
+            np.save(os.path.join(tmp_dir, 'word_ends.npy'), np.array([w["end_time"] for w in word_info], dtype=np.float64))
+
+            meta = {
+                "key": key,
+                "format": STORE_FORMAT,
+                "source_name": source_name,
+                "source_software": transcription.source_software,
+                "time_created": transcription.created_time.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                "language": transcription.language,
+                "num_speakers": transcription._num_speakers,
+                "num_words": len(word_info),
+                "stored_at": time.time(),
+            }
+            with open(os.path.join(tmp_dir, META_FILE), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+            directory = self._entry_dir(key)
+            if os.path.exists(directory):
+                shutil.rmtree(directory)
+            os.replace(tmp_dir, directory)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self.evict(keep=directory)
+        return StoredTranscription(directory)
+
+    def crop_track_key(self, media_path: str, aspect_ratio: tuple = (9, 16)) -> str:
+        """Cache key for the whole-video crop track of media_path"""
+        return f"{file_content_hash(media_path)}_crops_{aspect_ratio[0]}x{aspect_ratio[1]}"
+
+    def get_crop_track(self, key: str):
+        """The cached CropTrack for key, or None on a cache miss"""
+        from crop_track import CropTrack
+        directory = self._entry_dir(key)
+        meta_path = os.path.join(directory, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            track = CropTrack.load(directory)
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(meta_path)
+        return track
+
+    def put_crop_track(self, key: str, track):
+        tmp_dir = os.path.join(self.root, f'.tmp_{uuid.uuid4().hex}')
+        os.makedirs(tmp_dir)
+        try:
+            track.save(tmp_dir)
+            directory = self._entry_dir(key)
+            if os.path.exists(directory):
+                shutil.rmtree(directory)
+            os.replace(tmp_dir, directory)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self.evict(keep=directory)
+        return track
+
+    def entries(self) -> list:
+        """(last_used, size_bytes, directory) for every stored entry"""
+        result = []
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            meta_path = os.path.join(directory, META_FILE)
+            if name.startswith('.') or not os.path.exists(meta_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+            result.append((os.path.getmtime(meta_path), size, directory))
+        return result
+
+    def evict(self, keep: str = None):
+        """Remove least recently used entries (except `keep`) until the store fits in max_bytes"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, directory in entries:
+            if total <= self.max_bytes:
+                break
+            if directory == keep:
+                continue
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
@@ -0,0 +1,79 @@
+"""
+Time-indexed word store for a transcription.
+Built once per transcription so every "words in this clip" lookup is a
+binary search range query (O(log n + k)) instead of a scan over all words.
+The time columns can be memory-mapped arrays straight from the
+transcription store; nothing is copied into Python objects up front.
+"""
+
+import numpy as np
+
+
+class WordIndex:
+    """Words sorted by start time with parallel start/end arrays for range queries"""
+
+    def __init__(self, words, starts, ends):
+        self.words = words  # any sequence of str, e.g. the store's lazily decoded text column
+        self.starts = np.asarray(starts)
+        self.ends = np.asarray(ends)
+        # With non-decreasing end times the words inside [start, end] form one
+        # contiguous run; otherwise queries fall back to filtering the window
+        self._contiguous = bool(np.all(self.ends[1:] >= self.ends[:-1]))
+
+    @classmethod
+    def from_transcription(cls, transcription):
+        """
+        Build the index from a clipsai transcription (get_word_info() dicts) or
+        from any object exposing .words with .word/.start/.end attributes.
+        """
+        if hasattr(transcription, 'get_word_info'):
+            entries = [(w["word"], w["start_time"], w["end_time"]) for w in transcription.get_word_info()]
+        else:
+            entries = [(w.word, w.start, w.end) for w in transcription.words]
+        entries.sort(key=lambda e: e[1])
+        return cls([e[0] for e in entries], [e[1] for e in entries], [e[2] for e in entries])
+
+    def __len__(self):
+        return len(self.words)
+
+    @property
+    def contiguous(self) -> bool:
+        """True if the words inside any [start, end] form one run, so span() is exact"""
+        return self._contiguous
+
+    def span(self, start_time: float, end_time: float) -> tuple:
+        """
+        Index range (lo, hi) of the words with start >= start_time and end <= end_time.
+        Only exact when the index is contiguous; use indices() otherwise.
+        """
+        lo = int(np.searchsorted(self.starts, start_time, side='left'))
+        hi = int(np.searchsorted(self.starts, end_time, side='right'))
+        if self._contiguous:
+            hi = max(lo, lo + int(np.searchsorted(self.ends[lo:hi], end_time, side='right')))
+        return lo, hi
+
+    def indices(self, start_time: float, end_time: float) -> list:
+        """Indices of the words fully inside [start_time, end_time], in time order"""
+        lo, hi = self.span(start_time, end_time)
+        if self._contiguous:
+            return list(range(lo, hi))
+        return (lo + np.flatnonzero(self.ends[lo:hi] <= end_time)).tolist()
+
+    def count(self, start_time: float, end_time: float) -> int:
+        """Number of words fully inside [start_time, end_time]"""
+        if self._contiguous:
+            lo, hi = self.span(start_time, end_time)
+            return hi - lo
+        return len(self.indices(start_time, end_time))
+
+    def word_info(self, start_time: float, end_time: float) -> list:
+        """Words inside the range as get_word_info()-style dicts"""
+        return [{"word": self.words[i], "start_time": float(self.starts[i]), "end_time": float(self.ends[i])}
+                for i in self.indices(start_time, end_time)]
+
+    def text(self, start_time: float, end_time: float, max_words: int = None) -> str:
+        """Space-joined words inside the range, optionally only the first max_words"""
+        idx = self.indices(start_time, end_time)
+        if max_words is not None:
+            idx = idx[:max_words]
+        return " ".join(self.words[i] for i in idx)